@@ -0,0 +1,448 @@
+"""
+Source url: https://github.com/OPHoperHPO/image-background-remove-tool
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+
+Benchmark of the background removal pipeline.
+Neural networks use random weights, so it runs offline and measures speed only.
+
+Usage:
+    python -m benchmarks.benchmark --sizes 640x480,1920x1080 --batch_sizes 1,2 -o result.json
+"""
+import json
+import multiprocessing
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import click
+import numpy as np
+import torch
+from PIL import Image, ImageDraw
+
+from carvekit import version
+from carvekit.api.high import HiInterface
+from carvekit.api.interface import Interface
+from carvekit.ml.wrap.basnet import BASNET
+from carvekit.ml.wrap.deeplab_v3 import DeepLabV3
+from carvekit.ml.wrap.fba_matting import FBAMatting
+from carvekit.ml.wrap.tracer_b7 import TracerUniversalB7
+from carvekit.ml.wrap.u2net import U2NET
+from carvekit.trimap.generator import TrimapGenerator
+from carvekit.utils.mask_utils import apply_mask
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SEGMENTATION_NETWORKS = {
+    "u2net": U2NET,
+    "basnet": BASNET,
+    "deeplabv3": DeepLabV3,
+    "tracer_b7": TracerUniversalB7,
+}
+PIPELINES = ["hi_object", "hi_hairs", *SEGMENTATION_NETWORKS.keys()]
+COMPONENTS = ["trimap", "fba", "apply_mask"]
+
+
+class StageTimer:
+    """Proxy that measures the time spent in calls of the wrapped object"""
+
+    def __init__(self, wrapped, timings: Dict[str, float], name: str):
+        self._wrapped = wrapped
+        self._timings = timings
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._wrapped(*args, **kwargs)
+        finally:
+            self._timings[self._name] = self._timings.get(self._name, 0.0) + (
+                time.perf_counter() - start
+            )
+
+    def __getattr__(self, item):
+        return getattr(self._wrapped, item)
+
+
+def make_image(size: Tuple[int, int], seed: int = 0) -> Image.Image:
+    """
+    Generates a noisy image with an ellipse object in the center
+
+    Args:
+        size: image size (width, height)
+        seed: random seed
+
+    Returns:
+        RGB image
+    """
+    rng = np.random.default_rng(seed)
+    image = Image.fromarray(
+        rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8), "RGB"
+    )
+    ImageDraw.Draw(image).ellipse(
+        (size[0] // 4, size[1] // 4, size[0] * 3 // 4, size[1] * 3 // 4),
+        fill=(200, 80, 40),
+    )
+    return image
+
+
+def make_mask(size: Tuple[int, int]) -> Image.Image:
+    """
+    Generates a soft mask of the ellipse object drawn by make_image
+
+    Args:
+        size: mask size (width, height)
+
+    Returns:
+        L image
+    """
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).ellipse(
+        (size[0] // 4, size[1] // 4, size[0] * 3 // 4, size[1] * 3 // 4), fill=255
+    )
+    return mask.resize((max(size[0] // 8, 1), max(size[1] // 8, 1))).resize(
+        size, Image.BILINEAR
+    )
+
+
+def peak_rss_mb() -> float:
+    """Returns the peak resident set size of the current process in megabytes or None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def build_pipeline(
+    name: str,
+    batch_size: int,
+    device: str,
+    seg_mask_size: int,
+    matting_mask_size: int,
+    optimize: bool = False,
+) -> Interface:
+    """
+    Builds interface with random weights of neural networks
+
+    Args:
+        name: name of the pipeline from PIPELINES
+        batch_size: batch size of neural networks
+        device: processing device
+        seg_mask_size: input size of the segmentation network or None for the default one
+        matting_mask_size: input size of the matting network or None for the default one
+        optimize: calls optimize_for_inference of the segmentation network if it is available
+
+    Returns:
+        Interface instance
+    """
+    if name in ["hi_object", "hi_hairs"]:
+        interface = HiInterface(
+            object_type="object" if name == "hi_object" else "hairs-like",
+            batch_size_seg=batch_size,
+            batch_size_matting=batch_size,
+            device=device,
+            seg_mask_size=seg_mask_size or 640,
+            matting_mask_size=matting_mask_size or 2048,
+            load_pretrained=False,
+        )
+    else:
+        kwargs = {} if seg_mask_size is None else {"input_image_size": seg_mask_size}
+        seg_net = SEGMENTATION_NETWORKS[name](
+            device=device, batch_size=batch_size, load_pretrained=False, **kwargs
+        )
+        interface = Interface(seg_pipe=seg_net, device=device)
+    if optimize and hasattr(interface.segmentation_pipeline, "optimize_for_inference"):
+        interface.segmentation_pipeline.optimize_for_inference()
+    return interface
+
+
+def run_pipeline(
+    name: str, images: List[Image.Image], batch_size: int, device: str, **sizes
+):
+    """
+    Prepares benchmark of the interface
+
+    Returns:
+        Function that processes images once and returns times of the stages in seconds
+    """
+    interface = build_pipeline(name, batch_size, device, **sizes)
+    timings = {}
+    post = interface.postprocessing_pipeline
+    if post is not None:
+        post.trimap_generator = StageTimer(post.trimap_generator, timings, "trimap")
+        post.matting_module = StageTimer(post.matting_module, timings, "matting")
+
+    def run() -> Dict[str, float]:
+        timings.clear()
+        start = time.perf_counter()
+        loaded = interface.load_stage(images)
+        timings["load"] = time.perf_counter() - start
+        start = time.perf_counter()
+        segmented = interface.segmentation_stage(loaded)
+        timings["segmentation"] = time.perf_counter() - start
+        start = time.perf_counter()
+        interface.postprocessing_stage(segmented)
+        timings["postprocessing"] = time.perf_counter() - start
+        return dict(timings)
+
+    return run
+
+
+def run_component(
+    name: str,
+    images: List[Image.Image],
+    batch_size: int,
+    device: str,
+    optimize: bool = False,
+    **sizes,
+):
+    """
+    Prepares benchmark of the single component of the pipeline
+
+    Returns:
+        Function that processes images once and returns times of the stages in seconds
+    """
+    masks = [make_mask(image.size) for image in images]
+    if name == "trimap":
+        generator = TrimapGenerator()
+
+        def call():
+            return [generator(image, mask) for image, mask in zip(images, masks)]
+
+    elif name == "fba":
+        kwargs = {}
+        if sizes["matting_mask_size"] is not None:
+            kwargs["input_tensor_size"] = sizes["matting_mask_size"]
+        fba = FBAMatting(
+            device=device, batch_size=batch_size, load_pretrained=False, **kwargs
+        )
+        trimaps = [TrimapGenerator()(image, mask) for image, mask in zip(images, masks)]
+
+        def call():
+            return fba(images=images, trimaps=trimaps)
+
+    elif name == "apply_mask":
+
+        def call():
+            return [
+                apply_mask(image, mask, device=device)
+                for image, mask in zip(images, masks)
+            ]
+
+    else:
+        raise ValueError(f"Unknown component: {name}")
+
+    def run() -> Dict[str, float]:
+        start = time.perf_counter()
+        call()
+        return {name: time.perf_counter() - start}
+
+    return run
+
+
+def run_case(
+    kind: str,
+    name: str,
+    size: Tuple[int, int],
+    batch_size: int,
+    device: str,
+    repeats: int,
+    warmup: int,
+    seg_mask_size: int = None,
+    matting_mask_size: int = None,
+    optimize: bool = False,
+) -> dict:
+    """
+    Runs one benchmark case
+
+    Args:
+        kind: "pipeline" or "component"
+        name: name of the pipeline or the component
+        size: size of input images (width, height)
+        batch_size: number of images processed per call
+        device: processing device
+        repeats: number of measured calls
+        warmup: number of calls before measurements
+        seg_mask_size: input size of the segmentation network or None for the default one
+        matting_mask_size: input size of the matting network or None for the default one
+        optimize: calls optimize_for_inference of segmentation networks
+
+    Returns:
+        Benchmark results
+    """
+    torch.manual_seed(0)
+    images = [make_image(size, seed) for seed in range(batch_size)]
+    prepare: Callable = run_pipeline if kind == "pipeline" else run_component
+    run = prepare(
+        name,
+        images,
+        batch_size,
+        device,
+        seg_mask_size=seg_mask_size,
+        matting_mask_size=matting_mask_size,
+        optimize=optimize,
+    )
+    with torch.no_grad():
+        for _ in range(warmup):
+            run()
+        latencies, stages = [], []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            stages.append(run())
+            latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "kind": kind,
+        "name": name,
+        "image_size": list(size),
+        "batch_size": batch_size,
+        "device": device,
+        "repeats": repeats,
+        "seg_mask_size": seg_mask_size,
+        "matting_mask_size": matting_mask_size,
+        "optimize": optimize,
+        "images_per_sec": batch_size * repeats / sum(latencies),
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+        },
+        "stages_ms": {
+            stage: float(np.mean([x.get(stage, 0.0) for x in stages]) * 1000)
+            for stage in stages[0].keys()
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def parse_list(value: str) -> List[str]:
+    return [x.strip() for x in value.split(",") if len(x.strip()) > 0]
+
+
+@click.command(
+    "benchmark",
+    help="Measures speed of background removal pipelines with randomly initialized neural networks.",
+)
+@click.option(
+    "--pipelines",
+    default=",".join(PIPELINES),
+    type=str,
+    help="Comma-separated interfaces to benchmark. hi_object and hi_hairs are HiInterface, others are "
+    "Interface with the segmentation network only",
+)
+@click.option(
+    "--components",
+    default=",".join(COMPONENTS),
+    type=str,
+    help="Comma-separated pipeline components to benchmark separately",
+)
+@click.option(
+    "--sizes",
+    default="640x480,1920x1080",
+    type=str,
+    help="Comma-separated sizes of input images",
+)
+@click.option(
+    "--batch_sizes", default="1,2", type=str, help="Comma-separated batch sizes"
+)
+@click.option("--repeats", default=5, type=int, help="Number of measured calls")
+@click.option("--warmup", default=1, type=int, help="Number of calls before measuring")
+@click.option(
+    "--seg_mask_size",
+    default=None,
+    type=int,
+    help="The size of the input image for the segmentation neural network. "
+    "Defaults of the networks are used if not set",
+)
+@click.option(
+    "--matting_mask_size",
+    default=None,
+    type=int,
+    help="The size of the input image for the matting neural network. "
+    "Defaults of the network is used if not set",
+)
+@click.option(
+    "--optimize",
+    is_flag=True,
+    help="Fuses and freezes segmentation networks with optimize_for_inference",
+)
+@click.option("--device", default="cpu", type=str, help="Processing Device.")
+@click.option(
+    "-o", "--output", default="-", type=str, help="Path to the output JSON file"
+)
+def benchmark(
+    pipelines: str,
+    components: str,
+    sizes: str,
+    batch_sizes: str,
+    repeats: int,
+    warmup: int,
+    seg_mask_size: int,
+    matting_mask_size: int,
+    optimize: bool,
+    device: str,
+    output: str,
+):
+    cases = []
+    for size in parse_list(sizes):
+        width, height = map(int, size.lower().split("x"))
+        for batch_size in map(int, parse_list(batch_sizes)):
+            for name in parse_list(pipelines):
+                cases.append(("pipeline", name, (width, height), batch_size))
+            for name in parse_list(components):
+                cases.append(("component", name, (width, height), batch_size))
+
+    results = []
+    for kind, name, size, batch_size in cases:
+        click.echo(f"Running {kind} {name} {size[0]}x{size[1]} x{batch_size}", err=True)
+        # Every case runs in a fresh process, so peak RSS isn't affected by other cases
+        with ProcessPoolExecutor(
+            1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results.append(
+                executor.submit(
+                    run_case,
+                    kind,
+                    name,
+                    size,
+                    batch_size,
+                    device,
+                    repeats,
+                    warmup,
+                    seg_mask_size,
+                    matting_mask_size,
+                    optimize,
+                ).result()
+            )
+
+    report = json.dumps(
+        {
+            "meta": {
+                "carvekit_version": version,
+                "torch_version": torch.__version__,
+                "python_version": platform.python_version(),
+                "platform": platform.platform(),
+                "processor": platform.processor(),
+                "torch_threads": torch.get_num_threads(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            },
+            "results": results,
+        },
+        indent=2,
+    )
+    if output == "-":
+        click.echo(report)
+    else:
+        Path(output).write_text(report)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,115 @@
+"""
+Source url: https://github.com/OPHoperHPO/image-background-remove-tool
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+
+Benchmark of the trimap generation.
+Compares TrimapGenerator with the chain of trimap operations it replaces on synthetic masks.
+
+Usage:
+    python -m benchmarks.trimap_benchmark --megapixels 2 --megapixels 12 --megapixels 25
+"""
+import json
+import time
+from typing import Callable, List
+
+import click
+import cv2
+import numpy as np
+from PIL import Image
+
+from carvekit.trimap.add_ops import prob_filter, prob_as_unknown_area, post_erosion
+from carvekit.trimap.cv_gen import CV2TrimapGenerator
+from carvekit.trimap.generator import TrimapGenerator
+
+
+def synthetic_mask(megapixels: float) -> Image.Image:
+    """
+    Creates a 3:2 object mask with soft borders
+
+    Args:
+        megapixels: mask size in megapixels
+
+    Returns:
+        Mask as L PIL image
+    """
+    height = int(np.sqrt(megapixels * 1e6 / 1.5))
+    width = int(height * 1.5)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.ellipse(
+        mask, (width // 2, height // 2), (width // 3, height // 3), 0, 0, 360, 255, -1
+    )
+    mask = cv2.GaussianBlur(mask, (0, 0), height / 300)
+    return Image.fromarray(mask)
+
+
+def ops_chain(image: Image.Image, mask: Image.Image) -> Image.Image:
+    """Generates trimap by the separate trimap operations"""
+    trimap = prob_filter(mask=mask, prob_threshold=231)
+    trimap = CV2TrimapGenerator(kernel_size=30, erosion_iters=0)(image, trimap)
+    trimap = prob_as_unknown_area(trimap=trimap, mask=mask, prob_threshold=231)
+    return post_erosion(trimap, 5)
+
+
+def measure(function: Callable, repeats: int, *args) -> dict:
+    """
+    Measures latency of the function
+
+    Args:
+        function: measured function
+        repeats: number of measured calls
+        *args: function arguments
+
+    Returns:
+        Latency statistics in milliseconds
+    """
+    function(*args)
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(*args)
+        latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "mean": float(latencies_ms.mean()),
+        "min": float(latencies_ms.min()),
+    }
+
+
+@click.command(
+    "trimap_benchmark",
+    help="Measures latency of the trimap generation on synthetic masks.",
+)
+@click.option(
+    "--megapixels",
+    default=[2, 12, 25],
+    type=float,
+    multiple=True,
+    help="Mask size in megapixels. Can be passed several times.",
+)
+@click.option("--repeats", default=5, type=int, help="Number of measured calls")
+def trimap_benchmark(megapixels: List[float], repeats: int):
+    generator = TrimapGenerator()
+    results = []
+    for size in megapixels:
+        mask = synthetic_mask(size)
+        image = Image.new("RGB", mask.size)
+        mask_array = np.array(mask)
+        results.append(
+            {
+                "megapixels": size,
+                "ops_chain_ms": measure(ops_chain, repeats, image, mask),
+                "generator_pil_ms": measure(generator, repeats, image, mask),
+                "generator_array_ms": measure(generator, repeats, image, mask_array),
+                "bit_exact": bool(
+                    np.array_equal(
+                        np.array(ops_chain(image, mask)), generator(image, mask_array)
+                    )
+                ),
+            }
+        )
+    click.echo(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    trimap_benchmark()
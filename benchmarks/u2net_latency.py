@@ -0,0 +1,79 @@
+"""
+Source url: https://github.com/OPHoperHPO/image-background-remove-tool
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+
+Microbenchmark of the U2NET forward pass latency.
+The neural network uses random weights, so it runs offline and measures speed only.
+
+Usage:
+    python -m benchmarks.u2net_latency --size 320 --batch_size 1
+"""
+import json
+import time
+
+import click
+import numpy as np
+import torch
+
+from carvekit.ml.arch.u2net.u2net import U2NETArchitecture
+
+
+def measure(size: int, batch_size: int, repeats: int, warmup: int, device: str) -> dict:
+    """
+    Measures latency of the U2NET forward pass
+
+    Args:
+        size: input image size
+        batch_size: number of images per forward pass
+        repeats: number of measured forward passes
+        warmup: number of forward passes before measurements
+        device: processing device
+
+    Returns:
+        Latency statistics in milliseconds
+    """
+    torch.manual_seed(0)
+    network = U2NETArchitecture().to(device).eval()
+    sample = torch.rand(batch_size, 3, size, size, device=device)
+    latencies = []
+    with torch.no_grad():
+        for _ in range(warmup):
+            network(sample)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            network(sample)
+            if "cuda" in device:
+                torch.cuda.synchronize()
+            latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "size": size,
+        "batch_size": batch_size,
+        "device": device,
+        "repeats": repeats,
+        "torch_threads": torch.get_num_threads(),
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "min": float(latencies_ms.min()),
+        },
+    }
+
+
+@click.command(
+    "u2net_latency",
+    help="Measures latency of the U2NET forward pass with randomly initialized weights.",
+)
+@click.option("--size", default=320, type=int, help="Input image size")
+@click.option("--batch_size", default=1, type=int, help="Batch size")
+@click.option("--repeats", default=20, type=int, help="Number of measured calls")
+@click.option("--warmup", default=3, type=int, help="Number of calls before measuring")
+@click.option("--device", default="cpu", type=str, help="Processing Device.")
+def u2net_latency(size: int, batch_size: int, repeats: int, warmup: int, device: str):
+    click.echo(json.dumps(measure(size, batch_size, repeats, warmup, device), indent=2))
+
+
+if __name__ == "__main__":
+    u2net_latency()
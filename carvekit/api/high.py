@@ -4,6 +4,7 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 import warnings
+from typing import Optional
 
 from carvekit.api.interface import Interface
 from carvekit.ml.wrap.fba_matting import FBAMatting
@@ -11,6 +12,7 @@ from carvekit.ml.wrap.tracer_b7 import TracerUniversalB7
 from carvekit.ml.wrap.u2net import U2NET
 from carvekit.pipelines.postprocessing import MattingMethod
 from carvekit.trimap.generator import TrimapGenerator
+from carvekit.utils.cache_utils import AlphaCache
 
 
 class HiInterface(Interface):
@@ -26,6 +28,14 @@ class HiInterface(Interface):
         trimap_dilation=30,
         trimap_erosion_iters=5,
         fp16=False,
+        pipelined=False,
+        cache: Optional[AlphaCache] = None,
+        load_pretrained: bool = True,
+        mask_format: str = "pil",
+        matting_tile_size: Optional[int] = None,
+        matting_tile_overlap: int = 64,
+        matting_resolution_trimaps: bool = False,
+        skip_matting_threshold: float = 0.0,
     ):
         """
         Initializes High Level interface.
@@ -41,6 +51,18 @@ class HiInterface(Interface):
             trimap_prob_threshold: Probability threshold at which the prob_filter and prob_as_unknown_area operations will be applied
             trimap_dilation: The size of the offset radius from the object mask in pixels when forming an unknown area
             trimap_erosion_iters: The number of iterations of erosion that the object's mask will be subjected to before forming an unknown area
+            pipelined: Runs image loading, segmentation and matting of different batches at the same time
+            cache: Cache of alpha mattes. Repeated images skip segmentation and matting.
+            load_pretrained: Loads pretrained weights of neural networks. Random weights are only useful for benchmarks
+            mask_format: Format of segmentation masks passed to the matting. "pil" resizes masks with PIL,
+                "numpy" resizes them on the processing device, which is faster, but slightly changes masks.
+            matting_tile_size: Enables tiled matting of the unknown area of trimaps at the original image resolution
+                with tiles of this size. Must be a multiple of 8. matting_mask_size is not used in this mode.
+            matting_tile_overlap: Overlap of neighbouring matting tiles in pixels
+            matting_resolution_trimaps: Generates trimaps at the input resolution of the matting neural network
+                instead of the image resolution. Speeds up processing of large images.
+            skip_matting_threshold: Images whose trimap has smaller fraction of unknown area skip the matting
+                neural network and use the thresholded segmentation mask. 0 disables skipping.
 
         Notes:
             1. Changing seg_mask_size may cause an out-of-memory error if the value is too large, and it may also
@@ -58,6 +80,8 @@ class HiInterface(Interface):
                 batch_size=batch_size_seg,
                 input_image_size=seg_mask_size,
                 fp16=fp16,
+                load_pretrained=load_pretrained,
+                mask_format=mask_format,
             )
         elif object_type == "hairs-like":
             self.u2net = U2NET(
@@ -65,6 +89,8 @@ class HiInterface(Interface):
                 batch_size=batch_size_seg,
                 input_image_size=seg_mask_size,
                 fp16=fp16,
+                load_pretrained=load_pretrained,
+                mask_format=mask_format,
             )
         else:
             warnings.warn(
@@ -75,6 +101,8 @@ class HiInterface(Interface):
                 batch_size=batch_size_seg,
                 input_image_size=seg_mask_size,
                 fp16=fp16,
+                load_pretrained=load_pretrained,
+                mask_format=mask_format,
             )
 
         self.fba = FBAMatting(
@@ -82,6 +110,9 @@ class HiInterface(Interface):
             device=device,
             input_tensor_size=matting_mask_size,
             fp16=fp16,
+            load_pretrained=load_pretrained,
+            tile_size=matting_tile_size,
+            tile_overlap=matting_tile_overlap,
         )
         self.trimap_generator = TrimapGenerator(
             prob_threshold=trimap_prob_threshold,
@@ -95,6 +126,10 @@ class HiInterface(Interface):
                 matting_module=self.fba,
                 trimap_generator=self.trimap_generator,
                 device=device,
+                matting_resolution_trimaps=matting_resolution_trimaps,
+                skip_matting_threshold=skip_matting_threshold,
             ),
             device=device,
+            pipelined=pipelined,
+            cache=cache,
         )
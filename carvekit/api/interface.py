@@ -4,7 +4,7 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 from pathlib import Path
-from typing import Union, List, Optional
+from typing import Union, List, Optional, Tuple, Iterable, Iterator
 
 from PIL import Image
 
@@ -14,9 +14,14 @@ from carvekit.ml.wrap.u2net import U2NET
 from carvekit.ml.wrap.tracer_b7 import TracerUniversalB7
 from carvekit.pipelines.preprocessing import PreprocessingStub
 from carvekit.pipelines.postprocessing import MattingMethod
+from carvekit.utils.cache_utils import AlphaCache
 from carvekit.utils.image_utils import load_image
 from carvekit.utils.mask_utils import apply_mask
-from carvekit.utils.pool_utils import thread_pool_processing
+from carvekit.utils.pool_utils import (
+    thread_pool_processing,
+    batch_generator,
+    pipeline_processing,
+)
 
 
 class Interface:
@@ -26,6 +31,9 @@ class Interface:
         pre_pipe: Optional[Union[PreprocessingStub]] = None,
         post_pipe: Optional[Union[MattingMethod]] = None,
         device="cpu",
+        pipelined: bool = False,
+        pipeline_queue_size: int = 2,
+        cache: Optional[AlphaCache] = None,
     ):
         """
         Initializes an object for interacting with pipelines and other components of the CarveKit framework.
@@ -35,43 +43,174 @@ class Interface:
             seg_pipe: Initialized segmentation network object
             post_pipe: Initialized postprocessing pipeline object
             device: The processing device that will be used to apply the masks to the images.
+            pipelined: Runs image loading, segmentation and post-processing of different batches at the same time.
+            pipeline_queue_size: The number of batches that can wait between two stages in pipelined mode.
+            cache: Cache of alpha mattes. Images whose matte is cached skip segmentation and post-processing.
         """
         self.device = device
         self.preprocessing_pipeline = pre_pipe
         self.segmentation_pipeline = seg_pipe
         self.postprocessing_pipeline = post_pipe
+        self.pipelined = pipelined
+        self.pipeline_queue_size = pipeline_queue_size
+        self.cache = cache
 
-    def __call__(
-        self, images: List[Union[str, Path, Image.Image]]
-    ) -> List[Image.Image]:
+    @property
+    def pipeline_batch_size(self) -> int:
+        """The number of images passed through the stages at once in pipelined and streaming modes."""
+        batch_size = getattr(self.segmentation_pipeline, "batch_size", 1)
+        matting_module = getattr(self.postprocessing_pipeline, "matting_module", None)
+        if matting_module is not None:
+            batch_size = max(batch_size, getattr(matting_module, "batch_size", 1))
+        return max(batch_size, 1)
+
+    @staticmethod
+    def load_stage(images: List[Union[str, Path, Image.Image]]) -> List[Image.Image]:
         """
-        Removes the background from the specified images.
+        Loads input images.
 
         Args:
             images: list of input images
 
         Returns:
-            List of images without background as PIL.Image.Image instances
+            List of loaded images as PIL.Image.Image instances
         """
-        images = thread_pool_processing(load_image, images)
-        if self.preprocessing_pipeline is not None:
+        return thread_pool_processing(load_image, images)
+
+    def segmentation_stage(
+        self, images: List[Image.Image]
+    ) -> Tuple[
+        List[Image.Image],
+        List[Optional[Image.Image]],
+        Optional[Tuple[List[str], List[Optional[Image.Image]]]],
+    ]:
+        """
+        Passes loaded images through pre-processing and segmentation pipelines.
+        Images whose alpha matte is cached are skipped.
+
+        Args:
+            images: list of loaded images
+
+        Returns:
+            List of images, list of their segmentation masks (None for cached images)
+            and cache keys with cached alpha mattes of images if cache is used.
+        """
+        cached = None
+        targets = images
+        if self.cache is not None:
+            keys = thread_pool_processing(self.cache.key, images)
+            cached = (keys, [self.cache.get(key) for key in keys])
+            targets = [
+                image for image, alpha in zip(images, cached[1]) if alpha is None
+            ]
+        if len(targets) == 0:
+            masks = []
+        elif self.preprocessing_pipeline is not None:
             masks: List[Image.Image] = self.preprocessing_pipeline(
-                interface=self, images=images
+                interface=self, images=targets
             )
         else:
-            masks: List[Image.Image] = self.segmentation_pipeline(images=images)
+            masks: List[Image.Image] = self.segmentation_pipeline(images=targets)
+        if cached is not None:
+            masks_iter = iter(masks)
+            masks = [next(masks_iter) if alpha is None else None for alpha in cached[1]]
+        return images, masks, cached
+
+    def postprocessing_stage(
+        self,
+        data: Tuple[
+            List[Image.Image],
+            List[Optional[Image.Image]],
+            Optional[Tuple[List[str], List[Optional[Image.Image]]]],
+        ],
+    ) -> List[Image.Image]:
+        """
+        Applies segmentation masks to images using post-processing pipeline.
+        Cached alpha mattes are applied directly and new ones are stored in the cache.
+
+        Args:
+            data: output of the segmentation stage
 
-        if self.postprocessing_pipeline is not None:
-            images: List[Image.Image] = self.postprocessing_pipeline(
-                images=images, masks=masks
+        Returns:
+            List of images without background as PIL.Image.Image instances
+        """
+        images, masks, cached = data
+        indices = [i for i in range(len(images)) if masks[i] is not None]
+        targets = [images[i] for i in indices]
+        target_masks = [masks[i] for i in indices]
+        if len(targets) == 0:
+            results = []
+        elif self.postprocessing_pipeline is not None:
+            results: List[Image.Image] = self.postprocessing_pipeline(
+                images=targets, masks=target_masks
             )
         else:
-            images = list(
+            results = list(
                 map(
                     lambda x: apply_mask(
-                        image=images[x], mask=masks[x], device=self.device
+                        image=targets[x], mask=target_masks[x], device=self.device
                     ),
-                    range(len(images)),
+                    range(len(targets)),
                 )
             )
-        return images
+        if cached is None:
+            return results
+        keys, alphas = cached
+        output = [None] * len(images)
+        for i, result in zip(indices, results):
+            self.cache.put(keys[i], result.getchannel("A"))
+            output[i] = result
+        for i, alpha in enumerate(alphas):
+            if alpha is not None:
+                output[i] = apply_mask(image=images[i], mask=alpha, device=self.device)
+        return output
+
+    def stream(
+        self, images: Iterable[Union[str, Path, Image.Image]]
+    ) -> Iterator[Tuple[Union[int, str, Path], Image.Image]]:
+        """
+        Removes the background from the images of any iterable or generator and yields results as they complete.
+        Images are processed in pipelined micro-batches, so only a few batches are kept in memory at the same time.
+
+        Args:
+            images: iterable of input images
+
+        Returns:
+            Iterator over (key, image without background) pairs in order of input images.
+            The key is the input path for images specified by path and the position in the input iterable otherwise.
+        """
+        keyed_images = (
+            (image if isinstance(image, (str, Path)) else idx, image)
+            for idx, image in enumerate(images)
+        )
+        for batch_result in pipeline_processing(
+            [
+                lambda x: (x[0], self.load_stage(x[1])),
+                lambda x: (x[0], self.segmentation_stage(x[1])),
+                lambda x: list(zip(x[0], self.postprocessing_stage(x[1]))),
+            ],
+            (
+                tuple(zip(*batch))
+                for batch in batch_generator(keyed_images, self.pipeline_batch_size)
+            ),
+            queue_size=self.pipeline_queue_size,
+        ):
+            yield from batch_result
+
+    def __call__(
+        self, images: List[Union[str, Path, Image.Image]]
+    ) -> List[Image.Image]:
+        """
+        Removes the background from the specified images.
+
+        Args:
+            images: list of input images
+
+        Returns:
+            List of images without background as PIL.Image.Image instances
+        """
+        if self.pipelined:
+            return [result for _, result in self.stream(images)]
+        return self.postprocessing_stage(
+            self.segmentation_stage(self.load_stage(images))
+        )
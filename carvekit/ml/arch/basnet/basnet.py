@@ -219,8 +219,10 @@ class RefUnet(nn.Module):
 
 
 class BASNet(nn.Module):
-    def __init__(self, n_channels, n_classes):
+    def __init__(self, n_channels, n_classes, fused_output_only: bool = False):
         super(BASNet, self).__init__()
+        # Inference mode. Forward returns only the refined saliency map without side outputs
+        self.fused_output_only = fused_output_only
 
         resnet = models.resnet34(pretrained=False)
 
@@ -442,6 +444,10 @@ class BASNet(nn.Module):
         hx = self.relu1d_m(self.bn1d_m(self.conv1d_m(hx)))
         hd1 = self.relu1d_2(self.bn1d_2(self.conv1d_2(hx)))
 
+        if self.fused_output_only:
+            d1 = self.outconv1(hd1)  # 256
+            return (torch.sigmoid(self.refunet(d1)),)
+
         # -------------Side Output-------------
         db = self.outconvb(hbg)
         db = self.upscore6(db)  # 8->256
@@ -31,8 +31,7 @@ class Conv2d(nn.Conv2d):
             bias,
         )
 
-    def forward(self, x):
-        # return super(Conv2d, self).forward(x)
+    def standardized_weight(self) -> torch.Tensor:
         weight = self.weight
         weight_mean = (
             weight.mean(dim=1, keepdim=True)
@@ -47,11 +46,57 @@ class Conv2d(nn.Conv2d):
             )
             + 1e-5
         )
-        weight = weight / std.expand_as(weight)
+        return weight / std.expand_as(weight)
+
+    def forward(self, x):
+        # return super(Conv2d, self).forward(x)
         return F.conv2d(
-            x, weight, self.bias, self.stride, self.padding, self.dilation, self.groups
+            x,
+            self.standardized_weight(),
+            self.bias,
+            self.stride,
+            self.padding,
+            self.dilation,
+            self.groups,
         )
 
 
+def fold_weight_standardization(module: nn.Module) -> nn.Module:
+    """
+    Replaces weight standardized convolutions of the module with plain nn.Conv2d layers
+    which hold precomputed standardized weights. Should be used for inference only,
+    since standardization isn't applied to weights loaded or trained after this call.
+
+    Args:
+        module: module with weight standardized convolutions
+
+    Returns:
+        the same module with replaced layers
+    """
+    for name, child in module.named_children():
+        if isinstance(child, Conv2d):
+            conv = nn.Conv2d(
+                child.in_channels,
+                child.out_channels,
+                child.kernel_size,
+                stride=child.stride,
+                padding=child.padding,
+                dilation=child.dilation,
+                groups=child.groups,
+                bias=child.bias is not None,
+                padding_mode=child.padding_mode,
+                device=child.weight.device,
+                dtype=child.weight.dtype,
+            )
+            with torch.no_grad():
+                conv.weight.copy_(child.standardized_weight())
+                if child.bias is not None:
+                    conv.bias.copy_(child.bias)
+            setattr(module, name, conv)
+        else:
+            fold_weight_standardization(child)
+    return module
+
+
 def BatchNorm2d(num_features):
     return nn.GroupNorm(num_channels=num_features, num_groups=32)
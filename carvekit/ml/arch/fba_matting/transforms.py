@@ -3,8 +3,11 @@ Modified by Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 Source url: https://github.com/MarcoForte/FBA_Matting
 License: MIT License
 """
+from typing import Optional
+
 import cv2
 import numpy as np
+import torch
 
 group_norm_std = [0.229, 0.224, 0.225]
 group_norm_mean = [0.485, 0.456, 0.406]
@@ -29,6 +32,46 @@ def trimap_transform(trimap):
     return clicks
 
 
+def trimap_transform_batch(
+    trimaps: torch.Tensor, out: Optional[torch.Tensor] = None
+) -> torch.Tensor:
+    """
+    Float32 batched version of trimap_transform for tensors.
+    Distance transforms are computed by OpenCV on CPU, gaussians on the device of the trimaps.
+
+    Args:
+        trimaps: two-channel trimaps as N2HW tensor with values in [0, 1] range
+        out: preallocated N6HW float32 tensor for the result on the device of the trimaps
+
+    Returns:
+        N6HW click maps with the channels of trimap_transform
+    """
+    n, _, h, w = trimaps.shape
+    if out is None:
+        out = torch.empty((n, 6, h, w), dtype=torch.float32, device=trimaps.device)
+    trimaps_cpu = trimaps.detach().to("cpu", torch.float32)
+    distances = np.empty((n, 2, h, w), dtype=np.float32)
+    present = np.zeros((n, 2), dtype=bool)
+    for i in range(n):
+        for k in range(2):
+            channel = trimaps_cpu[i, k].numpy()
+            present[i, k] = np.count_nonzero(channel) > 0
+            if present[i, k]:
+                cv2.distanceTransform(
+                    ((1 - channel) * 255).astype(np.uint8),
+                    cv2.DIST_L2,
+                    0,
+                    dst=distances[i, k],
+                )
+    squared = torch.from_numpy(distances).to(out.device).square_()
+    clicks = out.view(n, 2, 3, h, w)
+    L = 320
+    for j, scale in enumerate((0.02, 0.08, 0.16)):
+        torch.mul(squared, -1 / (2 * ((scale * L) ** 2)), out=clicks[:, :, j]).exp_()
+    clicks[torch.from_numpy(~present).to(out.device)] = 0
+    return out
+
+
 def groupnorm_normalise_image(img, format="nhwc"):
     """
     Accept rgb in range 0,1
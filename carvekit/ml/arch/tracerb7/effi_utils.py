@@ -270,6 +270,7 @@ class Conv2dDynamicSamePadding(nn.Conv2d):
 class Conv2dStaticSamePadding(nn.Conv2d):
     """2D Convolutions like TensorFlow's 'SAME' mode, with the given input image size.
     The padding mudule is calculated in construction function, then used in forward.
+    Symmetric padding is passed to the convolution instead of a separate padding module.
     """
 
     # With the same calculation as Conv2dDynamicSamePadding
@@ -294,12 +295,14 @@ class Conv2dStaticSamePadding(nn.Conv2d):
         oh, ow = math.ceil(ih / sh), math.ceil(iw / sw)
         pad_h = max((oh - 1) * self.stride[0] + (kh - 1) * self.dilation[0] + 1 - ih, 0)
         pad_w = max((ow - 1) * self.stride[1] + (kw - 1) * self.dilation[1] + 1 - iw, 0)
-        if pad_h > 0 or pad_w > 0:
+        if pad_h % 2 == 0 and pad_w % 2 == 0:
+            # Symmetric padding is done by the convolution itself without copying the input
+            self.padding = (pad_h // 2, pad_w // 2)
+            self.static_padding = nn.Identity()
+        else:
             self.static_padding = nn.ZeroPad2d(
                 (pad_w // 2, pad_w - pad_w // 2, pad_h // 2, pad_h - pad_h // 2)
             )
-        else:
-            self.static_padding = nn.Identity()
 
     def forward(self, x):
         x = self.static_padding(x)
@@ -299,6 +299,9 @@ class EfficientEncoderB7(EfficientNet):
 
     def get_blocks(self, x, H, W, block_idx):
         features = []
+        # Blocks don't modify their inputs in-place, so features are copied only if gradients are needed
+        copy_features = torch.is_grad_enabled()
+        last_idx = max(block_idx)
         for idx, block in enumerate(self._blocks):
             drop_connect_rate = self._global_params.drop_connect_rate
             if drop_connect_rate:
@@ -306,14 +309,10 @@ class EfficientEncoderB7(EfficientNet):
                     self._blocks
                 )  # scale drop connect_rate
             x = block(x, drop_connect_rate=drop_connect_rate)
-            if idx == block_idx[0]:
-                features.append(x.clone())
-            if idx == block_idx[1]:
-                features.append(x.clone())
-            if idx == block_idx[2]:
-                features.append(x.clone())
-            if idx == block_idx[3]:
-                features.append(x.clone())
+            if idx in block_idx:
+                features.append(x.clone() if copy_features else x)
+            if idx == last_idx:
+                break  # Next blocks aren't used
 
         return features
 
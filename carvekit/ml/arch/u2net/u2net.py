@@ -3,10 +3,12 @@ Modified by Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 Source url: https://github.com/xuebinqin/U-2-Net
 License: Apache License 2.0
 """
-from typing import Union
+from functools import lru_cache
+from typing import Dict, Tuple, Union
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 import math
 
@@ -14,16 +16,16 @@ __all__ = ["U2NETArchitecture"]
 
 
 def _upsample_like(x, size):
-    return nn.Upsample(size=size, mode="bilinear", align_corners=False)(x)
+    return F.interpolate(x, size=size, mode="bilinear", align_corners=False)
 
 
-def _size_map(x, height):
-    # {height: size} for Upsample
-    size = list(x.shape[-2:])
+@lru_cache(maxsize=64)
+def _size_map(size: Tuple[int, int], height: int) -> Dict[int, Tuple[int, int]]:
+    # {height: size} for Upsample, cached per input resolution. Returned dict must not be modified.
     sizes = {}
     for h in range(1, height):
         sizes[h] = size
-        size = [math.ceil(w / 2) for w in size]
+        size = tuple(math.ceil(w / 2) for w in size)
     return sizes
 
 
@@ -50,7 +52,7 @@ class RSU(nn.Module):
         self._make_layers(height, in_ch, mid_ch, out_ch, dilated)
 
     def forward(self, x):
-        sizes = _size_map(x, self.height)
+        sizes = _size_map(tuple(x.shape[-2:]), self.height)
         x = self.rebnconvin(x)
 
         # U-Net like symmetric encoder-decoder structure
@@ -92,7 +94,12 @@ class RSU(nn.Module):
 
 
 class U2NETArchitecture(nn.Module):
-    def __init__(self, cfg_type: Union[dict, str] = "full", out_ch: int = 1):
+    def __init__(
+        self,
+        cfg_type: Union[dict, str] = "full",
+        out_ch: int = 1,
+        fused_output_only: bool = False,
+    ):
         super(U2NETArchitecture, self).__init__()
         if isinstance(cfg_type, str):
             if cfg_type == "full":
@@ -118,11 +125,14 @@ class U2NETArchitecture(nn.Module):
         else:
             raise ValueError("Unknown U^2-Net architecture conf. type")
         self.out_ch = out_ch
+        # Inference mode. Forward returns only the fused saliency map without side outputs
+        self.fused_output_only = fused_output_only
         self._make_layers(layers_cfgs)
 
     def forward(self, x):
-        sizes = _size_map(x, self.height)
+        sizes = _size_map(tuple(x.shape[-2:]), self.height)
         maps = []  # storage for maps
+        fused = []  # fused map accumulated from side maps in fused_output_only mode
 
         # side saliency map
         def unet(x, height=1):
@@ -140,6 +150,13 @@ class U2NETArchitecture(nn.Module):
         def side(x, h):
             # side output saliency map (before sigmoid)
             x = getattr(self, f"side{h}")(x)
+            if self.fused_output_only:
+                # outconv is 1x1 convolution, so its part for this side map is applied
+                # before upsampling and side maps aren't stored at full resolution
+                weight = self.outconv.weight[:, (h - 1) * self.out_ch : h * self.out_ch]
+                x = _upsample_like(F.conv2d(x, weight), sizes[1])
+                fused.append(x if len(fused) == 0 else fused.pop() + x)
+                return
             x = _upsample_like(x, sizes[1])
             maps.append(x)
 
@@ -152,6 +169,9 @@ class U2NETArchitecture(nn.Module):
             return [torch.sigmoid(x) for x in maps]
 
         unet(x)
+        if self.fused_output_only:
+            bias = self.outconv.bias.view(1, -1, 1, 1)
+            return [torch.sigmoid(fused[0] + bias)]
         maps = fuse()
         return maps
 
@@ -13,7 +13,14 @@ from PIL import Image
 
 from carvekit.ml.arch.basnet.basnet import BASNet
 from carvekit.ml.files.models_loc import basnet_pretrained
-from carvekit.utils.image_utils import convert_image, load_image
+from carvekit.utils.image_utils import (
+    convert_image,
+    load_image,
+    images_to_uint8_batch,
+    normalize_batch,
+    resize_masks,
+)
+from carvekit.utils.models_utils import fuse_conv_bn, freeze_network
 from carvekit.utils.pool_utils import batch_generator, thread_pool_processing
 
 __all__ = ["BASNET"]
@@ -29,6 +36,7 @@ class BASNET(BASNet):
         batch_size: int = 10,
         load_pretrained: bool = True,
         fp16: bool = False,
+        mask_format: str = "pil",
     ):
         """
         Initialize the BASNET model
@@ -39,11 +47,17 @@ class BASNET(BASNet):
             batch_size: the number of images that the neural network processes in one run
             load_pretrained: loading pretrained model
             fp16: use fp16 precision // not supported at this moment
+            mask_format: format of returned masks. "pil" for PIL images or "numpy" for uint8 arrays,
+            which are resized on the processing device and accepted by post-processing directly
 
         """
-        super(BASNET, self).__init__(n_channels=3, n_classes=1)
+        super(BASNET, self).__init__(n_channels=3, n_classes=1, fused_output_only=True)
         self.device = device
         self.batch_size = batch_size
+        if mask_format not in ["pil", "numpy"]:
+            raise ValueError(f"Unknown mask format: {mask_format}")
+        self.mask_format = mask_format
+        self.frozen_forward = None
         if isinstance(input_image_size, list):
             self.input_image_size = input_image_size[:2]
         else:
@@ -66,18 +80,22 @@ class BASNET(BASNet):
             input for neural network
 
         """
-        resized = data.resize(self.input_image_size)
-        # noinspection PyTypeChecker
-        resized_arr = np.array(resized, dtype=np.float64)
-        temp_image = np.zeros((resized_arr.shape[0], resized_arr.shape[1], 3))
-        if np.max(resized_arr) != 0:
-            resized_arr /= np.max(resized_arr)
-        temp_image[:, :, 0] = (resized_arr[:, :, 0] - 0.485) / 0.229
-        temp_image[:, :, 1] = (resized_arr[:, :, 1] - 0.456) / 0.224
-        temp_image[:, :, 2] = (resized_arr[:, :, 2] - 0.406) / 0.225
-        temp_image = temp_image.transpose((2, 0, 1))
-        temp_image = np.expand_dims(temp_image, 0)
-        return torch.from_numpy(temp_image).type(torch.FloatTensor)
+        return self.data_preprocessing_batch([data]).cpu().type(torch.FloatTensor)
+
+    def data_preprocessing_batch(self, data: List[PIL.Image.Image]) -> torch.Tensor:
+        """
+        Transform batch of input images to suitable data format for neural network.
+        Images are resized in uint8 and normalized on the processing device.
+
+        Args:
+            data: input images
+
+        Returns:
+            input for neural network on the processing device
+
+        """
+        batch = images_to_uint8_batch(data, self.input_image_size)
+        return normalize_batch(batch, device=self.device, per_image_max=True)
 
     @staticmethod
     def data_postprocessing(
@@ -105,9 +123,46 @@ class BASNET(BASNet):
         mask = mask.resize(original_image.size, resample=3)
         return mask
 
+    @staticmethod
+    def data_postprocessing_batch(
+        data: torch.Tensor, original_images: List[PIL.Image.Image]
+    ) -> List[np.ndarray]:
+        """
+        Transforms batch of output data from neural network to masks resized on the processing device.
+
+        Args:
+            data: output data from neural network
+            original_images: input images which were used for predicted data
+
+        Returns:
+            Segmentation masks as uint8 arrays
+
+        """
+        mi = data.amin(dim=(1, 2, 3), keepdim=True)  # Normalizes predictions
+        ma = data.amax(dim=(1, 2, 3), keepdim=True)
+        data = (data - mi) / (ma - mi).clamp_min(1e-8)  # Constant predictions give 0
+        return resize_masks(
+            data, [image.size for image in original_images], mode="bicubic"
+        )
+
+    def optimize_for_inference(self, jit: bool = True):
+        """
+        Fuses batch normalization layers into convolutions
+        and optionally freezes the network with TorchScript.
+        Weights must not be changed after this call. The frozen network keeps its own copy of weights.
+
+        Args:
+            jit: freeze the network with TorchScript. Falls back to the eager network if tracing fails.
+        """
+        self.eval()
+        fuse_conv_bn(self, torch.rand(1, 3, 128, 128, device=self.device))
+        if jit:
+            sample = torch.rand(1, 3, *self.input_image_size[::-1], device=self.device)
+            self.frozen_forward = freeze_network(self, sample)
+
     def __call__(
         self, images: List[Union[str, pathlib.Path, PIL.Image.Image]]
-    ) -> List[PIL.Image.Image]:
+    ) -> List[Union[PIL.Image.Image, np.ndarray]]:
         """
         Passes input images through neural network and returns segmentation masks as PIL.Image.Image instances
 
@@ -115,7 +170,7 @@ class BASNET(BASNet):
             images: input images
 
         Returns:
-            segmentation masks as for input images, as PIL.Image.Image instances
+            segmentation masks as for input images, as PIL.Image.Image instances or uint8 arrays depending on mask_format
 
         """
         collect_masks = []
@@ -123,16 +178,16 @@ class BASNET(BASNet):
             images = thread_pool_processing(
                 lambda x: convert_image(load_image(x)), image_batch
             )
-            batches = torch.vstack(
-                thread_pool_processing(self.data_preprocessing, images)
-            )
             with torch.no_grad():
-                batches = batches.to(self.device)
-                masks, d2, d3, d4, d5, d6, d7, d8 = super(BASNET, self).__call__(
-                    batches
-                )
+                batches = self.data_preprocessing_batch(images)
+                forward = self.frozen_forward or super(BASNET, self).__call__
+                masks = forward(batches)[0]
+                del batches
+                if self.mask_format == "numpy":
+                    collect_masks += self.data_postprocessing_batch(masks, images)
+                    continue
                 masks_cpu = masks.cpu()
-                del d2, d3, d4, d5, d6, d7, d8, batches, masks
+                del masks
             masks = thread_pool_processing(
                 lambda x: self.data_postprocessing(masks_cpu[x], images[x]),
                 range(len(images)),
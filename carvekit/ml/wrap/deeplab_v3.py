@@ -7,12 +7,13 @@ import pathlib
 from typing import List, Union
 
 import PIL.Image
+import numpy as np
 import torch
 from PIL import Image
 from torchvision import transforms
 from torchvision.models.segmentation import deeplabv3_resnet101
 from carvekit.ml.files.models_loc import deeplab_pretrained
-from carvekit.utils.image_utils import convert_image, load_image
+from carvekit.utils.image_utils import convert_image, load_image, resize_masks
 from carvekit.utils.models_utils import get_precision_autocast, cast_network
 from carvekit.utils.pool_utils import batch_generator, thread_pool_processing
 
@@ -27,6 +28,7 @@ class DeepLabV3:
         input_image_size: Union[List[int], int] = 1024,
         load_pretrained: bool = True,
         fp16: bool = False,
+        mask_format: str = "pil",
     ):
         """
         Initialize the DeepLabV3 model
@@ -37,10 +39,15 @@ class DeepLabV3:
             batch_size: the number of images that the neural network processes in one run
             load_pretrained: loading pretrained model
             fp16: use half precision
+            mask_format: format of returned masks. "pil" for PIL images or "numpy" for uint8 arrays,
+            which are resized on the processing device and accepted by post-processing directly
 
         """
         self.device = device
         self.batch_size = batch_size
+        if mask_format not in ["pil", "numpy"]:
+            raise ValueError(f"Unknown mask format: {mask_format}")
+        self.mask_format = mask_format
         self.network = deeplabv3_resnet101(
             pretrained=False, pretrained_backbone=False, aux_loss=True
         )
@@ -111,9 +118,29 @@ class DeepLabV3:
             Image.fromarray(data.numpy() * 255).convert("L").resize(original_image.size)
         )
 
+    @staticmethod
+    def data_postprocessing_batch(
+        data: List[torch.Tensor], original_images: List[PIL.Image.Image]
+    ) -> List[np.ndarray]:
+        """
+        Transforms output data from neural network to masks resized on the processing device.
+
+        Args:
+            data: output data from neural network for every image
+            original_images: input images which were used for predicted data
+
+        Returns:
+            Segmentation masks as uint8 arrays
+
+        """
+        return [
+            resize_masks(mask[None, None], [image.size], mode="bilinear")[0]
+            for mask, image in zip(data, original_images)
+        ]
+
     def __call__(
         self, images: List[Union[str, pathlib.Path, PIL.Image.Image]]
-    ) -> List[PIL.Image.Image]:
+    ) -> List[Union[PIL.Image.Image, np.ndarray]]:
         """
         Passes input images though neural network and returns segmentation masks as PIL.Image.Image instances
 
@@ -121,7 +148,7 @@ class DeepLabV3:
             images: input images
 
         Returns:
-            segmentation masks as for input images, as PIL.Image.Image instances
+            segmentation masks as for input images, as PIL.Image.Image instances or uint8 arrays depending on mask_format
 
         """
         collect_masks = []
@@ -138,10 +165,15 @@ class DeepLabV3:
                         self.network(i.to(self.device).unsqueeze(0))["out"][0]
                         .argmax(0)
                         .byte()
-                        .cpu()
                         for i in batches
                     ]
                     del batches
+                    if self.mask_format == "numpy":
+                        collect_masks += self.data_postprocessing_batch(
+                            [mask > 0 for mask in masks], images
+                        )
+                        continue
+                    masks = [mask.cpu() for mask in masks]
                 masks = thread_pool_processing(
                     lambda x: self.data_postprocessing(masks[x], images[x]),
                     range(len(images)),
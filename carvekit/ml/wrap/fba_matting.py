@@ -4,23 +4,30 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 import pathlib
-from typing import Union, List, Tuple
+from typing import Union, List, Optional, Tuple
 
 import PIL
 import cv2
 import numpy as np
 import torch
+import torch.nn.functional as F
 from PIL import Image
 
+from carvekit.ml.arch.fba_matting.layers_WS import fold_weight_standardization
 from carvekit.ml.arch.fba_matting.models import FBA
 from carvekit.ml.arch.fba_matting.transforms import (
-    trimap_transform,
-    groupnorm_normalise_image,
+    trimap_transform_batch,
+    group_norm_mean,
+    group_norm_std,
 )
 from carvekit.ml.files.models_loc import fba_pretrained
-from carvekit.utils.image_utils import convert_image, load_image
+from carvekit.utils.image_utils import convert_image, load_image, thumbnail_size
 from carvekit.utils.models_utils import get_precision_autocast, cast_network
-from carvekit.utils.pool_utils import batch_generator, thread_pool_processing
+from carvekit.utils.pool_utils import (
+    batch_generator,
+    bucket_batch_generator,
+    thread_pool_processing,
+)
 
 __all__ = ["FBAMatting"]
 
@@ -38,6 +45,9 @@ class FBAMatting(FBA):
         encoder="resnet50_GN_WS",
         load_pretrained: bool = True,
         fp16: bool = False,
+        bucketing: bool = False,
+        tile_size: Optional[int] = None,
+        tile_overlap: int = 64,
     ):
         """
         Initialize the FBAMatting model
@@ -49,12 +59,26 @@ class FBAMatting(FBA):
             encoder: neural network encoder head
             load_pretrained: loading pretrained model
             fp16: use half precision
+            bucketing: groups images with similar aspect ratio into one batch and pads them to the largest image
+            of the batch instead of resizing every image to the square input_tensor_size. Has effect if batch_size > 1.
+            Batches of images with the same size give the same results as batch_size 1, padded batches differ slightly.
+            tile_size: enables tiled matting at the original image resolution. Only tiles of this size that cover
+            the unknown area of the trimap are passed through the neural network, batch_size tiles at once.
+            Must be a multiple of 8. input_tensor_size and bucketing are not used in this mode.
+            tile_overlap: overlap of neighbouring tiles in pixels. Predictions are blended in the overlaps.
 
         """
         super(FBAMatting, self).__init__(encoder=encoder)
         self.fp16 = fp16
         self.device = device
         self.batch_size = batch_size
+        self.bucketing = bucketing
+        if tile_size is not None and (tile_size <= 0 or tile_size % 8 != 0):
+            raise ValueError("Tile size should be a positive multiple of 8")
+        if not 0 <= tile_overlap < (tile_size or 2**31) // 2:
+            raise ValueError("Tile overlap should be less than half of the tile size")
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
         if isinstance(input_tensor_size, list):
             self.input_image_size = input_tensor_size[:2]
         else:
@@ -62,6 +86,9 @@ class FBAMatting(FBA):
         self.to(device)
         if load_pretrained:
             self.load_state_dict(torch.load(fba_pretrained(), map_location=self.device))
+        # Weights are frozen, so their standardization is computed once.
+        # cast_network casts the folded weights like any other parameters.
+        fold_weight_standardization(self)
         self.eval()
 
     def data_preprocessing(
@@ -71,50 +98,119 @@ class FBAMatting(FBA):
         Transform input image to suitable data format for neural network
 
         Args:
-            data: input image
+            data: input image as PIL image or trimap as uint8 array
 
         Returns:
             input for neural network
 
         """
-        resized = data.copy()
-        if self.batch_size == 1:
-            resized.thumbnail(self.input_image_size, resample=3)
+        tensor, mode = self._input_tensor(data)
+        return tensor, self._transform_tensor(tensor, mode)
+
+    def _input_tensor(
+        self, data: Union[PIL.Image.Image, np.ndarray]
+    ) -> Tuple[torch.FloatTensor, str]:
+        """
+        Resizes input image or trimap to the input size of the neural network
+
+        Args:
+            data: input image as PIL image or trimap as uint8 array
+
+        Returns:
+            input tensor and color mode of the data
+        """
+        if isinstance(data, np.ndarray):
+            if data.ndim != 2:
+                raise ValueError("Incorrect shape for trimap")
+            # Array trimaps are resized by PIL as well, so they match PIL trimaps
+            data = Image.fromarray(data)
+        mode = data.mode
+        if self.batch_size == 1 or self.bucketing:
+            new_size = thumbnail_size(data.size, self.input_image_size)
         else:
-            resized = resized.resize(self.input_image_size, resample=3)
+            new_size = self.input_image_size
+        resized = data
+        if new_size != data.size:
+            # Same resampling as in PIL.Image.thumbnail, but without copying the input image
+            resized = data.resize(new_size, resample=3, reducing_gap=2.0)
         # noinspection PyTypeChecker
-        image = np.array(resized, dtype=np.float64)
-        image = image / 255.0  # Normalize image to [0, 1] values range
-        if resized.mode == "RGB":
-            image = image[:, :, ::-1]
-        elif resized.mode == "L":
-            image2 = np.copy(image)
-            h, w = image2.shape
-            image = np.zeros((h, w, 2))  # Transform trimap to binary data format
-            image[image2 == 1, 1] = 1
-            image[image2 == 0, 0] = 1
+        return self._array_to_tensor(np.asarray(resized), mode), mode
+
+    @staticmethod
+    def _array_to_tensor(array: np.ndarray, mode: str) -> torch.FloatTensor:
+        """
+        Transforms uint8 image or trimap array to the input tensor of the neural network
+
+        Args:
+            array: uint8 HWC RGB image or HW trimap array
+            mode: "RGB" for images and "L" for trimaps
+
+        Returns:
+            1CHW input tensor with values in [0, 1] range, two-channel for trimaps
+        """
+        if mode == "RGB":
+            # Single float32 conversion of the BGR view, normalized to [0, 1] values range
+            image = np.divide(array[:, :, ::-1], np.float32(255), dtype=np.float32)
+        elif mode == "L":
+            image = np.empty((*array.shape, 2), dtype=np.float32)
+            np.equal(
+                array, 0, out=image[:, :, 0]
+            )  # Transform trimap to binary data format
+            np.equal(array, 255, out=image[:, :, 1])
         else:
             raise ValueError("Incorrect color mode for image")
         h, w = image.shape[:2]  # Scale input mlt to 8
         h1 = int(np.ceil(1.0 * h / 8) * 8)
         w1 = int(np.ceil(1.0 * w / 8) * 8)
-        x_scale = cv2.resize(image, (w1, h1), interpolation=cv2.INTER_LANCZOS4)
-        image_tensor = torch.from_numpy(x_scale).permute(2, 0, 1)[None, :, :, :].float()
-        if resized.mode == "RGB":
-            return image_tensor, groupnorm_normalise_image(
-                image_tensor.clone(), format="nchw"
+        if (h1, w1) != (h, w):
+            image = cv2.resize(image, (w1, h1), interpolation=cv2.INTER_LANCZOS4)
+        return torch.from_numpy(image).permute(2, 0, 1)[None, :, :, :]
+
+    @staticmethod
+    def _transform_tensor(tensor: torch.FloatTensor, mode: str) -> torch.FloatTensor:
+        """
+        Returns the transformed version of the input tensor for the neural network
+
+        Args:
+            tensor: NCHW input tensor of images or trimaps
+            mode: "RGB" for images and "L" for trimaps
+
+        Returns:
+            Normalized images or click maps of trimaps on the device of the tensor
+        """
+        if mode == "RGB":
+            # (x - mean) / std as a single fused operation
+            std = torch.tensor(group_norm_std, dtype=tensor.dtype, device=tensor.device)
+            mean = torch.tensor(
+                group_norm_mean, dtype=tensor.dtype, device=tensor.device
             )
-        else:
-            return (
-                image_tensor,
-                torch.from_numpy(trimap_transform(x_scale))
-                .permute(2, 0, 1)[None, :, :, :]
-                .float(),
+            return torch.addcmul(
+                (-mean / std).view(1, 3, 1, 1), tensor, (1 / std).view(1, 3, 1, 1)
             )
+        return trimap_transform_batch(tensor)
+
+    @staticmethod
+    def _image_size(
+        image: Union[str, pathlib.Path, PIL.Image.Image]
+    ) -> Tuple[int, int]:
+        """Returns size of the image without decoding its pixels"""
+        if isinstance(image, PIL.Image.Image):
+            return image.size
+        with load_image(image) as image:
+            return image.size
+
+    @staticmethod
+    def _pad_batch(tensors: List[torch.Tensor]) -> torch.Tensor:
+        """Pads NCHW tensors with zeros at the bottom and right to the largest of them and stacks them"""
+        height = max(t.shape[2] for t in tensors)
+        width = max(t.shape[3] for t in tensors)
+        return torch.vstack(
+            [F.pad(t, (0, width - t.shape[3], 0, height - t.shape[2])) for t in tensors]
+        )
 
     @staticmethod
     def data_postprocessing(
-        data: torch.tensor, trimap: PIL.Image.Image
+        data: torch.tensor, trimap: Union[PIL.Image.Image, np.ndarray]
     ) -> PIL.Image.Image:
         """
         Transforms output data from neural network to suitable data
@@ -122,35 +218,154 @@ class FBAMatting(FBA):
 
         Args:
             data: output data from neural network
-            trimap: Map with the area we need to refine
+            trimap: Map with the area we need to refine as L PIL image or uint8 array
 
         Returns:
             Segmentation mask as PIL Image instance
 
         """
-        if trimap.mode != "L":
+        if isinstance(trimap, np.ndarray):
+            if trimap.ndim != 2:
+                raise ValueError("Incorrect shape for trimap")
+            size = (trimap.shape[1], trimap.shape[0])
+        elif trimap.mode != "L":
             raise ValueError("Incorrect color mode for trimap")
-        pred = data.numpy().transpose((1, 2, 0))
-        pred = cv2.resize(pred, trimap.size, cv2.INTER_LANCZOS4)[:, :, 0]
+        else:
+            size = trimap.size
+        # Only the alpha channel is resized. Bilinear interpolation is kept from the previous
+        # cv2.resize(pred, size, cv2.INTER_LANCZOS4) call, which passed the flag as dst argument.
+        pred = cv2.resize(data[0].float().numpy(), size, interpolation=cv2.INTER_LINEAR)
         # noinspection PyTypeChecker
         # Clean mask by removing all false predictions outside trimap and already known area
-        trimap_arr = np.array(trimap.copy())
-        pred[trimap_arr[:, :] == 0] = 0
-        # pred[trimap_arr[:, :] == 255] = 1
+        trimap_arr = np.asarray(trimap)
+        pred[(trimap_arr == 0) | (pred < 0.3)] = 0
+        pred *= 255
+        return Image.fromarray(pred).convert("L")
+
+    def _tile_grid(self, unknown: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """
+        Calculates tiles that cover the unknown area of the trimap
+
+        Args:
+            unknown: boolean array of the unknown area
+
+        Returns:
+            tiles as (top, left, height, width) tuples
+        """
+        height, width = unknown.shape
+        rows, cols = np.any(unknown, axis=1), np.any(unknown, axis=0)
+        if not rows.any():
+            return []
+        top, bottom = np.argmax(rows), height - np.argmax(rows[::-1])
+        left, right = np.argmax(cols), width - np.argmax(cols[::-1])
+
+        def starts(begin: int, end: int, size: int) -> List[int]:
+            tile = min(self.tile_size, size)
+            step = tile - self.tile_overlap
+            # Tiles are shifted inside the image, so all of them have full size
+            begin, last = min(begin, size - tile), max(min(end, size) - tile, 0)
+            result = list(range(begin, max(last, begin) + 1, step))
+            if result[-1] < last:
+                result.append(last)
+            return result
+
+        tile_h, tile_w = min(self.tile_size, height), min(self.tile_size, width)
+        return [
+            (y, x, tile_h, tile_w)
+            for y in starts(top, bottom, height)
+            for x in starts(left, right, width)
+            if unknown[y : y + tile_h, x : x + tile_w].any()
+        ]
+
+    def _tile_weights(self, height: int, width: int) -> np.ndarray:
+        """Returns blending weights of the tile. They linearly decrease to the tile borders in the overlap area."""
+        ramp = max(self.tile_overlap, 1)
+        y = np.minimum(np.arange(height), np.arange(height)[::-1]) + 1
+        x = np.minimum(np.arange(width), np.arange(width)[::-1]) + 1
+        return np.minimum(
+            np.minimum(y, ramp)[:, None], np.minimum(x, ramp)[None, :]
+        ).astype(np.float32) / float(ramp)
+
+    def _tiled_matting(
+        self, image: PIL.Image.Image, trimap: Union[PIL.Image.Image, np.ndarray]
+    ) -> PIL.Image.Image:
+        """
+        Refines the unknown area of the trimap tile by tile at the original image resolution.
+        Known foreground and background are filled from the trimap.
+
+        Args:
+            image: RGB image
+            trimap: trimap of the image as L PIL image or uint8 array
+
+        Returns:
+            Segmentation mask as PIL Image instance
+        """
+        image = np.asarray(image)
+        trimap = np.asarray(trimap)
+        if trimap.shape != image.shape[:2]:
+            raise ValueError("Sizes of image and trimap should be equal")
+        unknown = np.logical_and(trimap > 0, trimap < 255)
+        alpha = np.where(trimap == 255, 255, 0).astype(np.uint8)
+        tiles = self._tile_grid(unknown)
+        if len(tiles) == 0:
+            return Image.fromarray(alpha)
+
+        top = min(t[0] for t in tiles)
+        left = min(t[1] for t in tiles)
+        bottom = max(t[0] + t[2] for t in tiles)
+        right = max(t[1] + t[3] for t in tiles)
+        # Accumulators only cover the area of tiles
+        acc = np.zeros((bottom - top, right - left), dtype=np.float32)
+        acc_weights = np.zeros_like(acc)
+        weights = self._tile_weights(tiles[0][2], tiles[0][3])
+
+        for tiles_batch in batch_generator(tiles, self.batch_size):
+            tile_images = torch.vstack(
+                [
+                    self._array_to_tensor(image[y : y + h, x : x + w], "RGB")
+                    for y, x, h, w in tiles_batch
+                ]
+            ).to(self.device)
+            tile_trimaps = torch.vstack(
+                [
+                    self._array_to_tensor(trimap[y : y + h, x : x + w], "L")
+                    for y, x, h, w in tiles_batch
+                ]
+            ).to(self.device)
+            with torch.no_grad():
+                output = super(FBAMatting, self).__call__(
+                    tile_images,
+                    tile_trimaps,
+                    self._transform_tensor(tile_images, "RGB"),
+                    self._transform_tensor(tile_trimaps, "L"),
+                )
+                pred_batch = output[:, 0].float().cpu().numpy()
+                del output, tile_images, tile_trimaps
+            for pred, (y, x, h, w) in zip(pred_batch, tiles_batch):
+                if pred.shape != (h, w):
+                    pred = cv2.resize(pred, (w, h), interpolation=cv2.INTER_LANCZOS4)
+                acc[y - top : y - top + h, x - left : x - left + w] += pred * weights
+                acc_weights[y - top : y - top + h, x - left : x - left + w] += weights
+
+        area = unknown[top:bottom, left:right]
+        pred = acc[area] / acc_weights[area]
         pred[pred < 0.3] = 0
-        return Image.fromarray(pred * 255).convert("L")
+        alpha[top:bottom, left:right][area] = np.clip(
+            np.rint(pred * 255), 0, 255
+        ).astype(np.uint8)
+        return Image.fromarray(alpha)
 
     def __call__(
         self,
         images: List[Union[str, pathlib.Path, PIL.Image.Image]],
-        trimaps: List[Union[str, pathlib.Path, PIL.Image.Image]],
+        trimaps: List[Union[str, pathlib.Path, PIL.Image.Image, np.ndarray]],
     ) -> List[PIL.Image.Image]:
         """
         Passes input images though neural network and returns segmentation masks as PIL.Image.Image instances
 
         Args:
             images: input images
-            trimaps: Maps with the areas we need to refine
+            trimaps: Maps with the areas we need to refine. Trimaps can be passed as uint8 arrays.
 
         Returns:
             segmentation masks as for input images, as PIL.Image.Image instances
@@ -162,37 +377,57 @@ class FBAMatting(FBA):
                 "Len of specified arrays of images and trimaps should be equal!"
             )
 
-        collect_masks = []
+        if self.tile_size is not None:
+            autocast, dtype = get_precision_autocast(device=self.device, fp16=self.fp16)
+            with autocast:
+                cast_network(self, dtype)
+                return [
+                    self._tiled_matting(
+                        convert_image(load_image(image)),
+                        trimap
+                        if isinstance(trimap, np.ndarray)
+                        else convert_image(load_image(trimap), mode="L"),
+                    )
+                    for image, trimap in zip(images, trimaps)
+                ]
+
+        collect_masks = [None] * len(images)
+        if self.bucketing and self.batch_size > 1:
+            idx_batches = bucket_batch_generator(
+                thread_pool_processing(self._image_size, images), self.batch_size
+            )
+        else:
+            idx_batches = batch_generator(range(len(images)), self.batch_size)
         autocast, dtype = get_precision_autocast(device=self.device, fp16=self.fp16)
         with autocast:
             cast_network(self, dtype)
-            for idx_batch in batch_generator(range(len(images)), self.batch_size):
+            for idx_batch in idx_batches:
                 inpt_images = thread_pool_processing(
                     lambda x: convert_image(load_image(images[x])), idx_batch
                 )
 
                 inpt_trimaps = thread_pool_processing(
-                    lambda x: convert_image(load_image(trimaps[x]), mode="L"), idx_batch
+                    lambda x: trimaps[x]
+                    if isinstance(trimaps[x], np.ndarray)
+                    else convert_image(load_image(trimaps[x]), mode="L"),
+                    idx_batch,
                 )
 
                 inpt_img_batches = thread_pool_processing(
                     self.data_preprocessing, inpt_images
                 )
                 inpt_trimaps_batches = thread_pool_processing(
-                    self.data_preprocessing, inpt_trimaps
+                    lambda x: self._input_tensor(x)[0], inpt_trimaps
                 )
+                # Sizes of images in the batch before padding
+                inpt_sizes = [i[0].shape[2:] for i in inpt_img_batches]
 
-                inpt_img_batches_transformed = torch.vstack(
+                inpt_img_batches_transformed = self._pad_batch(
                     [i[1] for i in inpt_img_batches]
                 )
-                inpt_img_batches = torch.vstack([i[0] for i in inpt_img_batches])
+                inpt_img_batches = self._pad_batch([i[0] for i in inpt_img_batches])
 
-                inpt_trimaps_transformed = torch.vstack(
-                    [i[1] for i in inpt_trimaps_batches]
-                )
-                inpt_trimaps_batches = torch.vstack(
-                    [i[0] for i in inpt_trimaps_batches]
-                )
+                inpt_trimaps_batches = self._pad_batch(inpt_trimaps_batches)
 
                 with torch.no_grad():
                     inpt_img_batches = inpt_img_batches.to(self.device)
@@ -200,7 +435,13 @@ class FBAMatting(FBA):
                     inpt_img_batches_transformed = inpt_img_batches_transformed.to(
                         self.device
                     )
-                    inpt_trimaps_transformed = inpt_trimaps_transformed.to(self.device)
+                    # Trimaps are transformed as a batch, then the padding is zeroed as in the other inputs
+                    inpt_trimaps_transformed = self._transform_tensor(
+                        inpt_trimaps_batches, "L"
+                    )
+                    for x, (height, width) in enumerate(inpt_sizes):
+                        inpt_trimaps_transformed[x, :, height:] = 0
+                        inpt_trimaps_transformed[x, :, :, width:] = 0
 
                     output = super(FBAMatting, self).__call__(
                         inpt_img_batches,
@@ -217,8 +458,12 @@ class FBAMatting(FBA):
                         output,
                     )
                 masks = thread_pool_processing(
-                    lambda x: self.data_postprocessing(output_cpu[x], inpt_trimaps[x]),
+                    lambda x: self.data_postprocessing(
+                        output_cpu[x, :, : inpt_sizes[x][0], : inpt_sizes[x][1]],
+                        inpt_trimaps[x],
+                    ),
                     range(len(inpt_images)),
                 )
-                collect_masks += masks
+                for idx, mask in zip(idx_batch, masks):
+                    collect_masks[idx] = mask
             return collect_masks
@@ -9,14 +9,26 @@ from typing import List, Union
 import PIL.Image
 import numpy as np
 import torch
-import torchvision.transforms as transforms
 from PIL import Image
 
 from carvekit.ml.arch.tracerb7.tracer import TracerDecoder
 from carvekit.ml.arch.tracerb7.efficientnet import EfficientEncoderB7
 from carvekit.ml.files.models_loc import tracer_b7_pretrained, tracer_hair_pretrained
-from carvekit.utils.models_utils import get_precision_autocast, cast_network
-from carvekit.utils.image_utils import load_image, convert_image
+from carvekit.ml.arch.tracerb7.effi_utils import MemoryEfficientSwish, Swish
+from carvekit.utils.models_utils import (
+    get_precision_autocast,
+    cast_network,
+    fuse_conv_bn,
+    freeze_network,
+    replace_modules,
+)
+from carvekit.utils.image_utils import (
+    load_image,
+    convert_image,
+    images_to_uint8_batch,
+    normalize_batch,
+    resize_masks,
+)
 from carvekit.utils.pool_utils import thread_pool_processing, batch_generator
 
 __all__ = ["TracerUniversalB7"]
@@ -33,6 +45,7 @@ class TracerUniversalB7(TracerDecoder):
         load_pretrained: bool = True,
         fp16: bool = False,
         model_path: Union[str, pathlib.Path] = None,
+        mask_format: str = "pil",
     ):
         """
         Initialize the U2NET model
@@ -44,10 +57,10 @@ class TracerUniversalB7(TracerDecoder):
             batch_size: the number of images that the neural network processes in one run
             load_pretrained: loading pretrained model
             fp16: use fp16 precision
+            mask_format: format of returned masks. "pil" for PIL images or "numpy" for uint8 arrays,
+            which are resized on the processing device and accepted by post-processing directly
 
         """
-        if model_path is None:
-            model_path = tracer_b7_pretrained()
         super(TracerUniversalB7, self).__init__(
             encoder=EfficientEncoderB7(),
             rfb_channel=[32, 64, 128],
@@ -57,20 +70,20 @@ class TracerUniversalB7(TracerDecoder):
         self.fp16 = fp16
         self.device = device
         self.batch_size = batch_size
+        if mask_format not in ["pil", "numpy"]:
+            raise ValueError(f"Unknown mask format: {mask_format}")
+        self.mask_format = mask_format
+        self.frozen_forward = None
+        self.frozen_dtype = None
         if isinstance(input_image_size, list):
             self.input_image_size = input_image_size[:2]
         else:
             self.input_image_size = (input_image_size, input_image_size)
 
-        self.transform = transforms.Compose(
-            [
-                transforms.ToTensor(),
-                transforms.Resize(self.input_image_size),
-                transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
-            ]
-        )
         self.to(device)
         if load_pretrained:
+            if model_path is None:
+                model_path = tracer_b7_pretrained()
             # TODO remove edge detector from weights. It doesn't work well with this model!
             self.load_state_dict(
                 torch.load(model_path, map_location=self.device), strict=False
@@ -88,8 +101,27 @@ class TracerUniversalB7(TracerDecoder):
             input for neural network
 
         """
+        return self.data_preprocessing_batch([data]).cpu().type(torch.FloatTensor)
+
+    def data_preprocessing_batch(
+        self, data: List[PIL.Image.Image], dtype: torch.dtype = torch.float32
+    ) -> torch.Tensor:
+        """
+        Transform batch of input images to suitable data format for neural network.
+        Images are resized in uint8 and normalized on the processing device.
 
-        return torch.unsqueeze(self.transform(data), 0).type(torch.FloatTensor)
+        Args:
+            data: input images
+            dtype: dtype of the network input
+
+        Returns:
+            input for neural network on the processing device
+
+        """
+        batch = images_to_uint8_batch(
+            data, self.input_image_size, resample=PIL.Image.BILINEAR
+        )
+        return normalize_batch(batch, device=self.device, dtype=dtype)
 
     @staticmethod
     def data_postprocessing(
@@ -115,9 +147,55 @@ class TracerUniversalB7(TracerDecoder):
         mask = mask.resize(original_image.size, resample=Image.BILINEAR)
         return mask
 
+    @staticmethod
+    def data_postprocessing_batch(
+        data: torch.Tensor, original_images: List[PIL.Image.Image]
+    ) -> List[np.ndarray]:
+        """
+        Transforms batch of output data from neural network to masks resized on the processing device.
+
+        Args:
+            data: output data from neural network
+            original_images: input images which were used for predicted data
+
+        Returns:
+            Segmentation masks as uint8 arrays
+
+        """
+        return resize_masks(
+            data, [image.size for image in original_images], mode="bilinear"
+        )
+
+    def optimize_for_inference(self, jit: bool = True):
+        """
+        Fuses batch normalization layers into convolutions, replaces Swish with the native SiLU
+        and optionally freezes the network with TorchScript.
+        Weights must not be changed after this call. The frozen network keeps its own copy of weights.
+
+        Args:
+            jit: freeze the network with TorchScript in the precision set by fp16.
+                Falls back to the eager network if tracing fails or fp16 is changed after this call.
+        """
+        self.eval()
+        # Batch normalization is fused in full precision
+        cast_network(self, torch.float32)
+        fuse_conv_bn(self, torch.rand(1, 3, 128, 128, device=self.device))
+        replace_modules(self, (MemoryEfficientSwish, Swish), lambda _: torch.nn.SiLU())
+        if jit:
+            # The network is traced in the precision of __call__,
+            # since the frozen network keeps weights of the precision it was traced with
+            autocast, dtype = get_precision_autocast(device=self.device, fp16=self.fp16)
+            cast_network(self, dtype)
+            sample = torch.rand(
+                1, 3, *self.input_image_size[::-1], device=self.device, dtype=dtype
+            )
+            with autocast:
+                self.frozen_forward = freeze_network(self, sample)
+            self.frozen_dtype = dtype
+
     def __call__(
         self, images: List[Union[str, pathlib.Path, PIL.Image.Image]]
-    ) -> List[PIL.Image.Image]:
+    ) -> List[Union[PIL.Image.Image, np.ndarray]]:
         """
         Passes input images though neural network and returns segmentation masks as PIL.Image.Image instances
 
@@ -125,7 +203,7 @@ class TracerUniversalB7(TracerDecoder):
             images: input images
 
         Returns:
-            segmentation masks as for input images, as PIL.Image.Image instances
+            segmentation masks as for input images, as PIL.Image.Image instances or uint8 arrays depending on mask_format
 
         """
         collect_masks = []
@@ -136,14 +214,18 @@ class TracerUniversalB7(TracerDecoder):
                 images = thread_pool_processing(
                     lambda x: convert_image(load_image(x)), image_batch
                 )
-                batches = torch.vstack(
-                    thread_pool_processing(self.data_preprocessing, images)
-                )
                 with torch.no_grad():
-                    batches = batches.to(self.device)
-                    masks = super(TracerDecoder, self).__call__(batches)
+                    batches = self.data_preprocessing_batch(images, dtype)
+                    forward = super(TracerDecoder, self).__call__
+                    if self.frozen_forward is not None and self.frozen_dtype == dtype:
+                        forward = self.frozen_forward
+                    masks = forward(batches)
+                    del batches
+                    if self.mask_format == "numpy":
+                        collect_masks += self.data_postprocessing_batch(masks, images)
+                        continue
                     masks_cpu = masks.cpu()
-                    del batches, masks
+                    del masks
                 masks = thread_pool_processing(
                     lambda x: self.data_postprocessing(masks_cpu[x], images[x]),
                     range(len(images)),
@@ -164,6 +246,7 @@ class TracerHair(TracerUniversalB7):
         load_pretrained: bool = True,
         fp16: bool = False,
         model_path: Union[str, pathlib.Path] = None,
+        mask_format: str = "pil",
     ):
         if model_path is None:
             model_path = tracer_hair_pretrained()
@@ -175,4 +258,5 @@ class TracerHair(TracerUniversalB7):
             load_pretrained=load_pretrained,
             fp16=fp16,
             model_path=model_path,
+            mask_format=mask_format,
         )
@@ -12,7 +12,14 @@ from PIL import Image
 
 from carvekit.ml.arch.u2net.u2net import U2NETArchitecture
 from carvekit.ml.files.models_loc import u2net_full_pretrained
-from carvekit.utils.image_utils import load_image, convert_image
+from carvekit.utils.image_utils import (
+    load_image,
+    convert_image,
+    images_to_uint8_batch,
+    normalize_batch,
+    resize_masks,
+)
+from carvekit.utils.models_utils import fuse_conv_bn, freeze_network
 from carvekit.utils.pool_utils import thread_pool_processing, batch_generator
 
 __all__ = ["U2NET"]
@@ -29,6 +36,7 @@ class U2NET(U2NETArchitecture):
         batch_size: int = 10,
         load_pretrained: bool = True,
         fp16: bool = False,
+        mask_format: str = "pil",
     ):
         """
         Initialize the U2NET model
@@ -40,11 +48,19 @@ class U2NET(U2NETArchitecture):
             batch_size: the number of images that the neural network processes in one run
             load_pretrained: loading pretrained model
             fp16: use fp16 precision // not supported at this moment.
+            mask_format: format of returned masks. "pil" for PIL images or "numpy" for uint8 arrays,
+            which are resized on the processing device and accepted by post-processing directly
 
         """
-        super(U2NET, self).__init__(cfg_type=layers_cfg, out_ch=1)
+        super(U2NET, self).__init__(
+            cfg_type=layers_cfg, out_ch=1, fused_output_only=True
+        )
         self.device = device
         self.batch_size = batch_size
+        if mask_format not in ["pil", "numpy"]:
+            raise ValueError(f"Unknown mask format: {mask_format}")
+        self.mask_format = mask_format
+        self.frozen_forward = None
         if isinstance(input_image_size, list):
             self.input_image_size = input_image_size[:2]
         else:
@@ -67,18 +83,22 @@ class U2NET(U2NETArchitecture):
             input for neural network
 
         """
-        resized = data.resize(self.input_image_size, resample=3)
-        # noinspection PyTypeChecker
-        resized_arr = np.array(resized, dtype=float)
-        temp_image = np.zeros((resized_arr.shape[0], resized_arr.shape[1], 3))
-        if np.max(resized_arr) != 0:
-            resized_arr /= np.max(resized_arr)
-        temp_image[:, :, 0] = (resized_arr[:, :, 0] - 0.485) / 0.229
-        temp_image[:, :, 1] = (resized_arr[:, :, 1] - 0.456) / 0.224
-        temp_image[:, :, 2] = (resized_arr[:, :, 2] - 0.406) / 0.225
-        temp_image = temp_image.transpose((2, 0, 1))
-        temp_image = np.expand_dims(temp_image, 0)
-        return torch.from_numpy(temp_image).type(torch.FloatTensor)
+        return self.data_preprocessing_batch([data]).cpu().type(torch.FloatTensor)
+
+    def data_preprocessing_batch(self, data: List[PIL.Image.Image]) -> torch.Tensor:
+        """
+        Transform batch of input images to suitable data format for neural network.
+        Images are resized in uint8 and normalized on the processing device.
+
+        Args:
+            data: input images
+
+        Returns:
+            input for neural network on the processing device
+
+        """
+        batch = images_to_uint8_batch(data, self.input_image_size)
+        return normalize_batch(batch, device=self.device, per_image_max=True)
 
     @staticmethod
     def data_postprocessing(
@@ -106,9 +126,46 @@ class U2NET(U2NETArchitecture):
         mask = mask.resize(original_image.size, resample=3)
         return mask
 
+    @staticmethod
+    def data_postprocessing_batch(
+        data: torch.Tensor, original_images: List[PIL.Image.Image]
+    ) -> List[np.ndarray]:
+        """
+        Transforms batch of output data from neural network to masks resized on the processing device.
+
+        Args:
+            data: output data from neural network
+            original_images: input images which were used for predicted data
+
+        Returns:
+            Segmentation masks as uint8 arrays
+
+        """
+        mi = data.amin(dim=(1, 2, 3), keepdim=True)  # Normalizes predictions
+        ma = data.amax(dim=(1, 2, 3), keepdim=True)
+        data = (data - mi) / (ma - mi).clamp_min(1e-8)  # Constant predictions give 0
+        return resize_masks(
+            data, [image.size for image in original_images], mode="bicubic"
+        )
+
+    def optimize_for_inference(self, jit: bool = True):
+        """
+        Fuses batch normalization layers into convolutions
+        and optionally freezes the network with TorchScript.
+        Weights must not be changed after this call. The frozen network keeps its own copy of weights.
+
+        Args:
+            jit: freeze the network with TorchScript. Falls back to the eager network if tracing fails.
+        """
+        self.eval()
+        fuse_conv_bn(self, torch.rand(1, 3, 128, 128, device=self.device))
+        if jit:
+            sample = torch.rand(1, 3, *self.input_image_size[::-1], device=self.device)
+            self.frozen_forward = freeze_network(self, sample)
+
     def __call__(
         self, images: List[Union[str, pathlib.Path, PIL.Image.Image]]
-    ) -> List[PIL.Image.Image]:
+    ) -> List[Union[PIL.Image.Image, np.ndarray]]:
         """
         Passes input images though neural network and returns segmentation masks as PIL.Image.Image instances
 
@@ -116,7 +173,7 @@ class U2NET(U2NETArchitecture):
             images: input images
 
         Returns:
-            segmentation masks as for input images, as PIL.Image.Image instances
+            segmentation masks as for input images, as PIL.Image.Image instances or uint8 arrays depending on mask_format
 
         """
         collect_masks = []
@@ -124,14 +181,16 @@ class U2NET(U2NETArchitecture):
             images = thread_pool_processing(
                 lambda x: convert_image(load_image(x)), image_batch
             )
-            batches = torch.vstack(
-                thread_pool_processing(self.data_preprocessing, images)
-            )
             with torch.no_grad():
-                batches = batches.to(self.device)
-                masks, d2, d3, d4, d5, d6, d7 = super(U2NET, self).__call__(batches)
+                batches = self.data_preprocessing_batch(images)
+                forward = self.frozen_forward or super(U2NET, self).__call__
+                masks = forward(batches)[0]
+                del batches
+                if self.mask_format == "numpy":
+                    collect_masks += self.data_postprocessing_batch(masks, images)
+                    continue
                 masks_cpu = masks.cpu()
-                del d2, d3, d4, d5, d6, d7, batches, masks
+                del masks
             masks = thread_pool_processing(
                 lambda x: self.data_postprocessing(masks_cpu[x], images[x]),
                 range(len(images)),
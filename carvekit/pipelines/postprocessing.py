@@ -3,15 +3,20 @@ Source url: https://github.com/OPHoperHPO/image-background-remove-tool
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+import threading
+from collections import deque
+
 from carvekit.ml.wrap.fba_matting import FBAMatting
-from typing import Union, List
+from typing import Union, List, Optional
+import cv2
+import numpy as np
 from PIL import Image
 from pathlib import Path
 from carvekit.trimap.cv_gen import CV2TrimapGenerator
 from carvekit.trimap.generator import TrimapGenerator
 from carvekit.utils.mask_utils import apply_mask
 from carvekit.utils.pool_utils import thread_pool_processing
-from carvekit.utils.image_utils import load_image, convert_image
+from carvekit.utils.image_utils import load_image, convert_image, thumbnail_size
 
 __all__ = ["MattingMethod"]
 
@@ -27,6 +32,8 @@ class MattingMethod:
         matting_module: Union[FBAMatting],
         trimap_generator: Union[TrimapGenerator, CV2TrimapGenerator],
         device="cpu",
+        matting_resolution_trimaps: bool = False,
+        skip_matting_threshold: float = 0.0,
     ):
         """
         Initializes Matting Method class.
@@ -35,22 +42,33 @@ class MattingMethod:
             matting_module: Initialized matting neural network class
             trimap_generator: Initialized trimap generator class
             device: Processing device used for applying mask to image
+            matting_resolution_trimaps: Generates trimaps from images and masks resized to the input size
+            of the matting neural network instead of full resolution ones. Trimap offsets are scaled to match
+            and only the final alpha matte is upsampled to the image size. Speeds up processing of large images.
+            skip_matting_threshold: Images whose trimap has smaller fraction of unknown area skip the matting
+            neural network and use the segmentation mask thresholded at 127 as alpha matte. 0 disables skipping.
         """
         self.device = device
         self.matting_module = matting_module
         self.trimap_generator = trimap_generator
+        self.matting_resolution_trimaps = matting_resolution_trimaps
+        self.skip_matting_threshold = skip_matting_threshold
+        self._stats_lock = threading.Lock()
+        self._images_count = 0
+        self._skipped_count = 0
+        self._unknown_fractions = deque(maxlen=1024)
 
     def __call__(
         self,
         images: List[Union[str, Path, Image.Image]],
-        masks: List[Union[str, Path, Image.Image]],
+        masks: List[Union[str, Path, Image.Image, np.ndarray]],
     ):
         """
         Passes data through apply_mask function
 
         Args:
             images: list of images
-            masks: list pf masks
+            masks: list pf masks. Masks can be passed as uint8 arrays of the image size.
 
         Returns:
             list of images
@@ -59,18 +77,139 @@ class MattingMethod:
             raise ValueError("Images and Masks lists should have same length!")
         images = thread_pool_processing(lambda x: convert_image(load_image(x)), images)
         masks = thread_pool_processing(
-            lambda x: convert_image(load_image(x), mode="L"), masks
-        )
-        trimaps = thread_pool_processing(
-            lambda x: self.trimap_generator(original_image=images[x], mask=masks[x]),
-            range(len(images)),
+            lambda x: x
+            if isinstance(x, np.ndarray)
+            else convert_image(load_image(x), mode="L"),
+            masks,
         )
-        alpha = self.matting_module(images=images, trimaps=trimaps)
+        if self.matting_resolution_trimaps:
+            alpha = self._matting_resolution_alpha(images, masks)
+        else:
+            trimaps = thread_pool_processing(
+                lambda x: self.trimap_generator(
+                    original_image=images[x], mask=masks[x]
+                ),
+                range(len(images)),
+            )
+            alpha = self._matting(images, trimaps)
         return list(
             map(
                 lambda x: apply_mask(
-                    image=images[x], mask=alpha[x], device=self.device
+                    image=images[x],
+                    mask=self._threshold_mask(masks[x])
+                    if alpha[x] is None
+                    else alpha[x],
+                    device=self.device,
                 ),
                 range(len(images)),
             )
         )
+
+    def skip_stats(self) -> dict:
+        """
+        Returns statistics of matting skipping, which help to tune skip_matting_threshold
+
+        Returns:
+            Dict with count of processed and skipped images, share of skipped images
+            and unknown area fractions of the last 1024 trimaps
+        """
+        with self._stats_lock:
+            return {
+                "images": self._images_count,
+                "skipped": self._skipped_count,
+                "skipped_ratio": self._skipped_count / max(self._images_count, 1),
+                "unknown_fractions": list(self._unknown_fractions),
+            }
+
+    def _matting(
+        self,
+        images: List[Image.Image],
+        trimaps: List[Union[Image.Image, np.ndarray]],
+    ) -> List[Optional[Union[Image.Image, np.ndarray]]]:
+        """
+        Passes images through the matting neural network,
+        except images whose trimap unknown area is smaller than skip_matting_threshold
+
+        Args:
+            images: list of images
+            trimaps: list of trimaps of the images
+
+        Returns:
+            Alpha mattes of the trimap sizes. None for skipped images.
+        """
+        fractions = thread_pool_processing(self._unknown_fraction, trimaps)
+        refined = [
+            x for x in range(len(images)) if fractions[x] >= self.skip_matting_threshold
+        ]
+        with self._stats_lock:
+            self._images_count += len(images)
+            self._skipped_count += len(images) - len(refined)
+            self._unknown_fractions.extend(fractions)
+        alpha = [None] * len(images)
+        if len(refined) > 0:
+            refined_alpha = self.matting_module(
+                images=[images[x] for x in refined],
+                trimaps=[trimaps[x] for x in refined],
+            )
+            for x, matte in zip(refined, refined_alpha):
+                alpha[x] = matte
+        return alpha
+
+    @staticmethod
+    def _unknown_fraction(trimap: Union[Image.Image, np.ndarray]) -> float:
+        """Returns fraction of the trimap pixels which are neither background nor foreground"""
+        trimap = np.asarray(trimap)
+        return float(
+            np.count_nonzero((trimap > 0) & (trimap < 255)) / max(trimap.size, 1)
+        )
+
+    @staticmethod
+    def _threshold_mask(mask: Union[Image.Image, np.ndarray]) -> np.ndarray:
+        """Returns segmentation mask thresholded at 127 as uint8 array"""
+        return np.where(np.asarray(mask) > 127, 255, 0).astype(np.uint8)
+
+    def _matting_resolution_alpha(
+        self,
+        images: List[Image.Image],
+        masks: List[Union[Image.Image, np.ndarray]],
+    ) -> List[Optional[Union[Image.Image, np.ndarray]]]:
+        """
+        Generates trimaps and alpha mattes at the input resolution of the matting neural network
+
+        Args:
+            images: list of images
+            masks: list of masks of the image sizes
+
+        Returns:
+            Alpha mattes of the image sizes. None for images that skipped matting.
+
+        Raises:
+            ValueError: If size of any mask differs from the size of its image
+        """
+
+        def resize(x):
+            image, mask = images[x], masks[x]
+            size = thumbnail_size(image.size, self.matting_module.input_image_size)
+            if size == image.size:
+                return image, self.trimap_generator(original_image=image, mask=mask)
+            mask = np.asarray(mask)
+            if mask.shape[:2] != image.size[::-1]:
+                raise ValueError(
+                    "Sizes of input image and predicted mask doesn't equal"
+                )
+            # Same resampling as in PIL.Image.thumbnail, so the matting module doesn't resize the image again
+            image = image.resize(size, resample=Image.BICUBIC, reducing_gap=2.0)
+            mask = cv2.resize(mask, size, interpolation=cv2.INTER_AREA)
+            generator = self.trimap_generator.scaled(size[0] / images[x].size[0])
+            return image, generator(original_image=image, mask=mask)
+
+        resized = thread_pool_processing(resize, range(len(images)))
+        alpha = self._matting([x[0] for x in resized], [x[1] for x in resized])
+        return thread_pool_processing(
+            lambda x: alpha[x]
+            if alpha[x] is None or alpha[x].size == images[x].size
+            else cv2.resize(
+                np.asarray(alpha[x]), images[x].size, interpolation=cv2.INTER_LINEAR
+            ),
+            range(len(images)),
+        )
@@ -5,74 +5,79 @@ License: Apache License 2.0
 """
 import cv2
 import numpy as np
+from typing import Union
+
 from PIL import Image
 
 
-def prob_filter(mask: Image.Image, prob_threshold=231) -> Image.Image:
+def prob_filter(
+    mask: Union[Image.Image, np.ndarray], prob_threshold=231
+) -> Union[Image.Image, np.ndarray]:
     """
     Applies a filter to the mask by the probability of locating an object in the object area.
 
     Args:
         prob_threshold: Threshold of probability for mark area as background.
-        mask: Predicted object mask
+        mask: Predicted object mask as L PIL image or uint8 array
 
     Raises:
         ValueError if mask or trimap has wrong color mode
 
     Returns:
-        Generated trimap for image.
+        Generated trimap for image. Trimap has the same type as the mask.
     """
-    if mask.mode != "L":
-        raise ValueError("Input mask has wrong color mode.")
+    _check_mode(mask)
     # noinspection PyTypeChecker
     mask_array = np.array(mask)
     mask_array[mask_array > prob_threshold] = 255  # Probability filter for mask
     mask_array[mask_array <= prob_threshold] = 0
-    return Image.fromarray(mask_array).convert("L")
+    return _as_type_of(mask_array, mask)
 
 
 def prob_as_unknown_area(
-    trimap: Image.Image, mask: Image.Image, prob_threshold=255
-) -> Image.Image:
+    trimap: Union[Image.Image, np.ndarray],
+    mask: Union[Image.Image, np.ndarray],
+    prob_threshold=255,
+) -> Union[Image.Image, np.ndarray]:
     """
     Marks any uncertainty in the seg mask as an unknown region.
 
     Args:
         prob_threshold: Threshold of probability for mark area as unknown.
-        trimap: Generated trimap.
-        mask: Predicted object mask
+        trimap: Generated trimap as L PIL image or uint8 array
+        mask: Predicted object mask as L PIL image or uint8 array
 
     Raises:
         ValueError if mask or trimap has wrong color mode
 
     Returns:
-        Generated trimap for image.
+        Generated trimap for image. Trimap has the same type as the input trimap.
     """
-    if mask.mode != "L" or trimap.mode != "L":
-        raise ValueError("Input mask has wrong color mode.")
+    _check_mode(mask)
+    _check_mode(trimap)
     # noinspection PyTypeChecker
-    mask_array = np.array(mask)
+    mask_array = np.asarray(mask)
     # noinspection PyTypeChecker
     trimap_array = np.array(trimap)
     trimap_array[np.logical_and(mask_array <= prob_threshold, mask_array > 0)] = 127
-    return Image.fromarray(trimap_array).convert("L")
+    return _as_type_of(trimap_array, trimap)
 
 
-def post_erosion(trimap: Image.Image, erosion_iters=1) -> Image.Image:
+def post_erosion(
+    trimap: Union[Image.Image, np.ndarray], erosion_iters=1
+) -> Union[Image.Image, np.ndarray]:
     """
     Performs erosion on the mask and marks the resulting area as an unknown region.
 
     Args:
         erosion_iters: The number of iterations of erosion that
         the object's mask will be subjected to before forming an unknown area
-        trimap: Generated trimap.
-        mask: Predicted object mask
+        trimap: Generated trimap as L PIL image or uint8 array
 
     Returns:
-        Generated trimap for image.
+        Generated trimap for image. Trimap has the same type as the input trimap.
     """
-    if trimap.mode != "L":
-        raise ValueError("Input mask has wrong color mode.")
+    _check_mode(trimap)
     # noinspection PyTypeChecker
     trimap_array = np.array(trimap)
     if erosion_iters > 0:
@@ -88,4 +93,22 @@ def post_erosion(trimap: Image.Image, erosion_iters=1) -> Image.Image:
         erode = trimap_array.copy()
     else:
         erode = trimap_array.copy()
-    return Image.fromarray(erode).convert("L")
+    return _as_type_of(erode, trimap)
+
+
+def _check_mode(mask: Union[Image.Image, np.ndarray]):
+    """Raises ValueError if the mask isn't L PIL image or 2D uint8 array"""
+    if isinstance(mask, np.ndarray):
+        if mask.ndim != 2 or mask.dtype != np.uint8:
+            raise ValueError("Input mask has wrong shape or dtype.")
+    elif mask.mode != "L":
+        raise ValueError("Input mask has wrong color mode.")
+
+
+def _as_type_of(
+    array: np.ndarray, like: Union[Image.Image, np.ndarray]
+) -> Union[Image.Image, np.ndarray]:
+    """Returns array as L PIL image if like is PIL image"""
+    if isinstance(like, np.ndarray):
+        return array
+    return Image.fromarray(array).convert("L")
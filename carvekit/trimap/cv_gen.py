@@ -3,10 +3,21 @@ Source url: https://github.com/OPHoperHPO/image-background-remove-tool
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+import copy
+from typing import Union
+
 import PIL.Image
 import cv2
 import numpy as np
 
+# Maps dilated mask values to trimap values outside the object:
+# WHITE to GRAY, GRAY stays GRAY, values below GRAY and above 200 to BLACK, 200 to WHITE.
+_DILATION_LUT = np.arange(256, dtype=np.uint8)
+_DILATION_LUT[:127] = 0
+_DILATION_LUT[201:] = 0
+_DILATION_LUT[200] = 255
+_DILATION_LUT[255] = 127
+
 
 class CV2TrimapGenerator:
     def __init__(self, kernel_size: int = 30, erosion_iters: int = 1):
@@ -23,42 +34,92 @@ class CV2TrimapGenerator:
         self.erosion_iters = erosion_iters
 
     def __call__(
-        self, original_image: PIL.Image.Image, mask: PIL.Image.Image
-    ) -> PIL.Image.Image:
+        self,
+        original_image: Union[PIL.Image.Image, np.ndarray],
+        mask: Union[PIL.Image.Image, np.ndarray],
+    ) -> Union[PIL.Image.Image, np.ndarray]:
         """
         Generates trimap based on predicted object mask to refine object mask borders.
         Based on cv2 erosion algorithm.
 
         Args:
             original_image: Original image
-            mask: Predicted object mask
+            mask: Predicted object mask as L PIL image or uint8 array
 
         Returns:
-            Generated trimap for image.
+            Generated trimap for image. Trimap is uint8 array if mask is array.
         """
-        if mask.mode != "L":
-            raise ValueError("Input mask has wrong color mode.")
-        if mask.size != original_image.size:
-            raise ValueError("Sizes of input image and predicted mask doesn't equal")
-        # noinspection PyTypeChecker
-        mask_array = np.array(mask)
-        pixels = 2 * self.kernel_size + 1
-        kernel = np.ones((pixels, pixels), np.uint8)
-
+        mask_array = self._mask_array(original_image, mask)
         if self.erosion_iters > 0:
             erosion_kernel = np.ones((3, 3), np.uint8)
             erode = cv2.erode(mask_array, erosion_kernel, iterations=self.erosion_iters)
-            erode = np.where(erode == 0, 0, mask_array)
+            erode = np.where(erode == 0, np.uint8(0), mask_array)
         else:
-            erode = mask_array.copy()
+            erode = mask_array
+
+        kernel = cv2.getStructuringElement(
+            cv2.MORPH_RECT, (2 * self.kernel_size + 1, 2 * self.kernel_size + 1)
+        )
+        trimap = cv2.LUT(cv2.dilate(erode, kernel, iterations=1), _DILATION_LUT)
+        trimap[erode > 127] = 255  # mark the tumor inside WHITE
+
+        if isinstance(mask, np.ndarray):
+            return trimap
+        return PIL.Image.fromarray(trimap).convert("L")
 
-        dilation = cv2.dilate(erode, kernel, iterations=1)
+    def scaled(self, scale: float) -> "CV2TrimapGenerator":
+        """
+        Creates a copy of the generator for masks resized by the scale factor
 
-        dilation = np.where(dilation == 255, 127, dilation)  # WHITE to GRAY
-        trimap = np.where(erode > 127, 200, dilation)  # mark the tumor inside GRAY
+        Args:
+            scale: Ratio of the resized mask size to the original mask size
 
-        trimap = np.where(trimap < 127, 0, trimap)  # Embelishment
-        trimap = np.where(trimap > 200, 0, trimap)  # Embelishment
-        trimap = np.where(trimap == 200, 255, trimap)  # GRAY to WHITE
+        Returns:
+            Trimap generator with offsets in pixels scaled to the resized masks
+        """
+        generator = copy.copy(self)
+        generator.kernel_size = self._scale_offset(self.kernel_size, scale)
+        generator.erosion_iters = self._scale_offset(self.erosion_iters, scale)
+        return generator
 
-        return PIL.Image.fromarray(trimap).convert("L")
+    @staticmethod
+    def _scale_offset(offset: int, scale: float) -> int:
+        """Scales offset in pixels. Non-zero offsets stay non-zero."""
+        if offset <= 0:
+            return offset
+        return max(round(offset * scale), 1)
+
+    @staticmethod
+    def _mask_array(
+        original_image: Union[PIL.Image.Image, np.ndarray],
+        mask: Union[PIL.Image.Image, np.ndarray],
+    ) -> np.ndarray:
+        """
+        Checks the mask and returns it as uint8 array
+
+        Args:
+            original_image: Original image
+            mask: Predicted object mask as L PIL image or uint8 array
+
+        Returns:
+            Mask as uint8 array. Array mask is returned as is.
+
+        Raises:
+            ValueError: If mask has wrong color mode or its size differs from the image size
+        """
+        if isinstance(mask, np.ndarray):
+            mask_array = mask
+            mask_size = (mask.shape[1], mask.shape[0])
+        else:
+            if mask.mode != "L":
+                raise ValueError("Input mask has wrong color mode.")
+            # noinspection PyTypeChecker
+            mask_array = np.array(mask)
+            mask_size = mask.size
+        if isinstance(original_image, np.ndarray):
+            image_size = (original_image.shape[1], original_image.shape[0])
+        else:
+            image_size = original_image.size
+        if mask_size != image_size:
+            raise ValueError("Sizes of input image and predicted mask doesn't equal")
+        return mask_array
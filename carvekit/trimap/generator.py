@@ -3,9 +3,17 @@ Source url: https://github.com/OPHoperHPO/image-background-remove-tool
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+from typing import Union
+
+import cv2
+import numpy as np
 from PIL import Image
 from carvekit.trimap.cv_gen import CV2TrimapGenerator
-from carvekit.trimap.add_ops import prob_filter, prob_as_unknown_area, post_erosion
+from carvekit.trimap.add_ops import _check_mode
+
+# Box filter cost doesn't depend on the kernel size, so it replaces dilation for large kernels.
+# Its float32 sums are exact while the kernel area is less than 2 ** 24.
+_BOX_FILTER_RADIUS_RANGE = (32, 2048)
 
 
 class TrimapGenerator(CV2TrimapGenerator):
@@ -27,21 +35,79 @@ class TrimapGenerator(CV2TrimapGenerator):
         self.prob_threshold = prob_threshold
         self.__erosion_iters = erosion_iters
 
-    def __call__(self, original_image: Image.Image, mask: Image.Image) -> Image.Image:
+    def __call__(
+        self,
+        original_image: Union[Image.Image, np.ndarray],
+        mask: Union[Image.Image, np.ndarray],
+    ) -> Union[Image.Image, np.ndarray]:
         """
         Generates trimap based on predicted object mask to refine object mask borders.
         Based on cv2 erosion algorithm and additional prob. filters.
+        Gives the same trimap as prob_filter, CV2TrimapGenerator, prob_as_unknown_area
+        and post_erosion applied one by one, but in a single pass over uint8 arrays.
+
         Args:
             original_image: Original image
-            mask: Predicted object mask
+            mask: Predicted object mask as L PIL image or uint8 array
 
         Returns:
-            Generated trimap for image.
+            Generated trimap for image. Trimap is uint8 array if mask is array.
         """
-        filter_mask = prob_filter(mask=mask, prob_threshold=self.prob_threshold)
-        trimap = super(TrimapGenerator, self).__call__(original_image, filter_mask)
-        new_trimap = prob_as_unknown_area(
-            trimap=trimap, mask=mask, prob_threshold=self.prob_threshold
+        _check_mode(mask)
+        mask_array = self._mask_array(original_image, mask)
+        foreground = (mask_array > self.prob_threshold).view(np.uint8)
+
+        # Object surroundings and any uncertainty in the seg mask are the unknown area
+        trimap = _dilate_binary(foreground, self.kernel_size)
+        np.maximum(trimap, mask_array, out=trimap)
+        np.minimum(trimap, 1, out=trimap)
+        trimap *= 127
+
+        # Eroded object mask is the foreground area
+        background = np.subtract(1, foreground, out=foreground)
+        trimap[_dilate_binary(background, self.__erosion_iters) == 0] = 255
+
+        if isinstance(mask, np.ndarray):
+            return trimap
+        return Image.fromarray(trimap).convert("L")
+
+    def scaled(self, scale: float) -> "TrimapGenerator":
+        """
+        Creates a copy of the generator for masks resized by the scale factor
+
+        Args:
+            scale: Ratio of the resized mask size to the original mask size
+
+        Returns:
+            Trimap generator with offsets in pixels scaled to the resized masks
+        """
+        generator = super(TrimapGenerator, self).scaled(scale)
+        generator.__erosion_iters = self._scale_offset(self.__erosion_iters, scale)
+        return generator
+
+
+def _dilate_binary(mask: np.ndarray, radius: int) -> np.ndarray:
+    """
+    Dilates binary mask with a square kernel. Pixels outside the mask are treated as zeros.
+
+    Args:
+        mask: uint8 array with 0 and 1 values
+        radius: Offset from the mask in pixels
+
+    Returns:
+        New uint8 array with 0 and 1 values
+    """
+    if radius <= 0:
+        return mask.copy()
+    size = 2 * radius + 1
+    if _BOX_FILTER_RADIUS_RANGE[0] <= radius < _BOX_FILTER_RADIUS_RANGE[1]:
+        counts = cv2.boxFilter(
+            mask,
+            cv2.CV_32F,
+            (size, size),
+            normalize=False,
+            borderType=cv2.BORDER_CONSTANT,
         )
-        new_trimap = post_erosion(new_trimap, self.__erosion_iters)
-        return new_trimap
+        return (counts > 0.5).view(np.uint8)
+    # OpenCV applies rectangular kernels as separate row and column passes
+    return cv2.dilate(mask, cv2.getStructuringElement(cv2.MORPH_RECT, (size, size)))
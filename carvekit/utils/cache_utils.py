@@ -0,0 +1,177 @@
+"""
+Source url: https://github.com/OPHoperHPO/image-background-remove-tool
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import warnings
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+import PIL.Image
+
+__all__ = ["AlphaCache"]
+
+
+class AlphaCache:
+    """
+    Content-addressed cache of alpha mattes.
+    Mattes are kept in an in-memory LRU and, optionally, in a directory on disk.
+    """
+
+    def __init__(
+        self,
+        max_memory_size: int = 256 * 1024 * 1024,
+        cache_dir: Optional[Union[str, Path]] = None,
+        max_disk_size: int = 1024 * 1024 * 1024,
+        namespace: str = "",
+    ):
+        """
+        Initializes alpha mattes cache.
+
+        Args:
+            max_memory_size: Maximum size of mattes kept in memory in bytes
+            cache_dir: Directory for the on-disk tier of the cache. Disk tier is disabled if None.
+            max_disk_size: Maximum size of the on-disk tier in bytes
+            namespace: Any string describing settings that affect the matte, e.g. used neural networks.
+            It is mixed into keys, so mattes computed with different settings are never mixed up.
+        """
+        self.max_memory_size = max_memory_size
+        self.max_disk_size = max_disk_size
+        self.namespace = namespace
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        # Running total of the on-disk tier size, the directory is scanned only when it exceeds the limit.
+        # It is an estimate if several processes share the directory, so the scan recalculates it.
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        if self.cache_dir is not None:
+            self._evict_disk()
+
+    def key(self, image: PIL.Image.Image) -> str:
+        """
+        Calculates the cache key of the image from its decoded pixels
+
+        Args:
+            image: input image
+
+        Returns:
+            Hex digest of the image pixels, size, color mode and cache namespace
+        """
+        digest = hashlib.blake2b(digest_size=32)
+        digest.update(f"{self.namespace}|{image.mode}|{image.size}|".encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[PIL.Image.Image]:
+        """
+        Returns cached alpha matte
+
+        Args:
+            key: cache key of the image
+
+        Returns:
+            Alpha matte as L PIL image or None if there is no matte for this key
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        if self.cache_dir is None:
+            return None
+        path = self.cache_dir.joinpath(key).with_suffix(".png")
+        try:
+            with PIL.Image.open(path) as image:
+                alpha = image.convert("L")
+            os.utime(path)  # Mark as recently used for eviction
+        except (FileNotFoundError, OSError):
+            return None
+        self._put_memory(key, alpha)
+        return alpha
+
+    def put(self, key: str, alpha: PIL.Image.Image):
+        """
+        Stores alpha matte in the cache
+
+        Args:
+            key: cache key of the image
+            alpha: alpha matte of the image
+        """
+        alpha = alpha.convert("L")
+        self._put_memory(key, alpha)
+        if self.cache_dir is None:
+            return
+        path = self.cache_dir.joinpath(key).with_suffix(".png")
+        try:
+            # Unique name, so threads and processes sharing the directory don't write the same file
+            tmp_file = tempfile.NamedTemporaryFile(
+                dir=self.cache_dir, suffix=".tmp", delete=False
+            )
+        except OSError as e:
+            warnings.warn(f"Failed to save alpha matte to disk cache: {str(e)}")
+            return
+        tmp_path = Path(tmp_file.name)
+        try:
+            with tmp_file:
+                alpha.save(tmp_file, "PNG")
+            size = tmp_path.stat().st_size
+            try:
+                old_size = path.stat().st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            warnings.warn(f"Failed to save alpha matte to disk cache: {str(e)}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        with self._lock:
+            self._disk_size += size - old_size
+            exceeded = self._disk_size > self.max_disk_size
+        if exceeded:
+            self._evict_disk()
+
+    def _put_memory(self, key: str, alpha: PIL.Image.Image):
+        """Stores alpha matte in memory tier and evicts least recently used mattes"""
+        size = self._image_size(alpha)
+        if size > self.max_memory_size:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory_size -= self._image_size(self._memory.pop(key))
+            self._memory[key] = alpha
+            self._memory_size += size
+            while self._memory_size > self.max_memory_size:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= self._image_size(evicted)
+
+    def _evict_disk(self):
+        """Removes least recently used mattes while disk tier is larger than allowed"""
+        files = []
+        for path in self.cache_dir.glob("*.png"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(x[1] for x in files)
+        for _, size, path in sorted(files, key=lambda x: x[0]):
+            if total_size <= self.max_disk_size:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        with self._lock:
+            self._disk_size = total_size
+
+    @staticmethod
+    def _image_size(image: PIL.Image.Image) -> int:
+        return image.size[0] * image.size[1]
@@ -4,13 +4,16 @@
     License: Apache License 2.0
 """
 
+import math
 import pathlib
-from typing import Union, Any, Tuple
+from typing import Union, Any, Tuple, List
 
 import PIL.Image
 import numpy as np
 import torch
 
+from carvekit.utils.pool_utils import thread_pool_processing
+
 ALLOWED_SUFFIXES = [".jpg", ".jpeg", ".bmp", ".png", ".webp"]
 
 
@@ -148,3 +151,120 @@ def add_margin(
     result = PIL.Image.new(pil_img.mode, (new_width, new_height), color)
     result.paste(pil_img, (left, top))
     return result
+
+
+def images_to_uint8_batch(
+    images: List[PIL.Image.Image],
+    size: Tuple[int, int],
+    resample: int = PIL.Image.BICUBIC,
+) -> torch.Tensor:
+    """
+    Resizes RGB images and stacks them into one uint8 batch without float conversions.
+    Large images are reduced by an integer factor before resampling.
+
+    Args:
+        images: RGB images
+        size: target size (width, height)
+        resample: PIL resampling filter
+
+    Returns:
+        uint8 tensor with NCHW shape
+    """
+    batch = torch.empty((len(images), size[1], size[0], 3), dtype=torch.uint8)
+    batch_np = batch.numpy()
+
+    def fill(idx: int):
+        batch_np[idx] = np.asarray(
+            images[idx].resize(size, resample=resample, reducing_gap=3.0)
+        )
+
+    thread_pool_processing(fill, range(len(images)))
+    return batch.permute(0, 3, 1, 2)
+
+
+def normalize_batch(
+    batch: torch.Tensor,
+    device="cpu",
+    dtype: torch.dtype = torch.float32,
+    mean: Tuple[float, float, float] = (0.485, 0.456, 0.406),
+    std: Tuple[float, float, float] = (0.229, 0.224, 0.225),
+    per_image_max: bool = False,
+) -> torch.Tensor:
+    """
+    Moves uint8 batch to the processing device and normalizes it there.
+
+    Args:
+        batch: uint8 tensor with NCHW shape
+        device: processing device
+        dtype: dtype of the normalized batch
+        mean: mean of every channel
+        std: standard deviation of every channel
+        per_image_max: divides every image by its maximum value instead of 255
+
+    Returns:
+        Normalized contiguous batch
+    """
+    batch = batch.to(device).to(dtype).contiguous()
+    if per_image_max:
+        maximum = batch.amax(dim=(1, 2, 3), keepdim=True)
+        batch /= torch.where(maximum == 0, torch.ones_like(maximum), maximum)
+    else:
+        batch /= 255
+    batch -= torch.tensor(mean, device=batch.device, dtype=dtype).view(1, 3, 1, 1)
+    batch /= torch.tensor(std, device=batch.device, dtype=dtype).view(1, 3, 1, 1)
+    return batch
+
+
+def resize_masks(
+    masks: torch.Tensor, sizes: List[Tuple[int, int]], mode: str = "bilinear"
+) -> List[np.ndarray]:
+    """
+    Resizes batch of masks on their processing device and converts them to uint8 arrays
+
+    Args:
+        masks: masks with values in [0, 1] range and N1HW shape
+        sizes: target size (width, height) of every mask
+        mode: interpolation mode of torch.nn.functional.interpolate
+
+    Returns:
+        List of uint8 masks with HW shape
+    """
+    results = []
+    for mask, size in zip(masks, sizes):
+        mask = torch.nn.functional.interpolate(
+            mask[None].float(),
+            size=(size[1], size[0]),
+            mode=mode,
+            align_corners=False if mode in ["bilinear", "bicubic"] else None,
+        )
+        mask = mask.clamp_(0, 1).mul_(255).round_().to(torch.uint8)
+        results.append(mask[0, 0].cpu().numpy())
+    return results
+
+
+def thumbnail_size(size: Tuple[int, int], max_size: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Calculates the size of the image after PIL.Image.thumbnail call,
+    so arrays and masks can be resized exactly as images.
+
+    Args:
+        size: image size (width, height)
+        max_size: maximum size (width, height)
+
+    Returns:
+        New size (width, height)
+    """
+    x, y = map(math.floor, max_size)
+    width, height = size
+    if x >= width and y >= height:
+        return size
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
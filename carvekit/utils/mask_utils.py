@@ -3,9 +3,10 @@ Source url: https://github.com/OPHoperHPO/image-background-remove-tool
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+from typing import Union
+
+import numpy as np
 import PIL.Image
-import torch
-from carvekit.utils.image_utils import to_tensor
 
 
 def composite(
@@ -19,7 +20,7 @@ def composite(
     https://pymatting.github.io/intro.html#alpha-matting math formula.
 
     Args:
-        device: Processing device
+        device: Processing device. Not used, kept for compatibility.
         foreground: Image that will be pasted to background image with following alpha mask.
         background: Background image
         alpha: Alpha Image
@@ -27,46 +28,46 @@ def composite(
     Returns:
         Composited image as PIL.Image instance.
     """
+    fg = np.asarray(_to_mode(foreground, "RGB"))
+    bg = np.asarray(_to_mode(background, "RGB"))
+    alpha = np.asarray(_to_mode(alpha, "L"))
 
-    foreground = foreground.convert("RGBA")
-    background = background.convert("RGBA")
-    alpha_rgba = alpha.convert("RGBA")
-    alpha_l = alpha.convert("L")
-
-    fg = to_tensor(foreground).to(device)
-    alpha_rgba = to_tensor(alpha_rgba).to(device)
-    alpha_l = to_tensor(alpha_l).to(device)
-    bg = to_tensor(background).to(device)
-
-    alpha_l = alpha_l / 255
-    alpha_rgba = alpha_rgba / 255
-
-    bg = torch.where(torch.logical_not(alpha_rgba >= 1), bg, fg)
-    bg[:, :, 0] = alpha_l[:, :] * fg[:, :, 0] + (1 - alpha_l[:, :]) * bg[:, :, 0]
-    bg[:, :, 1] = alpha_l[:, :] * fg[:, :, 1] + (1 - alpha_l[:, :]) * bg[:, :, 1]
-    bg[:, :, 2] = alpha_l[:, :] * fg[:, :, 2] + (1 - alpha_l[:, :]) * bg[:, :, 2]
-    bg[:, :, 3] = alpha_l[:, :] * 255
-
-    del alpha_l, alpha_rgba, fg
-    return PIL.Image.fromarray(bg.cpu().numpy()).convert("RGBA")
+    result = np.empty((*alpha.shape, 4), dtype=np.uint8)
+    alpha_16 = alpha[:, :, np.newaxis].astype(np.uint16)
+    rgb = fg * alpha_16
+    rgb += bg * (255 - alpha_16)
+    rgb += 127  # Rounds the division below
+    rgb //= 255
+    result[:, :, :3] = rgb
+    result[:, :, 3] = alpha
+    return PIL.Image.fromarray(result, "RGBA")
 
 
 def apply_mask(
-    image: PIL.Image.Image, mask: PIL.Image.Image, device="cpu"
+    image: PIL.Image.Image, mask: Union[PIL.Image.Image, np.ndarray], device="cpu"
 ) -> PIL.Image.Image:
     """
     Applies mask to foreground.
+    The mask is attached to the image as alpha channel, colors of the image are not changed.
 
     Args:
-        device: Processing device.
+        device: Processing device. Not used, kept for compatibility.
         image: Image with background.
-        mask: Alpha Channel mask for this image.
+        mask: Alpha Channel mask for this image as PIL image or uint8 array.
 
     Returns:
         Image without background, where mask was black.
     """
-    background = PIL.Image.new("RGBA", image.size, color=(130, 130, 130, 0))
-    return composite(image, background, mask, device=device).convert("RGBA")
+    if isinstance(mask, np.ndarray):
+        mask = PIL.Image.fromarray(mask, "L")
+    result = image.convert("RGB")  # Always a new image, so input isn't modified
+    result.putalpha(_to_mode(mask, "L"))
+    return result
+
+
+def _to_mode(image: PIL.Image.Image, mode: str) -> PIL.Image.Image:
+    """Converts image to the color mode without copying if it already has this mode"""
+    return image if image.mode == mode else image.convert(mode)
 
 
 def extract_alpha_channel(image: PIL.Image.Image) -> PIL.Image.Image:
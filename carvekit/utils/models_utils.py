@@ -6,10 +6,12 @@ License: Apache License 2.0
 
 import random
 import warnings
-from typing import Union, Tuple, Any
+from collections import Counter
+from typing import Union, Tuple, Any, Callable, Optional
 
 import torch
-from torch import autocast
+from torch import autocast, nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 
 
 class EmptyAutocast(object):
@@ -95,6 +97,150 @@ def cast_network(network: torch.nn.Module, dtype: torch.dtype):
         raise ValueError(f"Unknown dtype {dtype}")
 
 
+def fuse_conv_bn(network: nn.Module, sample: torch.Tensor) -> int:
+    """
+    Fuses BatchNorm2d layers into preceding Conv2d layers of the network in evaluation mode.
+    Pairs are found by passing the sample through the network. A pair is fused only if
+    the output of the convolution is used by the batch normalization alone.
+
+    Args:
+        network: Network in evaluation mode
+        sample: Input sample for the network
+
+    Returns:
+        Count of fused pairs
+    """
+    parents = {}
+    for parent_name, parent in network.named_modules():
+        for name, child in parent.named_children():
+            parents.setdefault(child, []).append((parent, name))
+
+    calls = Counter()
+    conv_outputs = {}
+    bn_inputs = {}
+
+    def conv_hook(module, inputs, output):
+        calls[module] += 1
+        conv_outputs[module] = (output, output._version)
+
+    def bn_pre_hook(module, inputs):
+        calls[module] += 1
+        bn_inputs[module] = (inputs[0], inputs[0]._version)
+
+    handles = []
+    for module in network.modules():
+        if isinstance(module, nn.Conv2d):
+            handles.append(module.register_forward_hook(conv_hook))
+        elif isinstance(module, nn.BatchNorm2d):
+            handles.append(module.register_forward_pre_hook(bn_pre_hook))
+    try:
+        with torch.enable_grad():
+            # Wrappers of networks override __call__, so forward is called directly
+            outputs = network.forward(sample)
+    finally:
+        for handle in handles:
+            handle.remove()
+
+    # Counts consumers of every node of the autograd graph
+    consumers = Counter()
+    outputs = outputs if isinstance(outputs, (list, tuple)) else [outputs]
+    stack = [o.grad_fn for o in outputs if isinstance(o, torch.Tensor) and o.grad_fn]
+    visited = set()
+    while stack:
+        node = stack.pop()
+        if node in visited:
+            continue
+        visited.add(node)
+        for next_node, _ in node.next_functions:
+            if next_node is not None:
+                consumers[next_node] += 1
+                stack.append(next_node)
+
+    conv_by_output = {
+        id(output): (conv, version) for conv, (output, version) in conv_outputs.items()
+    }
+    fused = 0
+    for bn, (bn_input, bn_version) in bn_inputs.items():
+        conv, conv_version = conv_by_output.get(id(bn_input), (None, None))
+        if (
+            conv is None
+            or conv_version != bn_version
+            or consumers[bn_input.grad_fn] != 1
+            or calls[conv] != 1
+            or calls[bn] != 1
+            or len(parents.get(conv, [])) != 1
+            or len(parents.get(bn, [])) != 1
+        ):
+            continue
+        conv_parent, conv_name = parents[conv][0]
+        bn_parent, bn_name = parents[bn][0]
+        setattr(conv_parent, conv_name, fuse_conv_bn_eval(conv, bn))
+        setattr(bn_parent, bn_name, nn.Identity())
+        fused += 1
+    return fused
+
+
+def replace_modules(
+    network: nn.Module, module_type: type, factory: Callable[[nn.Module], nn.Module]
+) -> int:
+    """
+    Replaces all modules of the given type in the network
+
+    Args:
+        network: Network
+        module_type: Type of modules to be replaced
+        factory: Function that returns new module for the replaced one
+
+    Returns:
+        Count of replaced modules
+    """
+    replaced = 0
+    for parent in list(network.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, module_type):
+                setattr(parent, name, factory(child))
+                replaced += 1
+    return replaced
+
+
+class _Forward(nn.Module):
+    """Calls forward of the wrapped network, since wrappers of networks override __call__"""
+
+    def __init__(self, network: nn.Module):
+        super().__init__()
+        self.network = network
+
+    def forward(self, x):
+        return self.network.forward(x)
+
+
+def freeze_network(
+    network: nn.Module, sample: torch.Tensor
+) -> Optional[Callable[[torch.Tensor], Any]]:
+    """
+    Traces the network with the sample and freezes it with TorchScript for inference
+
+    Args:
+        network: Network in evaluation mode
+        sample: Input sample for the network. It must have the dtype of inputs used for inference,
+            since the frozen network keeps weights in the dtype they had during tracing
+
+    Returns:
+        Forward function of the frozen network or None if the network can't be traced
+    """
+    try:
+        with torch.no_grad(), warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=torch.jit.TracerWarning)
+            warnings.simplefilter("ignore", category=FutureWarning)
+            # torch.jit.optimize_for_inference isn't used, since its MKLDNN layouts
+            # slow down depthwise convolutions of EfficientNet on CPU
+            frozen = torch.jit.freeze(torch.jit.trace(_Forward(network).eval(), sample))
+    except Exception as e:
+        warnings.warn(f"Failed to freeze network with TorchScript: {str(e)}")
+        return None
+    return frozen.forward
+
+
 def fix_seed(seed=42):
     """Sets fixed random seed
 
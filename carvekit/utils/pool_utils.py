@@ -3,8 +3,11 @@ Source url: https://github.com/OPHoperHPO/image-background-remove-tool
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+import queue
+import threading
 from concurrent.futures import ThreadPoolExecutor
-from typing import Any, Iterable
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Sequence, Tuple
 
 
 def thread_pool_processing(func: Any, data: Iterable, workers=18):
@@ -35,6 +38,127 @@ def batch_generator(iterable, n=1):
     Returns:
         new n-size packet
     """
+    if not isinstance(iterable, Sequence):
+        # Generators and other iterables without len are consumed lazily
+        iterator = iter(iterable)
+        packet = list(islice(iterator, n))
+        while packet:
+            yield packet
+            packet = list(islice(iterator, n))
+        return
     it = len(iterable)
     for ndx in range(0, it, n):
         yield iterable[ndx : min(ndx + n, it)]
+
+
+def bucket_batch_generator(
+    sizes: Sequence[Tuple[int, int]], n=1
+) -> Iterator[List[int]]:
+    """
+    Splits indices of images into n-size packets of images with similar shape.
+    Images are sorted by aspect ratio and then by area, so every packet can be padded
+    to the size of its largest image with little waste.
+
+    Args:
+        sizes: sizes of images (width, height)
+        n: size of packets
+
+    Returns:
+        new n-size packet of indices. Results should be put back by these indices to restore the order.
+    """
+    order = sorted(
+        range(len(sizes)),
+        key=lambda i: (sizes[i][0] / max(sizes[i][1], 1), sizes[i][0] * sizes[i][1]),
+    )
+    yield from batch_generator(order, n)
+
+
+class _PipelineError:
+    """Wraps an exception raised inside a pipeline stage to pass it to the consumer"""
+
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+_PIPELINE_END = object()
+
+
+def pipeline_processing(
+    stages: Sequence[Callable[[Any], Any]], data: Iterable, queue_size=2
+) -> Iterator[Any]:
+    """
+    Passes all iterator data through the chain of stages.
+    Every stage runs in its own thread and is connected to the next one by a bounded queue,
+    so different items are processed by different stages at the same time.
+
+    Args:
+        stages: functions to pass data through, in order of execution
+        data: input iterator
+        queue_size: maximum count of items waiting between two stages
+
+    Returns:
+        iterator over results of the last stage in order of input data
+
+    Raises:
+        Any exception raised by a stage. It is re-raised by the consumer of results.
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=max(queue_size, 1)) for _ in range(len(stages) + 1)]
+
+    def put(q: queue.Queue, item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def feeder():
+        try:
+            for item in data:
+                if not put(queues[0], item):
+                    return
+        except BaseException as e:
+            put(queues[0], _PipelineError(e))
+            return
+        put(queues[0], _PIPELINE_END)
+
+    def worker(func: Callable[[Any], Any], q_in: queue.Queue, q_out: queue.Queue):
+        while not stop.is_set():
+            try:
+                item = q_in.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _PIPELINE_END or isinstance(item, _PipelineError):
+                put(q_out, item)
+                return
+            try:
+                result = func(item)
+            except BaseException as e:
+                put(q_out, _PipelineError(e))
+                return
+            if not put(q_out, result):
+                return
+
+    threads = [threading.Thread(target=feeder, daemon=True)]
+    threads += [
+        threading.Thread(
+            target=worker, args=(stage, queues[i], queues[i + 1]), daemon=True
+        )
+        for i, stage in enumerate(stages)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _PIPELINE_END:
+                break
+            elif isinstance(item, _PipelineError):
+                raise item.exception
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -6,7 +6,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from starlette.staticfiles import StaticFiles
 
 from carvekit import version
-from carvekit.web.deps import config
+from carvekit.web.deps import config, ml_processor
 from carvekit.web.routers.api_router import api_router
 
 app = FastAPI(title="CarveKit Web API", version=version)
@@ -19,6 +19,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("shutdown")
+def shutdown():
+    ml_processor.close()
+
+
 app.include_router(api_router, prefix="/api")
 app.mount(
     "/",
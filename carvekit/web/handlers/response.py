@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Union, Tuple
 
 from fastapi import Header
 from fastapi.responses import Response, JSONResponse
@@ -16,22 +16,22 @@ def Authenticate(x_api_key: Union[str, None] = Header(None)) -> Union[bool, str]
         return False
 
 
-def handle_response(response, original_image) -> Response:
+def handle_response(response, original_size: Tuple[int, int]) -> Response:
     """
     Response handler from TaskQueue
     :param response: TaskQueue response
-    :param original_image: Original PIL image
+    :param original_size: Size of original PIL image
     :return: Complete flask response
     """
     response_object = None
     if isinstance(response, dict):
         if response["type"] == "jpg":
             response_object = Response(
-                content=response["data"][0].read(), media_type="image/jpeg"
+                content=response["data"][0].getvalue(), media_type="image/jpeg"
             )
         elif response["type"] == "png":
             response_object = Response(
-                content=response["data"][0].read(), media_type="image/png"
+                content=response["data"][0].getvalue(), media_type="image/png"
             )
         elif response["type"] == "zip":
             response_object = Response(
@@ -44,8 +44,8 @@ def handle_response(response, original_image) -> Response:
         # Add headers to output result
         response_object.headers["X-Credits-Charged"] = "0"
         response_object.headers["X-Type"] = "other"  # TODO Make support for this
-        response_object.headers["X-Max-Width"] = str(original_image.size[0])
-        response_object.headers["X-Max-Height"] = str(original_image.size[1])
+        response_object.headers["X-Max-Width"] = str(original_size[0])
+        response_object.headers["X-Max-Height"] = str(original_size[1])
         response_object.headers[
             "X-Ratelimit-Limit"
         ] = "500"  # TODO Make ratelimit support
@@ -55,7 +55,7 @@ def handle_response(response, original_image) -> Response:
         response_object.headers["X-Height"] = str(response["data"][1][1])
 
     else:
-        response = JSONResponse(content=response[0])
-        response.headers["X-Credits-Charged"] = "0"
+        response_object = JSONResponse(content=response[0], status_code=response[1])
+        response_object.headers["X-Credits-Charged"] = "0"
 
     return response_object
@@ -1,12 +1,12 @@
 import io
 import time
 import zipfile
+from typing import List, Tuple
 
+import numpy as np
 import requests
 from PIL import Image, ImageColor
 
-from carvekit.utils.image_utils import transparency_paste, add_margin
-from carvekit.utils.mask_utils import extract_alpha_channel
 from carvekit.web.responses.api import error_dict
 from carvekit.api.interface import Interface
 
@@ -24,6 +24,39 @@ def process_remove_bg(
         image: foreground pil image
         params: parameters
     """
+    prepared = prepare_remove_bg(params, image)
+    if is_error_response(prepared):
+        return prepared
+    new_image, roi_box = prepared
+    alpha = matte_remove_bg(interface, [new_image])[0]
+    return render_remove_bg(params, image, alpha, roi_box, bg, is_json_or_www_encoded)
+
+
+def is_error_response(response) -> bool:
+    """
+    Checks if the response of removebg api method handlers is an error
+
+    Args:
+        response: response of prepare_remove_bg, render_remove_bg or process_remove_bg
+
+    Returns:
+        True if the response is an (error dict, status code) pair
+    """
+    return isinstance(response, tuple) and isinstance(response[0], dict)
+
+
+def prepare_remove_bg(params, image):
+    """
+    Resizes the image and cuts the region of interest out of it
+    before passing it to the neural networks.
+
+    Args:
+        params: parameters
+        image: foreground pil image. It is resized in place according to the size parameter.
+
+    Returns:
+        Image for the neural networks and roi box or error response.
+    """
     h, w = image.size
     if h < 2 or w < 2:
         return error_dict("Image is too small. Minimum size 2x2"), 400
@@ -107,20 +140,63 @@ def process_remove_bg(
     h, w = new_image.size
     if h < 2 or w < 2:
         return error_dict("Image is too small. Minimum size 2x2"), 400
-    new_image = interface([new_image])[0]
+    return new_image, roi_box
+
+
+def matte_remove_bg(interface, images: List[Image.Image]) -> List[Image.Image]:
+    """
+    Computes alpha mattes of the images prepared by prepare_remove_bg.
+    This is the only expensive step of the removebg api method,
+    so mattes can be rendered several times with different parameters.
+
+    Args:
+        interface: CarveKit interface or any callable with the same signature.
+        If it has mattes method, e.g. InterfaceWorkerPool, mattes are taken from it directly.
+        images: images returned by prepare_remove_bg
+
+    Returns:
+        Alpha mattes of the images as L PIL images
+    """
+    if hasattr(interface, "mattes"):
+        return interface.mattes(images)
+    return [result.getchannel("A") for result in interface(images)]
 
+
+def render_remove_bg(params, image, alpha, roi_box, bg, is_json_or_www_encoded=False):
+    """
+    Builds the removebg api method response from the image and its alpha matte.
+    Doesn't modify input images, so the same matte can be rendered several times.
+
+    Args:
+        params: parameters
+        image: foreground pil image resized by prepare_remove_bg
+        alpha: alpha matte of the roi of the image returned by matte_remove_bg
+        roi_box: roi box returned by prepare_remove_bg
+        bg: background pil image
+        is_json_or_www_encoded: is "json" or "x-www-form-urlencoded" content-type
+
+    Returns:
+        Response of the removebg api method or error response.
+    """
+    foreground = np.asarray(image.convert("RGB").crop(roi_box))
+    alpha = np.asarray(alpha.convert("L"))
+    # Fully transparent pixels are black, so they don't show up in formats without alpha
+    foreground = foreground * (alpha > 0)[:, :, np.newaxis].astype(np.uint8)
+    new_image = np.dstack((foreground, alpha))
     scaled = False
     if "scale" in params.keys() and params["scale"] != 100:
         value = params["scale"]
-        new_image.thumbnail(
+        scaled_image = Image.fromarray(new_image, "RGBA")
+        scaled_image.thumbnail(
             (int(image.size[0] * value / 100), int(image.size[1] * value / 100)),
             resample=3,
         )
+        new_image = np.asarray(scaled_image)
         scaled = True
     if "crop" in params.keys():
         value = params["crop"]
         if value:
-            new_image = new_image.crop(new_image.getbbox())
+            new_image = _crop_to_content(new_image)
             if "crop_margin" in params.keys():
                 crop_margin = params["crop_margin"]
                 if "px" in crop_margin:
@@ -133,59 +209,46 @@ def process_remove_bg(
                             ),
                             400,
                         )
-                    new_image = add_margin(
-                        new_image,
-                        crop_margin,
-                        crop_margin,
-                        crop_margin,
-                        crop_margin,
-                        (0, 0, 0, 0),
-                    )
+                    margin = ((crop_margin, crop_margin), (crop_margin, crop_margin))
+                    new_image = np.pad(new_image, margin + ((0, 0),))
                 elif "%" in crop_margin:
-                    crop_margin = crop_margin.replace("%", "")
-                    crop_margin = int(crop_margin)
-                    new_image = add_margin(
-                        new_image,
-                        int(new_image.size[1] * crop_margin / 100),
-                        int(new_image.size[0] * crop_margin / 100),
-                        int(new_image.size[1] * crop_margin / 100),
-                        int(new_image.size[0] * crop_margin / 100),
-                        (0, 0, 0, 0),
-                    )
+                    crop_margin = int(crop_margin.replace("%", ""))
+                    height, width = new_image.shape[:2]
+                    top = int(height * crop_margin / 100)
+                    left = int(width * crop_margin / 100)
+                    margin = ((top, top), (left, left))
+                    new_image = np.pad(new_image, margin + ((0, 0),))
         else:
             if "position" in params.keys() and scaled is False:
                 value = params["position"]
                 if len(value) == 2:
-                    new_image = transparency_paste(
-                        Image.new("RGBA", image.size),
+                    new_image = _paste(
                         new_image,
+                        image.size,
                         (
                             int(image.size[0] * value[0] / 100),
                             int(image.size[1] * value[1] / 100),
                         ),
                     )
                 else:
-                    new_image = transparency_paste(
-                        Image.new("RGBA", image.size), new_image, roi_box
-                    )
+                    new_image = _paste(new_image, image.size, roi_box[:2])
             elif scaled is False:
-                new_image = transparency_paste(
-                    Image.new("RGBA", image.size), new_image, roi_box
-                )
+                new_image = _paste(new_image, image.size, roi_box[:2])
 
     if "channels" in params.keys():
         value = params["channels"]
         if value == "alpha":
-            new_image = extract_alpha_channel(new_image)
+            new_image = _alpha_to_rgba(new_image[:, :, 3])
         else:
+            size = (new_image.shape[1], new_image.shape[0])
             bg_changed = False
             if "bg_color" in params.keys():
                 value = params["bg_color"]
                 if len(value) > 0:
-                    color = ImageColor.getcolor(value, "RGB")
-                    bg = Image.new("RGBA", new_image.size, color)
-                    bg = transparency_paste(bg, new_image, (0, 0))
-                    new_image = bg.copy()
+                    color = ImageColor.getcolor(value, "RGBA")
+                    new_image = _alpha_composite(
+                        new_image, np.array(color, dtype=np.uint8)
+                    )
                     bg_changed = True
             if "bg_image_url" in params.keys() and bg_changed is False:
                 value = params["bg_image_url"]
@@ -194,17 +257,16 @@ def process_remove_bg(
                         bg = Image.open(io.BytesIO(requests.get(value).content))
                     except BaseException:
                         return error_dict("Error download background image!"), 400
-                    bg = bg.resize(new_image.size)
-                    bg = bg.convert("RGBA")
-                    bg = transparency_paste(bg, new_image, (0, 0))
-                    new_image = bg.copy()
+                    new_image = _alpha_composite(
+                        new_image, np.asarray(bg.resize(size).convert("RGBA"))
+                    )
                     bg_changed = True
             if not is_json_or_www_encoded:
                 if bg and bg_changed is False:
-                    bg = bg.resize(new_image.size)
-                    bg = bg.convert("RGBA")
-                    bg = transparency_paste(bg, new_image, (0, 0))
-                    new_image = bg.copy()
+                    new_image = _alpha_composite(
+                        new_image, np.asarray(bg.resize(size).convert("RGBA"))
+                    )
+    new_image = Image.fromarray(np.ascontiguousarray(new_image), "RGBA")
     if "format" in params.keys():
         value = params["format"]
         if value == "jpg":
@@ -214,7 +276,7 @@ def process_remove_bg(
             img_io.seek(0)
             return {"type": "jpg", "data": [img_io, new_image.size]}
         elif value == "zip":
-            mask = extract_alpha_channel(new_image)
+            mask = new_image.getchannel("A")
             mask_buff = io.BytesIO()
             mask.save(mask_buff, "PNG")
             mask_buff.seek(0)
@@ -245,3 +307,86 @@ def process_remove_bg(
         ),
         400,
     )
+
+
+def _crop_to_content(image: np.ndarray) -> np.ndarray:
+    """
+    Crops RGBA pixels array to the bounding box of not transparent pixels
+
+    Args:
+        image: RGBA pixels array
+
+    Returns:
+        View of the cropped array or the array itself if all pixels are transparent
+    """
+    alpha = image[:, :, 3]
+    rows = np.flatnonzero(alpha.any(axis=1))
+    if len(rows) == 0:
+        return image
+    cols = np.flatnonzero(alpha.any(axis=0))
+    return image[rows[0] : rows[-1] + 1, cols[0] : cols[-1] + 1]
+
+
+def _paste(
+    image: np.ndarray, canvas_size: Tuple[int, int], position: Tuple[int, int]
+) -> np.ndarray:
+    """
+    Places RGBA pixels array on a transparent canvas
+
+    Args:
+        image: RGBA pixels array
+        canvas_size: size of the canvas (width, height)
+        position: position of the top left corner of the image on the canvas (x, y)
+
+    Returns:
+        RGBA pixels array of the canvas
+    """
+    canvas = np.zeros((canvas_size[1], canvas_size[0], 4), dtype=np.uint8)
+    x, y = position
+    height, width = image.shape[:2]
+    # Parts of the image outside the canvas are dropped
+    src_x, src_y = max(-x, 0), max(-y, 0)
+    dst_x, dst_y = max(x, 0), max(y, 0)
+    width = min(width - src_x, canvas_size[0] - dst_x)
+    height = min(height - src_y, canvas_size[1] - dst_y)
+    if width > 0 and height > 0:
+        canvas[dst_y : dst_y + height, dst_x : dst_x + width] = image[
+            src_y : src_y + height, src_x : src_x + width
+        ]
+    return canvas
+
+
+def _alpha_composite(foreground: np.ndarray, background: np.ndarray) -> np.ndarray:
+    """
+    Composites RGBA foreground over RGBA background using integer arithmetic
+
+    Args:
+        foreground: RGBA pixels array
+        background: RGBA pixels array of the same size or a single RGBA color
+
+    Returns:
+        RGBA pixels array
+    """
+    fg_alpha = foreground[:, :, 3:].astype(np.uint32)
+    bg_alpha = background[..., 3:].astype(np.uint32)
+    bg_weight = bg_alpha * (255 - fg_alpha)
+    fg_weight = fg_alpha * 255
+    # Result alpha multiplied by 255 * 255
+    alpha = fg_weight + bg_weight
+    rgb = (
+        foreground[:, :, :3] * fg_weight + background[..., :3] * bg_weight + alpha // 2
+    ) // np.maximum(alpha, 1)
+    return np.dstack((rgb, (alpha + 127) // 255)).astype(np.uint8)
+
+
+def _alpha_to_rgba(alpha: np.ndarray) -> np.ndarray:
+    """
+    Converts alpha channel to an opaque grayscale RGBA pixels array
+
+    Args:
+        alpha: alpha channel array
+
+    Returns:
+        RGBA pixels array
+    """
+    return np.dstack((alpha, alpha, alpha, np.full_like(alpha, 255)))
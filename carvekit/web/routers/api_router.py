@@ -1,7 +1,6 @@
 import base64
 import http
 import io
-import time
 from json import JSONDecodeError
 from typing import Optional
 
@@ -10,6 +9,7 @@ from PIL import Image
 from fastapi import Header, Depends, Form, File, Request, APIRouter, UploadFile
 from fastapi.openapi.models import Response
 from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import JSONResponse
 
 from carvekit.web.deps import config, ml_processor
@@ -22,8 +22,7 @@ api_router = APIRouter(prefix="", tags=["api"])
 
 
 # noinspection PyBroadException
-@api_router.post("/removebg")
-async def removebg(
+async def parse_removebg_request(
     request: Request,
     image_file: Optional[bytes] = File(None),
     auth: bool = Depends(Authenticate),
@@ -86,7 +85,11 @@ async def removebg(
                 )
         elif image_url:
             try:
-                image = Image.open(io.BytesIO(requests.get(image_url).content))
+                image = Image.open(
+                    io.BytesIO(
+                        (await run_in_threadpool(requests.get, image_url)).content
+                    )
+                )
             except BaseException:
                 return JSONResponse(
                     content=error_dict("Error download image!"), status_code=400
@@ -161,7 +164,11 @@ async def removebg(
                 )  # possible ssrf attempt
             try:
                 image = Image.open(
-                    io.BytesIO(requests.get(parameters.image_url).content)
+                    io.BytesIO(
+                        (
+                            await run_in_threadpool(requests.get, parameters.image_url)
+                        ).content
+                    )
                 )
             except BaseException:
                 return JSONResponse(
@@ -172,17 +179,143 @@ async def removebg(
                 content=error_dict("Error download image!"), status_code=400
             )
 
-    job_id = ml_processor.job_create([parameters.dict(), image, bg, False])
+    return [parameters.dict(), image, bg, False]
+
+
+def queue_full_response() -> JSONResponse:
+    """
+    Returns response for requests rejected because the job queue is full
+    """
+    resp = JSONResponse(
+        content=error_dict("Too many requests. Job queue is full."), status_code=429
+    )
+    resp.headers["Retry-After"] = str(ml_processor.estimate_wait_time())
+    return resp
 
-    while ml_processor.job_status(job_id) != "finished":
-        if ml_processor.job_status(job_id) == "not_found":
-            return JSONResponse(
-                content=error_dict("Job ID not found!"), status_code=500
-            )
-        time.sleep(5)
+
+@api_router.post("/removebg")
+async def removebg(job_data=Depends(parse_removebg_request)):
+    if not isinstance(job_data, list):
+        return job_data  # Error response
+    job_id = ml_processor.try_job_create(job_data)
+    if job_id is None:
+        return queue_full_response()
+
+    if not await ml_processor.job_wait(job_id, config.job_timeout or None):
+        return JSONResponse(
+            content=error_dict("Job processing timeout!"), status_code=504
+        )
+    if ml_processor.job_status(job_id) != "finished":
+        return JSONResponse(content=error_dict("Job ID not found!"), status_code=500)
 
     result = ml_processor.job_result(job_id)
-    return handle_response(result, image)
+    return handle_response(result, job_data[1].size)
+
+
+@api_router.post("/jobs")
+async def job_create(job_data=Depends(parse_removebg_request)):
+    """
+    Queues background removal job with the same parameters as /removebg and returns its id
+    """
+    if not isinstance(job_data, list):
+        return job_data  # Error response
+    job_id = ml_processor.try_job_create(job_data)
+    if job_id is None:
+        return queue_full_response()
+    return JSONResponse(content={"id": job_id, "status": "wait"}, status_code=202)
+
+
+@api_router.get("/jobs/{job_id}")
+def job_status(job_id: str, auth: str = Depends(Authenticate)):
+    """
+    Returns status of the background removal job
+    """
+    if auth is False:
+        return JSONResponse(content=error_dict("Missing API Key"), status_code=403)
+    status = ml_processor.job_status(job_id)
+    if status == "not_found":
+        return JSONResponse(content=error_dict("Job ID not found!"), status_code=404)
+    return JSONResponse(content={"id": job_id, "status": status}, status_code=200)
+
+
+@api_router.get("/jobs/{job_id}/result")
+async def job_result(
+    job_id: str,
+    auth: str = Depends(Authenticate),
+    format: Optional[str] = None,
+    crop: Optional[bool] = None,
+    crop_margin: Optional[str] = None,
+    scale: Optional[str] = None,
+    position: Optional[str] = None,
+    channels: Optional[str] = None,
+    bg_color: Optional[str] = None,
+):
+    """
+    Returns result of the finished background removal job.
+    Results are available for an hour after the job is finished or until they are deleted.
+    Least recently used results are dropped earlier to keep result_cache_size.
+    Rendering parameters passed in the query string override parameters of the job,
+    so several renderings of one job are produced without running the neural networks again.
+    Data needed for that is kept for the least recently used jobs within render_cache_size,
+    results of other jobs can't be rendered again.
+    """
+    if auth is False:
+        return JSONResponse(content=error_dict("Missing API Key"), status_code=403)
+    status = ml_processor.job_status(job_id)
+    if status == "not_found":
+        return JSONResponse(content=error_dict("Job ID not found!"), status_code=404)
+    elif status == "wait":
+        resp = JSONResponse(content={"id": job_id, "status": status}, status_code=202)
+        resp.headers["Retry-After"] = str(ml_processor.estimate_wait_time())
+        return resp
+    original_size = ml_processor.job_original_size(job_id)
+    overrides = {
+        k: v
+        for k, v in dict(
+            format=format,
+            crop=crop,
+            crop_margin=crop_margin,
+            scale=scale,
+            position=position,
+            channels=channels,
+            bg_color=bg_color,
+        ).items()
+        if v is not None
+    }
+    if len(overrides) == 0:
+        result = ml_processor.job_result(job_id, remove=False)
+        return handle_response(result, original_size)
+    try:
+        overrides = Parameters(**overrides).dict(include=set(overrides.keys()))
+    except ValidationError as e:
+        return JSONResponse(
+            content=error_dict("; ".join(str(error["msg"]) for error in e.errors())),
+            status_code=400,
+        )
+    result = await run_in_threadpool(ml_processor.job_render, job_id, overrides)
+    if result is None:
+        return JSONResponse(
+            content=error_dict("Result of the job can't be rendered again!"),
+            status_code=409,
+        )
+    return handle_response(result, original_size)
+
+
+@api_router.delete("/jobs/{job_id}")
+def job_delete(job_id: str, auth: str = Depends(Authenticate)):
+    """
+    Deletes result of the finished background removal job
+    """
+    if auth is False:
+        return JSONResponse(content=error_dict("Missing API Key"), status_code=403)
+    status = ml_processor.job_status(job_id)
+    if status == "not_found":
+        return JSONResponse(content=error_dict("Job ID not found!"), status_code=404)
+    elif status == "wait" or not ml_processor.job_delete(job_id):
+        return JSONResponse(
+            content=error_dict("Job isn't finished yet!"), status_code=409
+        )
+    return JSONResponse(content={"id": job_id, "status": "deleted"}, status_code=200)
 
 
 @api_router.get("/account")
@@ -1,5 +1,5 @@
 import secrets
-from typing import List
+from typing import List, Optional
 from typing_extensions import Literal
 
 import torch.cuda
@@ -46,6 +46,22 @@ class MLConfig(BaseModel):
     """Erosion levels for trimap"""
     trimap_prob_threshold: int = 231
     """Probability threshold for trimap generation"""
+    mask_format: Literal["pil", "numpy"] = "pil"
+    """Format of segmentation masks. "numpy" resizes masks on the processing device, which is faster, but slightly changes masks"""
+    matting_tile_size: Optional[int] = None
+    """Size of tiles for matting of the unknown area of trimaps at the original image resolution. Tiling is disabled if None"""
+    matting_tile_overlap: int = 64
+    """Overlap of neighbouring matting tiles in pixels"""
+    matting_resolution_trimaps: bool = False
+    """Generates trimaps at the input resolution of the matting neural network instead of the image resolution"""
+    skip_matting_threshold: float = 0.0
+    """Images whose trimap has smaller fraction of unknown area skip the matting neural network. 0 disables skipping"""
+    cache_size: int = 0
+    """Size of the in-memory cache of alpha mattes in megabytes. It is divided between worker processes. 0 disables the cache"""
+    cache_dir: Optional[str] = None
+    """Directory for the on-disk tier of the alpha mattes cache. Disk tier is disabled if None"""
+    cache_disk_size: int = 1024
+    """Maximum size of the on-disk tier of the alpha mattes cache in megabytes"""
 
     @validator("seg_mask_size")
     def seg_mask_size_validator(cls, value: int, values):
@@ -75,6 +91,44 @@ class MLConfig(BaseModel):
         else:
             raise ValueError("Incorrect batch size!")
 
+    @validator("matting_tile_size")
+    def matting_tile_size_validator(cls, value: Optional[int], values):
+        if value is None or (value > 0 and value % 8 == 0):
+            return value
+        else:
+            raise ValueError(
+                "Incorrect matting tile size! It should be a multiple of 8"
+            )
+
+    @validator("matting_tile_overlap")
+    def matting_tile_overlap_validator(cls, value: int, values):
+        tile_size = values.get("matting_tile_size")
+        if value >= 0 and (tile_size is None or value < tile_size // 2):
+            return value
+        else:
+            raise ValueError("Incorrect matting tile overlap!")
+
+    @validator("skip_matting_threshold")
+    def skip_matting_threshold_validator(cls, value: float, values):
+        if 0 <= value <= 1:
+            return value
+        else:
+            raise ValueError("Incorrect skip matting threshold! It should be in [0, 1]")
+
+    @validator("cache_size")
+    def cache_size_validator(cls, value: int, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect cache size!")
+
+    @validator("cache_disk_size")
+    def cache_disk_size_validator(cls, value: int, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect cache disk size!")
+
     @validator("device")
     def device_validator(cls, value):
         if torch.cuda.is_available() is False and "cuda" in value:
@@ -97,3 +151,66 @@ class WebAPIConfig(BaseModel):
     """Config for ml part of framework"""
     auth: AuthConfig = AuthConfig()
     """Config for web api token authentication """
+    job_batch_size: int = 5
+    """Maximum number of queued jobs processed by neural networks in one batch"""
+    job_batch_timeout: int = 50
+    """Maximum time in milliseconds to wait for new jobs before processing an incomplete batch"""
+    workers: int = 1
+    """Number of worker processes with own copy of neural networks. 1 runs networks in the web server process"""
+    max_queue_size: int = 100
+    """Maximum number of queued jobs. New jobs are rejected if the queue is full. 0 disables the limit"""
+    job_timeout: int = 600
+    """Maximum time in seconds to wait for the result of the /removebg request. 0 disables the limit"""
+    render_cache_size: int = 256
+    """Maximum size in megabytes of images and mattes kept to render results of finished jobs again. 0 disables rendering again"""
+    result_cache_size: int = 512
+    """Maximum size in megabytes of results of finished jobs kept until they are fetched or deleted"""
+
+    @validator("job_batch_size")
+    def job_batch_size_validator(cls, value: int, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect job batch size!")
+
+    @validator("job_batch_timeout")
+    def job_batch_timeout_validator(cls, value: int, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect job batch timeout!")
+
+    @validator("workers")
+    def workers_validator(cls, value: int, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect number of workers!")
+
+    @validator("max_queue_size")
+    def max_queue_size_validator(cls, value: int, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect max queue size!")
+
+    @validator("job_timeout")
+    def job_timeout_validator(cls, value: int, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect job timeout!")
+
+    @validator("render_cache_size")
+    def render_cache_size_validator(cls, value: int, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect render cache size!")
+
+    @validator("result_cache_size")
+    def result_cache_size_validator(cls, value: int, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect result cache size!")
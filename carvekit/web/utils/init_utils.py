@@ -1,5 +1,5 @@
 from os import getenv
-from typing import Union
+from typing import Union, Optional
 
 from loguru import logger
 
@@ -14,6 +14,7 @@ from carvekit.ml.wrap.tracer_b7 import TracerUniversalB7
 from carvekit.pipelines.postprocessing import MattingMethod
 from carvekit.pipelines.preprocessing import PreprocessingStub
 from carvekit.trimap.generator import TrimapGenerator
+from carvekit.utils.cache_utils import AlphaCache
 
 
 def init_config() -> WebAPIConfig:
@@ -22,6 +23,23 @@ def init_config() -> WebAPIConfig:
         **dict(
             port=int(getenv("CARVEKIT_PORT", default_config.port)),
             host=getenv("CARVEKIT_HOST", default_config.host),
+            job_batch_size=int(
+                getenv("CARVEKIT_JOB_BATCH_SIZE", default_config.job_batch_size)
+            ),
+            job_batch_timeout=int(
+                getenv("CARVEKIT_JOB_BATCH_TIMEOUT", default_config.job_batch_timeout)
+            ),
+            workers=int(getenv("CARVEKIT_WORKERS", default_config.workers)),
+            max_queue_size=int(
+                getenv("CARVEKIT_MAX_QUEUE_SIZE", default_config.max_queue_size)
+            ),
+            job_timeout=int(getenv("CARVEKIT_JOB_TIMEOUT", default_config.job_timeout)),
+            render_cache_size=int(
+                getenv("CARVEKIT_RENDER_CACHE_SIZE", default_config.render_cache_size)
+            ),
+            result_cache_size=int(
+                getenv("CARVEKIT_RESULT_CACHE_SIZE", default_config.result_cache_size)
+            ),
             ml=MLConfig(
                 segmentation_network=getenv(
                     "CARVEKIT_SEGMENTATION_NETWORK",
@@ -69,6 +87,41 @@ def init_config() -> WebAPIConfig:
                 trimap_erosion=int(
                     getenv("CARVEKIT_TRIMAP_EROSION", default_config.ml.trimap_erosion)
                 ),
+                mask_format=getenv(
+                    "CARVEKIT_MASK_FORMAT", default_config.ml.mask_format
+                ),
+                matting_tile_size=default_config.ml.matting_tile_size
+                if getenv("CARVEKIT_MATTING_TILE_SIZE") is None
+                else int(getenv("CARVEKIT_MATTING_TILE_SIZE")),
+                matting_tile_overlap=int(
+                    getenv(
+                        "CARVEKIT_MATTING_TILE_OVERLAP",
+                        default_config.ml.matting_tile_overlap,
+                    )
+                ),
+                matting_resolution_trimaps=bool(
+                    int(
+                        getenv(
+                            "CARVEKIT_MATTING_RESOLUTION_TRIMAPS",
+                            default_config.ml.matting_resolution_trimaps,
+                        )
+                    )
+                ),
+                skip_matting_threshold=float(
+                    getenv(
+                        "CARVEKIT_SKIP_MATTING_THRESHOLD",
+                        default_config.ml.skip_matting_threshold,
+                    )
+                ),
+                cache_size=int(
+                    getenv("CARVEKIT_CACHE_SIZE", default_config.ml.cache_size)
+                ),
+                cache_dir=getenv("CARVEKIT_CACHE_DIR", default_config.ml.cache_dir),
+                cache_disk_size=int(
+                    getenv(
+                        "CARVEKIT_CACHE_DISK_SIZE", default_config.ml.cache_disk_size
+                    )
+                ),
             ),
             auth=AuthConfig(
                 auth=bool(
@@ -89,6 +142,46 @@ def init_config() -> WebAPIConfig:
     return config
 
 
+def init_cache(config: MLConfig) -> Optional[AlphaCache]:
+    """
+    Initializes the cache of alpha mattes
+
+    Args:
+        config: config for ml part of framework
+
+    Returns:
+        Cache of alpha mattes or None if the cache is disabled
+    """
+    if config.cache_size == 0 and config.cache_dir is None:
+        return None
+    # Only settings that affect the alpha matte are mixed into cache keys
+    namespace = config.json(
+        include={
+            "segmentation_network",
+            "preprocessing_method",
+            "postprocessing_method",
+            "batch_size_matting",
+            "seg_mask_size",
+            "matting_mask_size",
+            "fp16",
+            "trimap_dilation",
+            "trimap_erosion",
+            "trimap_prob_threshold",
+            "mask_format",
+            "matting_tile_size",
+            "matting_tile_overlap",
+            "matting_resolution_trimaps",
+            "skip_matting_threshold",
+        }
+    )
+    return AlphaCache(
+        max_memory_size=config.cache_size * 1024 * 1024,
+        cache_dir=config.cache_dir,
+        max_disk_size=config.cache_disk_size * 1024 * 1024,
+        namespace=namespace,
+    )
+
+
 def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
     if isinstance(config, WebAPIConfig):
         config = config.ml
@@ -98,6 +191,7 @@ def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
             batch_size=config.batch_size_seg,
             input_image_size=config.seg_mask_size,
             fp16=config.fp16,
+            mask_format=config.mask_format,
         )
     elif config.segmentation_network == "deeplabv3":
         seg_net = DeepLabV3(
@@ -105,6 +199,7 @@ def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
             batch_size=config.batch_size_seg,
             input_image_size=config.seg_mask_size,
             fp16=config.fp16,
+            mask_format=config.mask_format,
         )
     elif config.segmentation_network == "basnet":
         seg_net = BASNET(
@@ -112,6 +207,7 @@ def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
             batch_size=config.batch_size_seg,
             input_image_size=config.seg_mask_size,
             fp16=config.fp16,
+            mask_format=config.mask_format,
         )
     elif config.segmentation_network == "tracer_b7":
         seg_net = TracerUniversalB7(
@@ -119,6 +215,7 @@ def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
             batch_size=config.batch_size_seg,
             input_image_size=config.seg_mask_size,
             fp16=config.fp16,
+            mask_format=config.mask_format,
         )
     else:
         seg_net = TracerUniversalB7(
@@ -126,6 +223,7 @@ def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
             batch_size=config.batch_size_seg,
             input_image_size=config.seg_mask_size,
             fp16=config.fp16,
+            mask_format=config.mask_format,
         )
 
     if config.preprocessing_method == "stub":
@@ -141,6 +239,8 @@ def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
             batch_size=config.batch_size_matting,
             input_tensor_size=config.matting_mask_size,
             fp16=config.fp16,
+            tile_size=config.matting_tile_size,
+            tile_overlap=config.matting_tile_overlap,
         )
         trimap_generator = TrimapGenerator(
             prob_threshold=config.trimap_prob_threshold,
@@ -148,7 +248,11 @@ def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
             erosion_iters=config.trimap_erosion,
         )
         postprocessing = MattingMethod(
-            device=config.device, matting_module=fba, trimap_generator=trimap_generator
+            device=config.device,
+            matting_module=fba,
+            trimap_generator=trimap_generator,
+            matting_resolution_trimaps=config.matting_resolution_trimaps,
+            skip_matting_threshold=config.skip_matting_threshold,
         )
 
     elif config.postprocessing_method == "none":
@@ -161,5 +265,6 @@ def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
         post_pipe=postprocessing,
         seg_pipe=seg_net,
         device=config.device,
+        cache=init_cache(config),
     )
     return interface
@@ -1,15 +1,28 @@
+import asyncio
 import gc
+import math
 import threading
 import time
 import uuid
-from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Tuple, Union
 
+from PIL import Image
 from loguru import logger
 
 from carvekit.api.interface import Interface
+from carvekit.web.responses.api import error_dict
 from carvekit.web.schemas.config import WebAPIConfig
 from carvekit.web.utils.init_utils import init_interface
-from carvekit.web.other.removebg import process_remove_bg
+from carvekit.web.utils.worker_pool import InterfaceWorkerPool
+from carvekit.web.other.removebg import (
+    prepare_remove_bg,
+    matte_remove_bg,
+    render_remove_bg,
+    is_error_response,
+)
+from carvekit.utils.pool_utils import thread_pool_processing
 
 
 class MLProcessor(threading.Thread):
@@ -18,51 +31,338 @@ class MLProcessor(threading.Thread):
     def __init__(self, api_config: WebAPIConfig):
         super().__init__()
         self.api_config = api_config
-        self.interface: Optional[Interface] = None
+        self.interface: Optional[Union[Interface, InterfaceWorkerPool]] = None
         self.jobs = {}
+        self.processing_jobs = set()
         self.completed_jobs = {}
+        # Least recently used completed jobs which can be rendered again and sizes of their data
+        self.renderable_jobs = OrderedDict()
+        self.renderable_jobs_size = 0
+        # Least recently used completed jobs and sizes of their results
+        self.stored_results = OrderedDict()
+        self.stored_results_size = 0
+        self.jobs_condition = threading.Condition()
+        self.job_waiters = {}
+        self.batch_processing_time = 1.0
+        self.logged_matting_images = 0
 
     def run(self):
         """Starts listening for new jobs."""
         unused_completed_jobs_timer = time.time()
+        workers = self.api_config.workers
         if self.interface is None:
-            self.interface = init_interface(self.api_config)
+            if workers > 1:
+                self.interface = InterfaceWorkerPool(self.api_config.ml, workers)
+            else:
+                self.interface = init_interface(self.api_config)
+        # Every worker process gets own batch, while other batches are collected
+        free_workers = threading.Semaphore(workers)
+        executor = ThreadPoolExecutor(workers)
         while True:
             # Clear unused completed jobs every hour
             if time.time() - unused_completed_jobs_timer > 60:
                 self.clear_old_completed_jobs()
+                self.log_skip_stats()
                 unused_completed_jobs_timer = time.time()
 
-            if len(self.jobs.keys()) >= 1:
-                id = list(self.jobs.keys())[0]
-                data = self.jobs[id]
-                # TODO add pydantic scheme here
-                response = process_remove_bg(
-                    self.interface, data[0], data[1], data[2], data[3]
-                )
-                self.completed_jobs[id] = [response, time.time()]
-                try:
-                    del self.jobs[id]
-                except KeyError or NameError as e:
-                    logger.error(f"Something went wrong with Task Queue: {str(e)}")
-                gc.collect()
-            else:
-                time.sleep(1)
+            if not free_workers.acquire(timeout=60):
                 continue
+            job_ids = self.collect_jobs(timeout=60)
+            if len(job_ids) >= 1:
+                executor.submit(self.process_batch, job_ids, free_workers)
+            else:
+                free_workers.release()
+
+    def close(self):
+        """Stops worker processes of the interface"""
+        if isinstance(self.interface, InterfaceWorkerPool):
+            self.interface.close()
+
+    def process_batch(self, job_ids: List[str], free_workers: threading.Semaphore):
+        """
+        Processes batch of collected jobs and removes them from the queue.
+        Jobs left without a response by an unexpected error are completed with an error response.
+
+        Args:
+            job_ids: ids of the jobs
+            free_workers: semaphore which is released when the batch is processed
+        """
+        try:
+            start_time = time.time()
+            self.process_jobs(job_ids)
+            # Smoothed batch processing time used to estimate queue wait time
+            self.batch_processing_time = 0.8 * self.batch_processing_time + 0.2 * (
+                time.time() - start_time
+            )
+        except BaseException as e:
+            logger.error(f"Something went wrong with Task Queue: {str(e)}")
+        finally:
+            with self.jobs_condition:
+                for id in job_ids:
+                    job = self.jobs.pop(id, None)
+                    self.processing_jobs.discard(id)
+                    if id not in self.completed_jobs.keys():
+                        self._complete_job(
+                            id,
+                            (error_dict("Error processing image!"), 500),
+                            time.time(),
+                            job[1].size if job is not None else None,
+                        )
+            free_workers.release()
+            gc.collect()
+
+    def collect_jobs(self, timeout: float) -> List[str]:
+        """
+        Waits for new jobs and collects them into a batch.
+        The batch is returned when it is full or when job_batch_timeout
+        milliseconds have passed since the first job of the batch was noticed.
+
+        Args:
+            timeout: maximum time in seconds to wait for the first job
+
+        Returns:
+            ids of the collected jobs
+        """
+        batch_size = self.api_config.job_batch_size
+        with self.jobs_condition:
+            if self.pending_jobs_count() == 0:
+                self.jobs_condition.wait(timeout=timeout)
+            if self.pending_jobs_count() == 0:
+                return []
+            deadline = time.time() + self.api_config.job_batch_timeout / 1000
+            while self.pending_jobs_count() < batch_size and time.time() < deadline:
+                self.jobs_condition.wait(timeout=deadline - time.time())
+            job_ids = [id for id in self.jobs.keys() if id not in self.processing_jobs][
+                :batch_size
+            ]
+            self.processing_jobs.update(job_ids)
+            return job_ids
+
+    def pending_jobs_count(self) -> int:
+        """
+        Returns the number of queued jobs which are not being processed yet
+        """
+        return len(self.jobs.keys()) - len(self.processing_jobs)
+
+    def process_jobs(self, job_ids: List[str]):
+        """
+        Passes images of the jobs through the neural networks as a single batch
+        and stores the response of every job in completed jobs.
+
+        Args:
+            job_ids: ids of the jobs
+        """
+        # TODO add pydantic scheme here
+        data = [self.jobs[id] for id in job_ids]
+        prepared = thread_pool_processing(self._prepare_job, data)
+        responses = [x if is_error_response(x) else None for x in prepared]
+        valid_ids = [i for i, x in enumerate(responses) if x is None]
+        mattes = [None] * len(job_ids)
+        try:
+            alphas = matte_remove_bg(
+                self.interface, [prepared[i][0] for i in valid_ids]
+            )
+            for i, alpha in zip(valid_ids, alphas):
+                params, image, bg, is_json_or_www_encoded = data[i]
+                mattes[i] = [image, alpha, prepared[i][1], bg, is_json_or_www_encoded]
+            rendered = thread_pool_processing(
+                lambda x: render_remove_bg(data[x][0], *mattes[x]), valid_ids
+            )
+        except BaseException as e:
+            logger.error(f"Something went wrong with Task Queue: {str(e)}")
+            mattes = [None] * len(job_ids)
+            rendered = [(error_dict("Error processing image!"), 500) for _ in valid_ids]
+        for idx, response in zip(valid_ids, rendered):
+            responses[idx] = response
+        finish_time = time.time()
+        with self.jobs_condition:
+            for idx, (id, response) in enumerate(zip(job_ids, responses)):
+                self._complete_job(
+                    id,
+                    response,
+                    finish_time,
+                    data[idx][1].size,
+                    [data[idx][0]] + mattes[idx] if mattes[idx] is not None else None,
+                )
+
+    @staticmethod
+    def _prepare_job(data: list):
+        """
+        Prepares the image of the job for the neural networks.
+        Errors are converted to the error response of the job, so they don't affect other jobs of the batch.
+
+        Args:
+            data: data object of the job
+
+        Returns:
+            Image for the neural networks and roi box or error response.
+        """
+        try:
+            return prepare_remove_bg(data[0], data[1])
+        except OSError as e:
+            logger.error(f"Failed to read the image: {str(e)}")
+            return error_dict("Error decode image!"), 400
+        except BaseException as e:
+            logger.error(f"Something went wrong with Task Queue: {str(e)}")
+            return error_dict("Error processing image!"), 500
+
+    def _complete_job(
+        self,
+        id: str,
+        response,
+        finish_time: float,
+        size: Optional[Tuple[int, int]],
+        matte: Optional[list] = None,
+    ):
+        """
+        Stores the response of the job in completed jobs and wakes up its waiters.
+        Must be called with jobs_condition held.
+
+        Args:
+            id: id of the job
+            response: removebg api method response
+            finish_time: time when the job was finished
+            size: size of the original image
+            matte: data needed to render the job again or None
+        """
+        if matte is not None and not self._retain_matte(id, matte):
+            matte = None
+        self.completed_jobs[id] = [response, finish_time, size, matte]
+        self._retain_result(id, response)
+        for loop, future in self.job_waiters.pop(id, []):
+            try:
+                loop.call_soon_threadsafe(self._complete_future, future)
+            except RuntimeError:  # Event loop of the waiter is closed
+                pass
+
+    def _retain_matte(self, id: str, matte: list) -> bool:
+        """
+        Reserves place for the data needed to render the job again
+        and evicts least recently used data of other jobs to keep render_cache_size.
+        Must be called with jobs_condition held.
+
+        Args:
+            id: id of the job
+            matte: data needed to render the job again
+
+        Returns:
+            False if the data is larger than render_cache_size
+        """
+        size = sum(
+            x.size[0] * x.size[1] * len(x.getbands())
+            for x in matte
+            if isinstance(x, Image.Image)
+        )
+        max_size = self.api_config.render_cache_size * 1024 * 1024
+        if size > max_size:
+            return False
+        self.renderable_jobs[id] = size
+        self.renderable_jobs_size += size
+        while self.renderable_jobs_size > max_size:
+            evicted_id, evicted_size = self.renderable_jobs.popitem(last=False)
+            self.renderable_jobs_size -= evicted_size
+            self.completed_jobs[evicted_id][3] = None
+        return True
+
+    def _retain_result(self, id: str, response):
+        """
+        Accounts the result of the completed job and removes least recently used
+        other completed jobs to keep result_cache_size.
+        The result of the job itself is always kept, so its waiters can fetch it.
+        Must be called with jobs_condition held.
+
+        Args:
+            id: id of the job
+            response: removebg api method response
+        """
+        if isinstance(response, dict):
+            data = response["data"][0]
+            size = len(data) if isinstance(data, bytes) else data.getbuffer().nbytes
+        else:
+            size = len(str(response[0]))
+        max_size = self.api_config.result_cache_size * 1024 * 1024
+        self.stored_results[id] = size
+        self.stored_results_size += size
+        while self.stored_results_size > max_size and len(self.stored_results) > 1:
+            self._remove_completed_job(next(iter(self.stored_results.keys())))
+
+    def _remove_completed_job(self, id: str):
+        """
+        Removes the completed job, its result and data needed to render it again
+
+        Args:
+            id: id of the job
+        """
+        with self.jobs_condition:
+            self.completed_jobs.pop(id, None)
+            self.renderable_jobs_size -= self.renderable_jobs.pop(id, 0)
+            self.stored_results_size -= self.stored_results.pop(id, 0)
+
+    @staticmethod
+    def _complete_future(future: asyncio.Future):
+        """Marks the future of the job as done if nobody has cancelled it"""
+        if not future.done():
+            future.set_result(None)
+
+    async def job_wait(self, id: str, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until the job is finished without blocking the event loop.
+
+        Args:
+            id: id of the job
+            timeout: maximum time to wait in seconds. None disables the limit
+
+        Returns:
+            False if the job isn't finished in time
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.jobs_condition:
+            if id in self.completed_jobs.keys() or id not in self.jobs.keys():
+                return True
+            self.job_waiters.setdefault(id, []).append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self.jobs_condition:
+                waiters = self.job_waiters.get(id, [])
+                if (loop, future) in waiters:
+                    waiters.remove((loop, future))
+                if len(waiters) == 0:
+                    self.job_waiters.pop(id, None)
 
     def clear_old_completed_jobs(self):
         """Clears old completed jobs"""
 
         if len(self.completed_jobs.keys()) >= 1:
-            for job_id in self.completed_jobs.keys():
+            for job_id in list(self.completed_jobs.keys()):
                 job_finished_time = self.completed_jobs[job_id][1]
                 if time.time() - job_finished_time > 3600:
-                    try:
-                        del self.completed_jobs[job_id]
-                    except KeyError or NameError as e:
-                        logger.error(f"Something went wrong with Task Queue: {str(e)}")
+                    self._remove_completed_job(job_id)
             gc.collect()
 
+    def log_skip_stats(self):
+        """
+        Logs statistics of matting skipping, which help to tune skip_matting_threshold.
+        Statistics of worker processes aren't available, so nothing is logged for the worker pool.
+        """
+        postprocessing = getattr(self.interface, "postprocessing_pipeline", None)
+        if not hasattr(postprocessing, "skip_stats"):
+            return
+        stats = postprocessing.skip_stats()
+        if stats["images"] == self.logged_matting_images:
+            return
+        self.logged_matting_images = stats["images"]
+        fractions = sorted(stats["unknown_fractions"])
+        logger.info(
+            f"Matting skipped for {stats['skipped']} of {stats['images']} images "
+            f"({stats['skipped_ratio']:.1%}), median unknown area of recent trimaps is "
+            f"{fractions[len(fractions) // 2]:.2%}"
+        )
+
     def job_status(self, id: str) -> str:
         """
         Returns current job status
@@ -80,25 +380,107 @@ class MLProcessor(threading.Thread):
         else:
             return "not_found"
 
-    def job_result(self, id: str):
+    def job_result(self, id: str, remove: bool = True):
         """
         Returns job processing result.
 
         Args:
             id: id of the job
+            remove: removes the result from completed jobs
 
         Returns:
             job processing result.
         """
+        with self.jobs_condition:
+            if id in self.completed_jobs.keys():
+                data = self.completed_jobs[id][0]
+                if remove:
+                    self._remove_completed_job(id)
+                else:
+                    self.stored_results.move_to_end(id)
+                return data
+            else:
+                return False
+
+    def job_delete(self, id: str) -> bool:
+        """
+        Removes the finished job and its result
+
+        Args:
+            id: id of the job
+
+        Returns:
+            False if the job is not finished
+        """
+        with self.jobs_condition:
+            if id not in self.completed_jobs.keys():
+                return False
+            self._remove_completed_job(id)
+            return True
+
+    def job_render(self, id: str, params: dict):
+        """
+        Renders the alpha matte of the finished job again with other parameters.
+        Neural networks are not used.
+
+        Args:
+            id: id of the job
+            params: parameters that override parameters of the job.
+            Parameters affecting the matte (size, roi) are ignored.
+
+        Returns:
+            removebg api method response or None if the job is not finished
+            or its matte is not available.
+        """
+        with self.jobs_condition:
+            job = self.completed_jobs.get(id)
+            if job is None or job[3] is None:
+                return None
+            self.renderable_jobs.move_to_end(id)
+            self.stored_results.move_to_end(id)
+            job_params, image, alpha, roi_box, bg, is_json_or_www_encoded = job[3]
+        params = {
+            **job_params,
+            **{k: v for k, v in params.items() if k not in ["size", "roi"]},
+        }
+        return render_remove_bg(
+            params, image, alpha, roi_box, bg, is_json_or_www_encoded
+        )
+
+    def job_original_size(self, id: str) -> Optional[Tuple[int, int]]:
+        """
+        Returns size of the original image of the finished job.
+
+        Args:
+            id: id of the job
+
+        Returns:
+            size of the original image or None if job is not finished
+        """
         if id in self.completed_jobs.keys():
-            data = self.completed_jobs[id][0]
-            try:
-                del self.completed_jobs[id]
-            except KeyError or NameError:
-                pass
-            return data
-        else:
-            return False
+            return self.completed_jobs[id][2]
+        return None
+
+    def is_queue_full(self) -> bool:
+        """
+        Checks if the job queue reached the maximum size set in config
+
+        Returns:
+            True if new jobs should be rejected
+        """
+        max_size = self.api_config.max_queue_size
+        return max_size > 0 and len(self.jobs.keys()) >= max_size
+
+    def estimate_wait_time(self) -> int:
+        """
+        Estimates the time needed to process all queued jobs
+
+        Returns:
+            wait time in seconds
+        """
+        batches = math.ceil(len(self.jobs.keys()) / self.api_config.job_batch_size)
+        batches = math.ceil(batches / self.api_config.workers)
+        return max(math.ceil(batches * self.batch_processing_time), 1)
 
     def job_create(self, data: list):
         """
@@ -110,5 +492,22 @@ class MLProcessor(threading.Thread):
         if self.is_alive() is False:
             self.start()
         id = uuid.uuid4().hex
-        self.jobs[id] = data
+        with self.jobs_condition:
+            self.jobs[id] = data
+            self.jobs_condition.notify()
         return id
+
+    def try_job_create(self, data: list) -> Optional[str]:
+        """
+        Send job to ML Processor if the job queue isn't full
+
+        Args:
+            data: data object
+
+        Returns:
+            id of the job or None if the job queue is full
+        """
+        with self.jobs_condition:
+            if self.is_queue_full():
+                return None
+            return self.job_create(data)
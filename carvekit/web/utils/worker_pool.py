@@ -0,0 +1,271 @@
+import multiprocessing
+import os
+import queue
+import threading
+from multiprocessing import shared_memory
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+from loguru import logger
+
+from carvekit.utils.mask_utils import apply_mask
+from carvekit.web.schemas.config import MLConfig
+
+ALLOWED_MODES = ["RGB", "RGBA", "L"]
+
+
+def image_to_shared_memory(
+    image: Image.Image,
+) -> Tuple[shared_memory.SharedMemory, Tuple[int, ...], str]:
+    """
+    Copies pixels of the image to a new shared memory block.
+    Images with other color modes are converted to RGBA if they have transparency, otherwise to RGB.
+
+    Args:
+        image: PIL image
+
+    Returns:
+        Shared memory block, shape of the pixels array and color mode of the image
+
+    Raises:
+        ValueError: If image color mode can't be converted
+    """
+    if image.mode not in ALLOWED_MODES:
+        if "A" in image.getbands() or "transparency" in image.info:
+            image = image.convert("RGBA")
+        else:
+            image = image.convert("RGB")
+    array = np.asarray(image)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=np.uint8, buffer=shm.buf)[...] = array
+    return shm, array.shape, image.mode
+
+
+def image_from_shared_memory(
+    shm: shared_memory.SharedMemory, shape: Tuple[int, ...], mode: str
+) -> Image.Image:
+    """
+    Creates PIL image from pixels stored in the shared memory block
+
+    Args:
+        shm: shared memory block
+        shape: shape of the pixels array
+        mode: color mode of the image
+
+    Returns:
+        PIL image that doesn't reference the shared memory block
+    """
+    array = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    return Image.fromarray(array.copy(), mode=mode)
+
+
+def _worker_loop(conn, config: MLConfig, num_threads: int):
+    """
+    Worker process main loop. Builds own interface and processes batches received by the pipe.
+
+    Args:
+        conn: pipe connection to the dispatcher
+        config: config for ml part of framework
+        num_threads: number of torch threads used by the worker
+    """
+    import torch
+
+    from carvekit.web.utils.init_utils import init_interface
+
+    torch.set_num_threads(num_threads)
+    interface = init_interface(config)
+    conn.send(("ready", None))
+    _serve_batches(conn, interface)
+
+
+def _serve_batches(conn, interface):
+    """
+    Passes batches received by the pipe through the interface until the pipe is closed.
+
+    Args:
+        conn: pipe connection to the dispatcher
+        interface: CarveKit interface or any callable with the same signature
+    """
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        images_meta, results_meta = message
+        blocks = []
+        try:
+            images = []
+            for name, shape, mode in images_meta:
+                shm = shared_memory.SharedMemory(name=name)
+                blocks.append(shm)
+                images.append(image_from_shared_memory(shm, shape, mode))
+            results = interface(images)
+            for result, (name, shape) in zip(results, results_meta):
+                shm = shared_memory.SharedMemory(name=name)
+                blocks.append(shm)
+                # Only the alpha matte is sent back, colors are taken from the input image
+                if result.mode != "RGBA":
+                    result = result.convert("RGBA")
+                np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)[...] = np.asarray(
+                    result.getchannel("A")
+                )
+            conn.send(("ok", None))
+        except BaseException as e:
+            conn.send(("error", str(e)))
+        finally:
+            for shm in blocks:
+                shm.close()
+
+
+class InterfaceWorkerPool:
+    """
+    Pool of worker processes, each of them holds its own interface.
+    Images and results are passed between processes through shared memory.
+    """
+
+    def __init__(self, config: MLConfig, workers: int = 2):
+        """
+        Starts worker processes and waits until their interfaces are initialized.
+
+        Args:
+            config: config for ml part of framework
+            workers: number of worker processes
+        """
+        # Every worker process has own in-memory tier of the alpha mattes cache,
+        # so the cache size is divided between them. The on-disk tier is shared.
+        self.config = config.copy(update={"cache_size": config.cache_size // workers})
+        self.workers = workers
+        self.context = multiprocessing.get_context("spawn")
+        self.num_threads = max((os.cpu_count() or 1) // workers, 1)
+        self.idle_workers = queue.Queue()
+        self.processes = []
+        self.lock = threading.Lock()
+        for _ in range(workers):
+            self.idle_workers.put(self._start_worker())
+
+    def _start_worker(self):
+        """
+        Starts new worker process
+
+        Returns:
+            Worker process and its pipe connection
+        """
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=_worker_loop,
+            args=(child_conn, self.config, self.num_threads),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        status, error = parent_conn.recv()
+        if status != "ready":
+            raise RuntimeError(f"Failed to start worker process: {error}")
+        with self.lock:
+            self.processes.append(process)
+        logger.info(f"Started ml worker process with pid {process.pid}")
+        return process, parent_conn
+
+    def _remove_worker(self, process, conn):
+        """
+        Closes the pipe of the dead worker process and forgets it.
+        Can be called several times for the same worker.
+
+        Args:
+            process: worker process
+            conn: pipe connection to the worker process
+        """
+        conn.close()
+        with self.lock:
+            if process in self.processes:
+                self.processes.remove(process)
+
+    def __call__(self, images: List[Image.Image]) -> List[Image.Image]:
+        """
+        Passes images through the interface of the first idle worker process.
+
+        Args:
+            images: input images
+
+        Returns:
+            List of images without background as PIL.Image.Image instances
+        """
+        return [
+            apply_mask(image, matte)
+            for image, matte in zip(images, self.mattes(images))
+        ]
+
+    def mattes(self, images: List[Image.Image]) -> List[Image.Image]:
+        """
+        Computes alpha mattes of the images by the interface of the first idle worker process.
+        Only mattes are copied back from the worker process, that is 4 times less than RGBA images.
+        Can be called from several threads at the same time.
+        Dead worker processes are restarted, if the restart fails it is retried by the next call.
+
+        Args:
+            images: input images
+
+        Returns:
+            Alpha mattes of the images as L PIL images
+        """
+        image_blocks, result_blocks = [], []
+        # None is a slot of the worker process which failed to restart
+        worker = self.idle_workers.get()
+        try:
+            if worker is None:
+                worker = self._start_worker()
+            process, conn = worker
+            images_meta = []
+            for image in images:
+                shm, shape, mode = image_to_shared_memory(image)
+                image_blocks.append(shm)
+                images_meta.append((shm.name, shape, mode))
+            results_meta = []
+            for image in images:
+                shape = (image.size[1], image.size[0])
+                shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+                result_blocks.append(shm)
+                results_meta.append((shm.name, shape))
+            try:
+                conn.send((images_meta, results_meta))
+                status, error = conn.recv()
+            except (EOFError, OSError):
+                logger.error(f"Ml worker process {process.pid} died. Restarting it.")
+                self._remove_worker(process, conn)
+                worker = None
+                try:
+                    worker = self._start_worker()
+                except BaseException as e:
+                    logger.error(f"Failed to restart ml worker process: {str(e)}")
+                raise RuntimeError("Worker process died while processing images")
+            if status != "ok":
+                raise RuntimeError(error)
+            return [
+                image_from_shared_memory(shm, shape, "L")
+                for shm, (_, shape) in zip(result_blocks, results_meta)
+            ]
+        finally:
+            self.idle_workers.put(worker)
+            for shm in image_blocks + result_blocks:
+                shm.close()
+                shm.unlink()
+
+    def close(self):
+        """Stops all worker processes"""
+        while not self.idle_workers.empty():
+            worker = self.idle_workers.get()
+            if worker is None:
+                continue
+            process, conn = worker
+            try:
+                conn.send(None)
+            except (EOFError, OSError):
+                pass
+            conn.close()
+        with self.lock:
+            for process in self.processes:
+                process.join(timeout=5)
+            self.processes = []
@@ -0,0 +1,49 @@
+"""
+Source url: https://github.com/OPHoperHPO/image-background-remove-tool
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+# Requires "requests" to be installed
+import time
+
+import requests
+from pathlib import Path
+
+headers = {"X-Api-Key": "test"}
+response = requests.post(
+    "http://localhost:5000/api/jobs",
+    files={"image_file": Path("images/4.jpg").read_bytes()},
+    data={"size": "auto"},
+    headers=headers,
+)
+while response.status_code == 429:  # Job queue is full
+    time.sleep(int(response.headers["Retry-After"]))
+    response = requests.post(
+        "http://localhost:5000/api/jobs",
+        files={"image_file": Path("images/4.jpg").read_bytes()},
+        data={"size": "auto"},
+        headers=headers,
+    )
+job_id = response.json()["id"]
+
+response = requests.get(
+    f"http://localhost:5000/api/jobs/{job_id}/result", headers=headers
+)
+while response.status_code == 202:  # Job is not finished yet
+    time.sleep(int(response.headers["Retry-After"]))
+    response = requests.get(
+        f"http://localhost:5000/api/jobs/{job_id}/result", headers=headers
+    )
+if response.status_code == 200:
+    Path("image_without_bg.png").write_bytes(response.content)
+else:
+    print("Error:", response.status_code, response.text)
+
+# Other renderings of the same result are produced without running neural networks again
+response = requests.get(
+    f"http://localhost:5000/api/jobs/{job_id}/result",
+    params={"format": "jpg", "bg_color": "ffffff"},
+    headers=headers,
+)
+if response.status_code == 200:
+    Path("image_white_bg.jpg").write_bytes(response.content)
@@ -49,3 +49,31 @@ def test_seg_fp12(basnet_model, image_pil, image_str, image_path, black_image_pi
     basnet_model = basnet_model(True)
     basnet_model([image_pil])
     basnet_model([image_pil, image_str, image_path, black_image_pil])
+
+
+def test_optimize_for_inference():
+    model = BASNET(input_image_size=64, load_pretrained=False).eval()
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.running_mean.uniform_(-0.1, 0.1)
+            module.running_var.uniform_(0.5, 1.5)
+    sample = torch.rand(2, 3, 64, 64)
+    with torch.no_grad():
+        expected = model.forward(sample)[0]
+        model.optimize_for_inference()
+        assert not any(isinstance(m, torch.nn.BatchNorm2d) for m in model.modules())
+        assert model.frozen_forward is not None
+        assert torch.allclose(model.forward(sample)[0], expected, atol=1e-4)
+        assert torch.allclose(model.frozen_forward(sample)[0], expected, atol=1e-4)
+
+
+def test_fused_output_only():
+    model = BASNET(input_image_size=64, load_pretrained=False).eval()
+    assert model.fused_output_only is True
+    sample = torch.rand(2, 3, 64, 64)
+    with torch.no_grad():
+        maps = model.forward(sample)
+        model.fused_output_only = False
+        expected = model.forward(sample)
+    assert len(maps) == 1 and len(expected) == 8
+    assert torch.allclose(maps[0], expected[0])
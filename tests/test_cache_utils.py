@@ -0,0 +1,63 @@
+"""
+Source url: https://github.com/OPHoperHPO/image-background-remove-tool
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import os
+
+from PIL import Image
+
+from carvekit.utils.cache_utils import AlphaCache
+
+
+def test_key(image_pil):
+    cache = AlphaCache()
+    assert cache.key(image_pil) == cache.key(image_pil.copy())
+    assert cache.key(image_pil) != cache.key(image_pil.convert("RGBA"))
+    assert cache.key(image_pil) != AlphaCache(namespace="other").key(image_pil)
+
+
+def test_memory_cache():
+    cache = AlphaCache(max_memory_size=250)
+    alphas = [Image.new("L", (10, 10), color=x) for x in range(3)]
+    cache.put("a", alphas[0])
+    cache.put("b", alphas[1])
+    assert cache.get("a").tobytes() == alphas[0].tobytes()
+    cache.put("c", alphas[2])  # Evicts "b" as least recently used
+    assert cache.get("b") is None
+    assert cache.get("a").tobytes() == alphas[0].tobytes()
+    assert cache.get("c").tobytes() == alphas[2].tobytes()
+    cache.put("d", Image.new("L", (20, 20)))  # Larger than the whole cache
+    assert cache.get("d") is None
+
+
+def test_disk_cache(tmp_path):
+    alpha = Image.new("L", (10, 10), color=128)
+    cache = AlphaCache(max_memory_size=0, cache_dir=tmp_path)
+    cache.put("a", alpha)
+    assert AlphaCache(cache_dir=tmp_path).get("a").tobytes() == alpha.tobytes()
+    cache.max_disk_size = 0
+    cache.put("b", alpha)
+    assert list(tmp_path.glob("*.png")) == []
+    assert cache.get("a") is None
+
+
+def test_disk_cache_eviction(tmp_path, monkeypatch):
+    alphas = [Image.new("L", (10, 10), color=i) for i in range(1, 5)]
+    cache = AlphaCache(max_memory_size=0, cache_dir=tmp_path)
+    cache.put("a", alphas[0])
+    file_size = tmp_path.joinpath("a.png").stat().st_size
+    cache.max_disk_size = 3 * file_size
+
+    scans = []
+    evict_disk = cache._evict_disk
+    monkeypatch.setattr(cache, "_evict_disk", lambda: scans.append(evict_disk()))
+    for key, alpha in zip("abc", alphas[:3]):
+        cache.put(key, alpha)
+    assert scans == []  # Directory is scanned only when the limit is exceeded
+    os.utime(tmp_path.joinpath("a.png"), (0, 0))
+    cache.put("d", alphas[3])
+    assert len(scans) == 1
+    assert sorted(path.stem for path in tmp_path.glob("*.png")) == ["b", "c", "d"]
+    assert list(tmp_path.glob("*.tmp")) == []
+    assert cache._disk_size == 3 * file_size
@@ -0,0 +1,48 @@
+"""
+Source url: https://github.com/OPHoperHPO/image-background-remove-tool
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import pytest
+from pydantic import ValidationError
+
+from carvekit.web.schemas.config import MLConfig
+from carvekit.web.utils.init_utils import init_config
+
+
+def test_config_from_env_tile_settings(monkeypatch):
+    config = init_config()
+    assert config.ml.matting_tile_size is None
+    monkeypatch.setenv("CARVEKIT_MATTING_TILE_SIZE", "512")
+    monkeypatch.setenv("CARVEKIT_MATTING_TILE_OVERLAP", "32")
+    config = init_config()
+    assert config.ml.matting_tile_size == 512
+    assert config.ml.matting_tile_overlap == 32
+
+
+def test_config_from_env_matting_resolution_trimaps(monkeypatch):
+    assert not init_config().ml.matting_resolution_trimaps
+    monkeypatch.setenv("CARVEKIT_MATTING_RESOLUTION_TRIMAPS", "1")
+    assert init_config().ml.matting_resolution_trimaps
+
+
+def test_config_from_env_skip_matting_threshold(monkeypatch):
+    assert init_config().ml.skip_matting_threshold == 0
+    monkeypatch.setenv("CARVEKIT_SKIP_MATTING_THRESHOLD", "0.02")
+    assert init_config().ml.skip_matting_threshold == 0.02
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(matting_tile_size=100),
+        dict(matting_tile_size=0),
+        dict(matting_tile_size=64, matting_tile_overlap=32),
+        dict(matting_tile_overlap=-1),
+        dict(skip_matting_threshold=-0.1),
+        dict(skip_matting_threshold=1.5),
+    ],
+)
+def test_ml_config_validation(kwargs):
+    with pytest.raises(ValidationError):
+        MLConfig(**kwargs)
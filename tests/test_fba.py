@@ -4,10 +4,18 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 
+import numpy as np
 import pytest
 import torch
 from PIL import Image
 
+import carvekit.ml.arch.fba_matting.layers_WS as L
+from carvekit.ml.arch.fba_matting.models import FBA
+from carvekit.ml.arch.fba_matting.transforms import (
+    groupnorm_normalise_image,
+    trimap_transform,
+    trimap_transform_batch,
+)
 from carvekit.ml.wrap.fba_matting import FBAMatting
 
 
@@ -119,3 +127,123 @@ def test_seg_with_fp12(
     )
     with pytest.raises(ValueError):
         fba_model([image_pil], [image_trimap, image_trimap])
+
+
+def test_seg_array_trimap(fba_model, image_pil, image_trimap):
+    fba_model = fba_model(False)
+    masks = fba_model([image_pil], [np.array(image_trimap)])
+    assert isinstance(masks[0], Image.Image) and masks[0].size == image_pil.size
+    with pytest.raises(ValueError):
+        fba_model.data_preprocessing(np.zeros((8, 8, 3), dtype=np.uint8))
+
+
+def test_bucketing():
+    fba_model = FBAMatting(
+        batch_size=2, input_tensor_size=64, bucketing=True, load_pretrained=False
+    )
+    sizes = [(128, 96), (96, 128), (100, 100), (120, 90)]
+    masks = fba_model(
+        [Image.new("RGB", size) for size in sizes],
+        [Image.new("L", size, 127) for size in sizes],
+    )
+    assert [mask.size for mask in masks] == sizes
+
+
+def test_bucketing_parity():
+    fba_model = FBAMatting(input_tensor_size=64, load_pretrained=False)
+    assert not fba_model.bucketing
+    rng = np.random.default_rng(0)
+    images = [
+        Image.fromarray(rng.integers(0, 256, (75, 100, 3), dtype=np.uint8))
+        for _ in range(2)
+    ]
+    trimap = np.zeros((75, 100), dtype=np.uint8)
+    trimap[15:60, 20:80] = 127
+    trimap[25:50, 35:65] = 255
+    trimaps = [Image.fromarray(trimap)] * 2
+    fba_model.batch_size = 1
+    expected = fba_model(images, trimaps)
+    fba_model.batch_size, fba_model.bucketing = 2, True
+    masks = fba_model(images, trimaps)
+    for mask, expected_mask in zip(masks, expected):
+        difference = np.asarray(mask, dtype=int) - np.asarray(expected_mask, dtype=int)
+        assert np.abs(difference).max() <= 1
+
+
+def test_tiled_matting():
+    fba_model = FBAMatting(
+        batch_size=2, tile_size=64, tile_overlap=16, load_pretrained=False
+    )
+    trimap = np.zeros((150, 200), dtype=np.uint8)
+    trimap[40:110, 50:150] = 255
+    trimap[30:40, 40:160] = 127
+    trimap[110:120, 40:160] = 127
+    unknown = trimap == 127
+    covered = np.zeros_like(unknown)
+    for y, x, h, w in fba_model._tile_grid(unknown):
+        assert (h, w) == (64, 64)
+        covered[y : y + h, x : x + w] = True
+    assert covered[unknown].all()
+
+    mask = np.asarray(fba_model([Image.new("RGB", (200, 150))], [trimap])[0])
+    assert mask.shape == trimap.shape
+    assert (mask[trimap == 255] == 255).all() and (mask[trimap == 0] == 0).all()
+    assert fba_model._tile_grid(np.zeros((8, 8), dtype=bool)) == []
+    with pytest.raises(ValueError):
+        FBAMatting(tile_size=100, load_pretrained=False)
+
+
+def test_fold_weight_standardization():
+    model = FBA(encoder="resnet50_GN_WS").eval()
+    inputs = [torch.rand(1, c, 64, 64) for c in (3, 2, 3, 6)]
+    with torch.no_grad():
+        expected = model(*inputs)
+        L.fold_weight_standardization(model)
+        assert not any(isinstance(m, L.Conv2d) for m in model.modules())
+        assert torch.allclose(model(*inputs), expected, atol=1e-5)
+    fba_model = FBAMatting(load_pretrained=False)
+    assert not any(isinstance(m, L.Conv2d) for m in fba_model.modules())
+
+
+def test_trimap_transform_batch():
+    trimaps = np.zeros((3, 2, 40, 56))
+    trimaps[:, 0, :10] = 1
+    trimaps[:, 1, 25:, 20:40] = 1
+    trimaps[1, 0] = 0  # Trimap without background
+    trimaps[2] = 0  # Trimap without known areas
+    expected = np.stack([trimap_transform(t.transpose(1, 2, 0)) for t in trimaps])
+    out = torch.full((3, 6, 40, 56), float("nan"))
+    clicks = trimap_transform_batch(torch.from_numpy(trimaps).float(), out=out)
+    assert clicks is out and clicks.dtype == torch.float32
+    assert np.allclose(clicks.numpy(), expected.transpose(0, 3, 1, 2), atol=1e-6)
+
+
+def test_preprocessing_float32():
+    fba_model = FBAMatting(input_tensor_size=64, batch_size=1, load_pretrained=False)
+    pixels = np.random.default_rng(0).integers(0, 256, (50, 90, 3), dtype=np.uint8)
+    image, image_transformed = fba_model.data_preprocessing(Image.fromarray(pixels))
+    assert image.dtype == image_transformed.dtype == torch.float32
+    assert image.shape == (1, 3, 40, 64)
+    assert torch.allclose(
+        image_transformed,
+        groupnorm_normalise_image(image.clone(), format="nchw"),
+        atol=1e-6,
+    )
+    trimap = np.zeros((40, 64), dtype=np.uint8)
+    trimap[10:30, 20:40] = 127
+    trimap[15:25, 25:35] = 255
+    trimap_tensor, _ = fba_model.data_preprocessing(trimap)
+    assert trimap_tensor.dtype == torch.float32
+    assert torch.equal(trimap_tensor[0, 0], torch.from_numpy(trimap == 0).float())
+    assert torch.equal(trimap_tensor[0, 1], torch.from_numpy(trimap == 255).float())
+
+
+@pytest.mark.parametrize("size", [(150, 100), (40, 30)])
+def test_array_trimap_resampling(size):
+    fba_model = FBAMatting(input_tensor_size=64, batch_size=1, load_pretrained=False)
+    trimap = np.zeros(size[::-1], dtype=np.uint8)
+    trimap[size[1] // 4 :, size[0] // 4 :] = 127
+    trimap[size[1] // 2 :, size[0] // 2 :] = 255
+    array_tensor, _ = fba_model.data_preprocessing(trimap)
+    pil_tensor, _ = fba_model.data_preprocessing(Image.fromarray(trimap))
+    assert torch.equal(array_tensor, pil_tensor)
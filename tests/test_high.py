@@ -30,3 +30,42 @@ def test_init():
         trimap_erosion_iters=0,
         fp16=True,
     )
+
+
+def test_mask_format():
+    interface = HiInterface(seg_mask_size=64, load_pretrained=False)
+    assert interface.u2net.mask_format == "pil"
+    interface = HiInterface(
+        object_type="hairs-like",
+        seg_mask_size=64,
+        load_pretrained=False,
+        mask_format="numpy",
+    )
+    assert interface.u2net.mask_format == "numpy"
+
+
+def test_tile_settings():
+    interface = HiInterface(
+        seg_mask_size=64,
+        load_pretrained=False,
+        matting_tile_size=256,
+        matting_tile_overlap=32,
+    )
+    assert interface.fba.tile_size == 256
+    assert interface.fba.tile_overlap == 32
+
+
+def test_trimaps_resolution():
+    interface = HiInterface(seg_mask_size=64, load_pretrained=False)
+    assert not interface.postprocessing_pipeline.matting_resolution_trimaps
+    interface = HiInterface(
+        seg_mask_size=64, load_pretrained=False, matting_resolution_trimaps=True
+    )
+    assert interface.postprocessing_pipeline.matting_resolution_trimaps
+
+
+def test_skip_matting_threshold():
+    interface = HiInterface(
+        seg_mask_size=64, load_pretrained=False, skip_matting_threshold=0.05
+    )
+    assert interface.postprocessing_pipeline.skip_matting_threshold == 0.05
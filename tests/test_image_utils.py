@@ -7,6 +7,7 @@ import uuid
 from pathlib import Path
 
 import PIL.Image
+import numpy as np
 import pytest
 import torch
 from PIL import Image
@@ -17,6 +18,9 @@ from carvekit.utils.image_utils import (
     to_tensor,
     transparency_paste,
     add_margin,
+    images_to_uint8_batch,
+    normalize_batch,
+    resize_masks,
 )
 
 
@@ -90,3 +94,37 @@ def test_add_margin():
         )
         is True
     )
+
+
+def test_images_to_uint8_batch():
+    images = [Image.new("RGB", (64, 32), (255, 0, 0)), Image.new("RGB", (16, 16))]
+    batch = images_to_uint8_batch(images, (20, 10))
+    assert batch.shape == (2, 3, 10, 20)
+    assert batch.dtype == torch.uint8
+    assert batch[0, 0].eq(255).all() and batch[0, 1:].eq(0).all()
+    assert batch[1].eq(0).all()
+
+
+def test_normalize_batch():
+    batch = torch.full((2, 3, 4, 4), 255, dtype=torch.uint8)
+    batch[1] = 51
+    normalized = normalize_batch(batch, mean=(0, 0, 0), std=(1, 1, 1))
+    assert normalized.dtype == torch.float32
+    assert torch.allclose(normalized[0], torch.ones(3, 4, 4))
+    assert torch.allclose(normalized[1], torch.full((3, 4, 4), 0.2))
+    normalized = normalize_batch(
+        batch, mean=(0, 0, 0), std=(1, 1, 1), per_image_max=True
+    )
+    assert torch.allclose(normalized, torch.ones(2, 3, 4, 4))
+    assert (
+        normalize_batch(torch.zeros((1, 3, 2, 2), dtype=torch.uint8)).isfinite().all()
+    )
+
+
+def test_resize_masks():
+    masks = torch.zeros((2, 1, 8, 8))
+    masks[0] = 1.0
+    resized = resize_masks(masks, [(20, 10), (5, 7)])
+    assert resized[0].shape == (10, 20) and resized[1].shape == (7, 5)
+    assert resized[0].dtype == np.uint8
+    assert (resized[0] == 255).all() and (resized[1] == 0).all()
@@ -8,6 +8,7 @@ import warnings
 import torch
 
 from carvekit.api.interface import Interface
+from carvekit.utils.cache_utils import AlphaCache
 
 
 def test_init(available_models):
@@ -52,3 +53,49 @@ def test_seg(image_pil, image_str, image_path, available_models):
                 del post, interface
             del pre
         del mdl
+
+
+def test_pipelined(image_pil, image_str, image_path, u2net_model):
+    mdl = u2net_model(False)
+    mdl.batch_size = 2
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    sequential = Interface(seg_pipe=mdl, device=device)
+    pipelined = Interface(seg_pipe=mdl, device=device, pipelined=True)
+    images = [image_pil, image_str, image_path]
+    results = pipelined(images)
+    assert len(results) == len(images)
+    for result, expected in zip(results, sequential(images)):
+        assert result.tobytes() == expected.tobytes()
+
+
+def test_stream(image_pil, image_str, image_path, u2net_model):
+    mdl = u2net_model(False)
+    mdl.batch_size = 2
+    interface = Interface(
+        seg_pipe=mdl, device="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    expected = interface([image_pil, image_str, image_path])
+    results = list(interface.stream(x for x in [image_pil, image_str, image_path]))
+    assert [key for key, _ in results] == [0, image_str, image_path]
+    for (_, result), expected_result in zip(results, expected):
+        assert result.tobytes() == expected_result.tobytes()
+    assert list(interface.stream([])) == []
+
+
+def test_cache(image_pil, image_str, u2net_model, tmp_path):
+    mdl = u2net_model(False)
+    cache = AlphaCache(cache_dir=tmp_path)
+    interface = Interface(
+        seg_pipe=mdl, device="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    cached_interface = Interface(seg_pipe=mdl, device=interface.device, cache=cache)
+    expected = interface([image_pil, image_str])
+    results = cached_interface([image_pil, image_str])
+    assert len(list(tmp_path.glob("*.png"))) == 1
+    results += cached_interface([image_pil])
+    for result, expected_result in zip(results, expected + expected[:1]):
+        assert result.size == expected_result.size
+        assert (
+            result.getchannel("A").tobytes()
+            == expected_result.getchannel("A").tobytes()
+        )
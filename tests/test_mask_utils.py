@@ -3,6 +3,7 @@ Source url: https://github.com/OPHoperHPO/image-background-remove-tool
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+import numpy as np
 import pytest
 import PIL.Image
 from carvekit.utils.mask_utils import composite, apply_mask, extract_alpha_channel
@@ -44,3 +45,24 @@ def test_extract_alpha_channel():
         )
         is True
     )
+
+
+def test_composite_values():
+    foreground = PIL.Image.new("RGB", (4, 4), (200, 100, 0))
+    background = PIL.Image.new("RGB", (4, 4), (0, 100, 200))
+    for alpha, expected in [(0, (0, 100, 200)), (255, (200, 100, 0))]:
+        result = composite(foreground, background, PIL.Image.new("L", (4, 4), alpha))
+        assert result.mode == "RGBA"
+        assert result.getpixel((0, 0)) == (*expected, alpha)
+    result = composite(foreground, background, PIL.Image.new("L", (4, 4), 51))
+    assert result.getpixel((0, 0)) == (40, 100, 160, 51)
+
+
+def test_apply_mask_values():
+    image = PIL.Image.new("RGB", (4, 4), (200, 100, 0))
+    result = apply_mask(image, PIL.Image.new("L", (4, 4), 128))
+    assert result.mode == "RGBA"
+    assert result.getpixel((0, 0)) == (200, 100, 0, 128)
+    assert image.mode == "RGB"
+    result = apply_mask(image, np.full((4, 4), 64, dtype=np.uint8))
+    assert result.getpixel((0, 0)) == (200, 100, 0, 64)
@@ -3,7 +3,14 @@ Source url: https://github.com/OPHoperHPO/image-background-remove-tool
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
-from carvekit.utils.pool_utils import batch_generator, thread_pool_processing
+import pytest
+
+from carvekit.utils.pool_utils import (
+    batch_generator,
+    bucket_batch_generator,
+    thread_pool_processing,
+    pipeline_processing,
+)
 
 
 def test_thread_pool_processing():
@@ -14,3 +21,25 @@ def test_thread_pool_processing():
 def test_batch_generator():
     assert list(batch_generator([1, 2, 3], n=1)) == [[1], [2], [3]]
     assert list(batch_generator([1, 2, 3, 4], n=2)) == [[1, 2], [3, 4]]
+    assert list(batch_generator(iter([1, 2, 3]), n=2)) == [[1, 2], [3]]
+    assert list(batch_generator((i for i in range(0)), n=2)) == []
+
+
+def test_bucket_batch_generator():
+    sizes = [(400, 300), (300, 400), (800, 600), (600, 800), (100, 100)]
+    batches = list(bucket_batch_generator(sizes, n=2))
+    assert batches == [[1, 3], [4, 0], [2]]
+    assert list(bucket_batch_generator([], n=2)) == []
+
+
+def test_pipeline_processing():
+    assert list(pipeline_processing([int], ["1", "2", "3"])) == [1, 2, 3]
+    assert list(
+        pipeline_processing([int, lambda x: x * 2, str], iter(["1", "2"]), 1)
+    ) == ["2", "4"]
+    assert list(pipeline_processing([int], [])) == []
+    with pytest.raises(ValueError):
+        list(pipeline_processing([int], ["1", "a", "3"]))
+    results = pipeline_processing([int], range(100))
+    assert next(results) == 0
+    results.close()
@@ -3,8 +3,13 @@ Source url: https://github.com/OPHoperHPO/image-background-remove-tool
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+import numpy as np
 import pytest
+from PIL import Image
+
+from carvekit.ml.wrap.fba_matting import FBAMatting
 from carvekit.pipelines.postprocessing import MattingMethod
+from carvekit.trimap.generator import TrimapGenerator
 
 
 def test_init(fba_model, trimap_instance):
@@ -21,3 +26,39 @@ def test_seg(matting_method_instance, image_str, image_path, image_pil):
     )
     with pytest.raises(ValueError):
         matting_method_instance(images=[image_str], masks=[image_pil, image_path])
+
+
+def test_matting_resolution_trimaps():
+    matting_method = MattingMethod(
+        FBAMatting(input_tensor_size=64, batch_size=2, load_pretrained=False),
+        TrimapGenerator(kernel_size=10, erosion_iters=2),
+        matting_resolution_trimaps=True,
+    )
+    images = [Image.new("RGB", (200, 120)), Image.new("RGB", (48, 40))]
+    masks = [np.zeros((120, 200), dtype=np.uint8), Image.new("L", (48, 40))]
+    masks[0][30:90, 50:150] = 255
+    results = matting_method(images=images, masks=masks)
+    assert [result.size for result in results] == [(200, 120), (48, 40)]
+    with pytest.raises(ValueError):
+        matting_method(images=images[:1], masks=[np.zeros((32, 48), dtype=np.uint8)])
+
+
+def test_skip_matting():
+    fba_model = FBAMatting(input_tensor_size=64, batch_size=2, load_pretrained=False)
+    calls = []
+    matting_method = MattingMethod(
+        lambda images, trimaps: calls.append(len(images))
+        or fba_model(images=images, trimaps=trimaps),
+        TrimapGenerator(kernel_size=1, erosion_iters=0),
+        skip_matting_threshold=0.05,
+    )
+    crisp_mask = np.zeros((64, 64), dtype=np.uint8)
+    crisp_mask[20:44, 20:44] = 255
+    soft_mask = np.tile(np.linspace(1, 254, 64).astype(np.uint8), (64, 1))
+    images = [Image.new("RGB", (64, 64), color=(0, 128, 255))] * 2
+    results = matting_method(images=images, masks=[crisp_mask, soft_mask])
+    assert calls == [1]
+    assert np.array_equal(np.asarray(results[0])[:, :, 3], crisp_mask)
+    stats = matting_method.skip_stats()
+    assert (stats["images"], stats["skipped"], stats["skipped_ratio"]) == (2, 1, 0.5)
+    assert stats["unknown_fractions"][0] < 0.05 < stats["unknown_fractions"][1]
@@ -0,0 +1,272 @@
+"""
+Source url: https://github.com/OPHoperHPO/image-background-remove-tool
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import io
+import zipfile
+
+import numpy as np
+import pytest
+from PIL import Image, ImageColor
+
+from carvekit.utils.image_utils import transparency_paste, add_margin
+from carvekit.utils.mask_utils import extract_alpha_channel
+from carvekit.web.other.removebg import (
+    is_error_response,
+    matte_remove_bg,
+    prepare_remove_bg,
+    process_remove_bg,
+    render_remove_bg,
+)
+from carvekit.web.schemas.request import Parameters
+
+
+def stub_interface(images, soft=False):
+    """Returns input images with an elliptic alpha matte, transparent pixels are black"""
+    results = []
+    for image in images:
+        w, h = image.size
+        y, x = np.mgrid[0:h, 0:w]
+        distance = ((x - w / 2) / (w / 3)) ** 2 + ((y - h / 2) / (h / 3)) ** 2
+        if soft:
+            alpha = np.clip((1.5 - distance) * 255, 0, 255).astype(np.uint8)
+        else:
+            alpha = (distance < 1).astype(np.uint8) * 255
+        rgb = np.asarray(image.convert("RGB")) * (alpha > 0)[:, :, np.newaxis]
+        results.append(Image.fromarray(np.dstack((rgb, alpha)).astype(np.uint8)))
+    return results
+
+
+def baseline_render(params, image, new_image, roi_box, bg, is_json_or_www_encoded):
+    """
+    Rendering part of process_remove_bg before it was split into stages.
+    Its output matches render_remove_bg for binary mattes.
+    """
+    scaled = False
+    if "scale" in params.keys() and params["scale"] != 100:
+        value = params["scale"]
+        new_image.thumbnail(
+            (int(image.size[0] * value / 100), int(image.size[1] * value / 100)),
+            resample=3,
+        )
+        scaled = True
+    if "crop" in params.keys():
+        value = params["crop"]
+        if value:
+            new_image = new_image.crop(new_image.getbbox())
+            if "crop_margin" in params.keys():
+                crop_margin = params["crop_margin"]
+                if "px" in crop_margin:
+                    crop_margin = abs(int(crop_margin.replace("px", "")))
+                    new_image = add_margin(
+                        new_image,
+                        crop_margin,
+                        crop_margin,
+                        crop_margin,
+                        crop_margin,
+                        (0, 0, 0, 0),
+                    )
+                elif "%" in crop_margin:
+                    crop_margin = int(crop_margin.replace("%", ""))
+                    new_image = add_margin(
+                        new_image,
+                        int(new_image.size[1] * crop_margin / 100),
+                        int(new_image.size[0] * crop_margin / 100),
+                        int(new_image.size[1] * crop_margin / 100),
+                        int(new_image.size[0] * crop_margin / 100),
+                        (0, 0, 0, 0),
+                    )
+        else:
+            if "position" in params.keys() and scaled is False:
+                value = params["position"]
+                if len(value) == 2:
+                    new_image = transparency_paste(
+                        Image.new("RGBA", image.size),
+                        new_image,
+                        (
+                            int(image.size[0] * value[0] / 100),
+                            int(image.size[1] * value[1] / 100),
+                        ),
+                    )
+                else:
+                    new_image = transparency_paste(
+                        Image.new("RGBA", image.size), new_image, roi_box
+                    )
+            elif scaled is False:
+                new_image = transparency_paste(
+                    Image.new("RGBA", image.size), new_image, roi_box
+                )
+    if "channels" in params.keys():
+        value = params["channels"]
+        if value == "alpha":
+            new_image = extract_alpha_channel(new_image)
+        else:
+            bg_changed = False
+            if "bg_color" in params.keys():
+                value = params["bg_color"]
+                if len(value) > 0:
+                    color = ImageColor.getcolor(value, "RGB")
+                    bg = Image.new("RGBA", new_image.size, color)
+                    bg = transparency_paste(bg, new_image, (0, 0))
+                    new_image = bg.copy()
+                    bg_changed = True
+            if not is_json_or_www_encoded:
+                if bg and bg_changed is False:
+                    bg = bg.resize(new_image.size)
+                    bg = bg.convert("RGBA")
+                    bg = transparency_paste(bg, new_image, (0, 0))
+                    new_image = bg.copy()
+    return new_image.convert("RGBA")
+
+
+def decode(response) -> np.ndarray:
+    if response["type"] == "zip":
+        with zipfile.ZipFile(io.BytesIO(response["data"][0])) as zip_file:
+            return np.asarray(Image.open(zip_file.open("alpha.png")).convert("L"))
+    return np.asarray(Image.open(response["data"][0]).convert("RGBA"))
+
+
+def make_params(**kwargs) -> dict:
+    """Returns parameters as they are parsed from the removebg api method request"""
+    defaults = dict(format="png", size="full", scale="original", position="original")
+    return Parameters(**{**defaults, **kwargs}).dict()
+
+
+@pytest.fixture()
+def image():
+    return Image.fromarray(
+        np.random.default_rng(0).integers(0, 256, (90, 120, 3), dtype=np.uint8)
+    )
+
+
+@pytest.fixture()
+def bg():
+    return Image.fromarray(
+        np.random.default_rng(1).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+    )
+
+
+@pytest.mark.parametrize("roi", ["0% 0% 100% 100%", "10px 5px 100px 80px"])
+@pytest.mark.parametrize(
+    "params",
+    [
+        dict(),
+        dict(size="preview"),
+        dict(crop=True),
+        dict(crop=True, crop_margin="7px"),
+        dict(crop=True, crop_margin="10%"),
+        dict(scale="50%"),
+        dict(scale="50%", crop=True),
+        dict(position="20%"),
+        dict(position="10% 30%"),
+        dict(channels="alpha"),
+        dict(bg_color="#f0a"),
+        dict(bg_color="81d4fa", crop=True),
+        dict(with_bg=True),
+        dict(with_bg=True, is_json=True),
+    ],
+)
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L"])
+def test_render_parity(image, bg, params, roi, mode):
+    params = dict(params)
+    bg = bg if params.pop("with_bg", False) else None
+    is_json = params.pop("is_json", False)
+    params = make_params(roi=roi, **params)
+    image = image.convert(mode)
+
+    baseline_image = image.copy()
+    new_image, roi_box = prepare_remove_bg(params, baseline_image)
+    expected = baseline_render(
+        params, baseline_image, stub_interface([new_image])[0], roi_box, bg, is_json
+    )
+    result = process_remove_bg(stub_interface, params, image.copy(), bg, is_json)
+
+    assert not is_error_response(result)
+    assert result["data"][1] == expected.size
+    assert np.array_equal(decode(result), np.asarray(expected))
+
+
+@pytest.mark.parametrize("format", ["jpg", "zip"])
+def test_render_parity_formats(image, format):
+    params = make_params(format=format)
+    new_image, roi_box = prepare_remove_bg(params, image)
+    expected = baseline_render(
+        params, image, stub_interface([new_image])[0], roi_box, None, False
+    )
+    result = process_remove_bg(stub_interface, params, image.copy(), None)
+    assert result["type"] == format
+    assert result["data"][1] == expected.size
+    if format == "jpg":
+        expected = np.asarray(Image.open(io.BytesIO(_jpeg(expected))))
+        assert np.array_equal(decode(result)[:, :, :3], expected)
+    else:
+        assert np.array_equal(decode(result), np.asarray(expected.getchannel("A")))
+
+
+def _jpeg(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, "JPEG", quality=100)
+    return buffer.getvalue()
+
+
+def test_render_again(image):
+    params = make_params()
+    new_image, roi_box = prepare_remove_bg(params, image)
+    alpha = matte_remove_bg(stub_interface, [new_image])[0]
+    first = decode(render_remove_bg(params, image, alpha, roi_box, None))
+    render_remove_bg({**params, "bg_color": "#fff"}, image, alpha, roi_box, None)
+    assert np.array_equal(
+        decode(render_remove_bg(params, image, alpha, roi_box, None)), first
+    )
+
+
+def test_render_soft_matte(image):
+    params = make_params()
+    new_image, roi_box = prepare_remove_bg(params, image)
+    alpha = matte_remove_bg(lambda x: stub_interface(x, soft=True), [new_image])[0]
+    result = decode(render_remove_bg(params, image, alpha, roi_box, None))
+    assert np.array_equal(result[:, :, 3], np.asarray(alpha))
+    visible = result[:, :, 3] > 0
+    assert np.array_equal(result[visible, :3], np.asarray(image)[visible])
+    result = decode(
+        render_remove_bg({**params, "channels": "alpha"}, image, alpha, roi_box, None)
+    )
+    assert np.array_equal(result[:, :, 0], np.asarray(alpha))
+
+
+@pytest.mark.parametrize(
+    "params, expected",
+    [
+        # Straight alpha: colors are kept, alpha is the matte itself.
+        # Fully transparent pixels are black.
+        (
+            dict(),
+            [[0, 0, 0, 0], [200, 100, 50, 1], [200, 100, 50, 64]]
+            + [[200, 100, 50, 128], [200, 100, 50, 254], [200, 100, 50, 255]],
+        ),
+        # Alpha only output is the matte itself, not the matte squared
+        (
+            dict(channels="alpha"),
+            [[0, 0, 0, 255], [1, 1, 1, 255], [64, 64, 64, 255]]
+            + [[128, 128, 128, 255], [254, 254, 254, 255], [255, 255, 255, 255]],
+        ),
+        # Foreground is blended with the background color by the matte
+        (
+            dict(bg_color="#000"),
+            [[0, 0, 0, 255], [1, 0, 0, 255], [50, 25, 13, 255]]
+            + [[100, 50, 25, 255], [199, 100, 50, 255], [200, 100, 50, 255]],
+        ),
+        (
+            dict(bg_color="#fff"),
+            [[255, 255, 255, 255], [255, 254, 254, 255], [241, 216, 204, 255]]
+            + [[227, 177, 152, 255], [200, 101, 51, 255], [200, 100, 50, 255]],
+        ),
+    ],
+)
+def test_render_soft_matte_values(params, expected):
+    image = Image.new("RGB", (3, 2), (200, 100, 50))
+    alpha = Image.fromarray(np.array([[0, 1, 64], [128, 254, 255]], dtype=np.uint8))
+    params = make_params(**params)
+    result = decode(render_remove_bg(params, image, alpha, [0, 0, 3, 2], None))
+    assert result.reshape(-1, 4).tolist() == expected
@@ -0,0 +1,301 @@
+"""
+Source url: https://github.com/OPHoperHPO/image-background-remove-tool
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import asyncio
+import io
+import itertools
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+from loguru import logger
+
+from carvekit.web.schemas.config import WebAPIConfig
+from carvekit.web.utils.task_queue import MLProcessor
+
+
+class StubInterface:
+    """Returns input images with alpha equal to the red channel"""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, images):
+        self.batches.append(len(images))
+        results = []
+        for image in images:
+            result = image.convert("RGBA")
+            result.putalpha(image.convert("RGB").getchannel("R"))
+            results.append(result)
+        return results
+
+
+def make_image(size=(48, 40)):
+    return Image.fromarray(
+        np.random.default_rng(0).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    )
+
+
+def truncated_image():
+    buffer = io.BytesIO()
+    make_image().save(buffer, format="PNG")
+    return Image.open(io.BytesIO(buffer.getvalue()[:200]))
+
+
+def make_processor(**kwargs) -> MLProcessor:
+    processor = MLProcessor(api_config=WebAPIConfig(**kwargs))
+    processor.interface = StubInterface()
+    processor.daemon = True
+    processor.test_job_ids = itertools.count()
+    return processor
+
+
+def add_job(processor: MLProcessor, image=None, params=None) -> str:
+    id = str(next(processor.test_job_ids))
+    with processor.jobs_condition:
+        processor.jobs[id] = [
+            {"size": "auto", "format": "png", **(params or {})},
+            image or make_image(),
+            None,
+            False,
+        ]
+        processor.jobs_condition.notify()
+    return id
+
+
+def test_collect_jobs_batching():
+    processor = make_processor(job_batch_size=2, job_batch_timeout=0)
+    ids = [add_job(processor) for _ in range(3)]
+    assert processor.collect_jobs(timeout=1) == ids[:2]
+    assert processor.pending_jobs_count() == 1
+    assert processor.collect_jobs(timeout=1) == ids[2:]
+    assert processor.pending_jobs_count() == 0
+
+
+def test_collect_jobs_timeout():
+    processor = make_processor(job_batch_size=2, job_batch_timeout=100)
+    start = time.time()
+    assert processor.collect_jobs(timeout=0.1) == []
+    assert time.time() - start >= 0.1
+
+    # Incomplete batch is returned after job_batch_timeout
+    id = add_job(processor)
+    start = time.time()
+    assert processor.collect_jobs(timeout=1) == [id]
+    assert 0.1 <= time.time() - start < 1
+
+    # Batch is returned as soon as the job, added during the wait, fills it
+    ids = [add_job(processor)]
+    timer = threading.Timer(0.02, lambda: ids.append(add_job(processor)))
+    timer.start()
+    assert processor.collect_jobs(timeout=1) == ids
+
+
+def test_process_batch():
+    processor = make_processor(job_batch_size=3)
+    ids = [add_job(processor) for _ in range(3)]
+    free_workers = threading.Semaphore(0)
+    processor.process_batch(processor.collect_jobs(timeout=1), free_workers)
+    assert free_workers.acquire(blocking=False)
+    assert processor.interface.batches == [3]
+    assert processor.jobs == {} and processor.processing_jobs == set()
+    for id in ids:
+        assert processor.job_status(id) == "finished"
+        assert processor.job_result(id)["type"] == "png"
+
+
+def test_process_batch_truncated_image():
+    processor = make_processor(job_batch_size=3)
+    good_id = add_job(processor)
+    bad_id = add_job(processor, image=truncated_image())
+    free_workers = threading.Semaphore(0)
+    processor.process_batch(processor.collect_jobs(timeout=1), free_workers)
+    assert free_workers.acquire(blocking=False)
+    assert processor.jobs == {} and processor.processing_jobs == set()
+    assert processor.job_result(good_id)["type"] == "png"
+    assert processor.job_result(bad_id)[1] == 400
+
+
+def test_process_batch_unexpected_error(monkeypatch):
+    processor = make_processor(job_batch_size=2)
+    ids = [add_job(processor) for _ in range(2)]
+
+    def failing_process_jobs(job_ids):
+        raise RuntimeError("Unexpected error")
+
+    monkeypatch.setattr(processor, "process_jobs", failing_process_jobs)
+    free_workers = threading.Semaphore(0)
+    processor.process_batch(processor.collect_jobs(timeout=1), free_workers)
+    assert free_workers.acquire(blocking=False)
+    assert processor.jobs == {} and processor.processing_jobs == set()
+    for id in ids:
+        assert processor.job_result(id)[1] == 500
+
+
+def wait_processed_job(processor: MLProcessor, timeout=None) -> bool:
+    id = add_job(processor)
+
+    async def wait():
+        waiter = asyncio.ensure_future(processor.job_wait(id, timeout))
+        await asyncio.sleep(0.01)
+        assert len(processor.job_waiters[id]) == 1
+        threading.Thread(
+            target=processor.process_batch,
+            args=(processor.collect_jobs(timeout=1), threading.Semaphore(0)),
+        ).start()
+        return await waiter
+
+    result = asyncio.run(wait())
+    assert processor.job_waiters == {}
+    return result
+
+
+def test_job_wait():
+    processor = make_processor(job_batch_size=1)
+    assert wait_processed_job(processor, timeout=5)
+    assert processor.job_result("0")["type"] == "png"
+
+
+def test_job_wait_error(monkeypatch):
+    processor = make_processor(job_batch_size=1)
+
+    def failing_process_jobs(job_ids):
+        raise RuntimeError("Unexpected error")
+
+    monkeypatch.setattr(processor, "process_jobs", failing_process_jobs)
+    assert wait_processed_job(processor)
+    assert processor.job_result("0")[1] == 500
+
+
+def test_job_wait_timeout():
+    processor = make_processor()
+    id = add_job(processor)
+    assert not asyncio.run(processor.job_wait(id, 0.05))
+    assert processor.job_waiters == {}
+    assert processor.job_status(id) == "wait"
+    assert asyncio.run(processor.job_wait("unknown", 0.05))
+
+
+def process_jobs(processor: MLProcessor, count: int, size=(400, 300)) -> list:
+    ids = [add_job(processor, image=make_image(size)) for _ in range(count)]
+    for id in ids:
+        processor.process_batch([id], threading.Semaphore(0))
+    return ids
+
+
+def test_job_render():
+    processor = make_processor()
+    id = process_jobs(processor, 1)[0]
+    result = processor.job_render(id, {"format": "jpg", "size": "preview"})
+    assert result["type"] == "jpg"
+    assert result["data"][1] == (400, 300)
+    assert processor.job_render("unknown", {}) is None
+
+
+def test_job_render_cache_size():
+    processor = make_processor(render_cache_size=1)
+    ids = process_jobs(processor, 3)
+    # Each job keeps 480 KB of the image and the matte, the oldest one is evicted
+    assert processor.job_render(ids[0], {}) is None
+    assert processor.job_result(ids[0])["type"] == "png"
+    assert processor.job_render(ids[1], {}) is not None
+
+    # Rendered jobs become recently used
+    ids.append(process_jobs(processor, 1)[0])
+    assert processor.job_render(ids[2], {}) is None
+    assert processor.job_render(ids[1], {}) is not None
+    assert list(processor.renderable_jobs.keys()) == [ids[3], ids[1]]
+
+    for id in ids[1:]:
+        processor.job_result(id)
+    assert processor.renderable_jobs_size == 0
+    assert processor.completed_jobs == {}
+
+
+def test_job_render_disabled():
+    processor = make_processor(render_cache_size=0)
+    id = process_jobs(processor, 1, size=(48, 40))[0]
+    assert processor.job_render(id, {}) is None
+    assert processor.job_result(id)["type"] == "png"
+
+
+def test_try_job_create():
+    processor = make_processor(max_queue_size=5)
+    processor.start = lambda: None
+    barrier = threading.Barrier(10)
+    ids = []
+
+    def create():
+        barrier.wait()
+        ids.append(processor.try_job_create(["params", make_image(), None, False]))
+
+    threads = [threading.Thread(target=create) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(processor.jobs) == 5
+    assert sorted(processor.jobs.keys()) == sorted(id for id in ids if id is not None)
+
+
+def test_result_cache_size():
+    processor = make_processor(result_cache_size=1, render_cache_size=0)
+    ids = process_jobs(processor, 2)
+    assert processor.stored_results_size > 512 * 1024
+    # Fetched results become recently used
+    assert processor.job_result(ids[0], remove=False)["type"] == "png"
+
+    ids += process_jobs(processor, 1)
+    assert processor.job_status(ids[1]) == "not_found"
+    assert processor.job_status(ids[0]) == "finished"
+    assert list(processor.stored_results.keys()) == [ids[0], ids[2]]
+
+    # Result of the new job is kept even if it is larger than the limit
+    ids += process_jobs(processor, 1, size=(1200, 900))
+    assert list(processor.completed_jobs.keys()) == [ids[3]]
+
+    assert processor.job_delete(ids[3])
+    assert not processor.job_delete(ids[3])
+    assert processor.completed_jobs == {}
+    assert processor.stored_results_size == 0
+
+
+class StubMattingMethod:
+    def __init__(self):
+        self.stats = {
+            "images": 0,
+            "skipped": 0,
+            "skipped_ratio": 0.0,
+            "unknown_fractions": [],
+        }
+
+    def skip_stats(self):
+        return dict(self.stats)
+
+
+def test_log_skip_stats():
+    processor = make_processor()
+    processor.interface.postprocessing_pipeline = StubMattingMethod()
+    messages = []
+    sink_id = logger.add(messages.append, format="{message}")
+    try:
+        processor.log_skip_stats()
+        assert messages == []
+        processor.interface.postprocessing_pipeline.stats = {
+            "images": 4,
+            "skipped": 1,
+            "skipped_ratio": 0.25,
+            "unknown_fractions": [0.3, 0.01, 0.2, 0.1],
+        }
+        processor.log_skip_stats()
+        # Unchanged statistics aren't logged again
+        processor.log_skip_stats()
+    finally:
+        logger.remove(sink_id)
+    assert messages == [
+        "Matting skipped for 1 of 4 images (25.0%), "
+        "median unknown area of recent trimaps is 20.00%\n"
+    ]
@@ -2,7 +2,14 @@ import pytest
 import torch
 from PIL import Image
 
+from carvekit.ml.arch.tracerb7.effi_utils import (
+    Conv2dDynamicSamePadding,
+    Conv2dStaticSamePadding,
+)
+from carvekit.ml.arch.tracerb7.efficientnet import EfficientEncoderB7
+from carvekit.ml.wrap import tracer_b7
 from carvekit.ml.wrap.tracer_b7 import TracerUniversalB7
+from carvekit.utils.models_utils import EmptyAutocast
 
 
 def test_init():
@@ -46,3 +53,73 @@ def test_seg_with_fp12(tracer_model, image_pil, image_str, image_path, black_ima
     tracer_model = tracer_model(True)
     tracer_model([image_pil])
     tracer_model([image_pil, image_str, image_path, black_image_pil])
+
+
+def test_optimize_for_inference():
+    model = TracerUniversalB7(input_image_size=128, load_pretrained=False).eval()
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.running_mean.uniform_(-0.1, 0.1)
+            module.running_var.uniform_(0.5, 1.5)
+    sample = torch.rand(2, 3, 128, 128)
+    with torch.no_grad():
+        expected = model.forward(sample)
+        model.optimize_for_inference()
+        assert not any(
+            isinstance(m, torch.nn.BatchNorm2d) for m in model.encoder.modules()
+        )
+        assert model.frozen_forward is not None
+        assert torch.allclose(model.forward(sample), expected, atol=1e-4)
+        assert torch.allclose(model.frozen_forward(sample), expected, atol=1e-4)
+
+
+def test_optimize_for_inference_reduced_precision(monkeypatch):
+    # bfloat16 stands in for CUDA float16 of fp16 mode, which is unavailable on CPU
+    def get_precision_autocast(device="cpu", fp16=True):
+        return EmptyAutocast(), torch.bfloat16 if fp16 else torch.float32
+
+    monkeypatch.setattr(tracer_b7, "get_precision_autocast", get_precision_autocast)
+    model = TracerUniversalB7(input_image_size=64, load_pretrained=False, fp16=True)
+    model.optimize_for_inference()
+    assert model.frozen_forward is not None
+    assert model.frozen_dtype == torch.bfloat16
+    image = Image.new("RGB", (80, 60), (120, 60, 30))
+    frozen_calls = []
+    frozen_forward = model.frozen_forward
+    model.frozen_forward = lambda x: frozen_calls.append(x.dtype) or frozen_forward(x)
+    assert model([image])[0].size == (80, 60)
+    assert frozen_calls == [torch.bfloat16]
+
+    # The frozen network isn't used in other precision
+    model.fp16 = False
+    assert model([image])[0].size == (80, 60)
+    assert frozen_calls == [torch.bfloat16]
+
+
+def test_encoder_features():
+    encoder = EfficientEncoderB7().eval()
+    sample = torch.rand(1, 3, 64, 64)
+    expected = encoder(sample)
+    with torch.no_grad():
+        features = encoder(sample)
+        stem = encoder.initial_conv(sample)
+        first_features = encoder.get_blocks(stem, 64, 64, block_idx=[10])
+    assert len(features) == len(expected) == 4
+    for feature, expected_feature in zip(features, expected):
+        assert torch.equal(feature, expected_feature)
+    assert len(first_features) == 1
+    assert torch.equal(first_features[0], expected[0])
+
+
+@pytest.mark.parametrize("kernel_size", [1, 3, 5])
+@pytest.mark.parametrize("stride", [1, 2])
+@pytest.mark.parametrize("image_size", [15, 16])
+def test_static_same_padding(kernel_size, stride, image_size):
+    dynamic = Conv2dDynamicSamePadding(4, 4, kernel_size, stride=stride, groups=4)
+    static = Conv2dStaticSamePadding(
+        4, 4, kernel_size, stride=stride, groups=4, image_size=image_size
+    )
+    static.load_state_dict(dynamic.state_dict())
+    sample = torch.rand(2, 4, image_size, image_size)
+    with torch.no_grad():
+        assert torch.allclose(static(sample), dynamic(sample), atol=1e-6)
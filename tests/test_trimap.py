@@ -3,10 +3,14 @@ Source url: https://github.com/OPHoperHPO/image-background-remove-tool
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+import cv2
+import numpy as np
 import PIL.Image
 import pytest
 
-from carvekit.trimap.add_ops import prob_as_unknown_area
+from carvekit.trimap.add_ops import prob_as_unknown_area, prob_filter, post_erosion
+from carvekit.trimap.cv_gen import CV2TrimapGenerator
+from carvekit.trimap.generator import TrimapGenerator
 
 
 def test_trimap_generator(trimap_instance, image_mask, image_pil):
@@ -41,3 +45,52 @@ def test_cv2_generator(cv2_trimap_instance, image_pil, image_mask):
 def test_prob_as_unknown_area(image_pil, image_mask):
     with pytest.raises(ValueError):
         prob_as_unknown_area(image_pil, image_mask)
+
+
+def test_trimap_generator_array(trimap_instance, image_mask, image_pil):
+    te = trimap_instance()
+    trimap = te(image_pil, np.array(image_mask))
+    assert isinstance(trimap, np.ndarray) and trimap.dtype == np.uint8
+    assert np.array_equal(trimap, np.array(te(image_pil, image_mask)))
+    with pytest.raises(ValueError):
+        te(image_pil, np.zeros((16, 16), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        te(image_pil, np.array(image_mask.convert("RGB")))
+
+
+@pytest.mark.parametrize(
+    "prob_threshold, kernel_size, erosion_iters",
+    [(231, 30, 5), (231, 0, 0), (100, 45, 2), (255, 3, 40)],
+)
+def test_trimap_generator_equals_ops(prob_threshold, kernel_size, erosion_iters):
+    rng = np.random.default_rng(0)
+    mask = np.zeros((200, 300), dtype=np.uint8)
+    cv2.circle(mask, (100, 90), 60, 255, -1)
+    cv2.circle(mask, (250, 150), 30, 180, -1)
+    mask = cv2.GaussianBlur(mask, (0, 0), 3)
+    mask[rng.random(mask.shape) < 0.01] = 90
+    image = np.zeros((200, 300, 3), dtype=np.uint8)
+
+    trimap = prob_filter(mask, prob_threshold)
+    trimap = CV2TrimapGenerator(kernel_size, erosion_iters=0)(image, trimap)
+    trimap = prob_as_unknown_area(trimap, mask, prob_threshold)
+    expected = post_erosion(trimap, erosion_iters)
+
+    generator = TrimapGenerator(prob_threshold, kernel_size, erosion_iters)
+    assert np.array_equal(generator(image, mask), expected)
+
+
+def test_scaled_generator():
+    generator = TrimapGenerator(prob_threshold=200, kernel_size=30, erosion_iters=5)
+    scaled = generator.scaled(0.25)
+    assert (scaled.kernel_size, scaled.prob_threshold) == (8, 200)
+    assert generator.kernel_size == 30
+    mask = np.zeros((40, 40), dtype=np.uint8)
+    mask[10:30, 10:30] = 255
+    assert np.array_equal(
+        scaled(mask, mask),
+        TrimapGenerator(200, kernel_size=8, erosion_iters=1)(mask, mask),
+    )
+    assert (
+        CV2TrimapGenerator(kernel_size=1, erosion_iters=0).scaled(0.1).kernel_size == 1
+    )
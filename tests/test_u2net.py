@@ -4,10 +4,12 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 
+import numpy as np
 import pytest
 import torch
 from PIL import Image
 
+from carvekit.ml.arch.u2net.u2net import U2NETArchitecture
 from carvekit.ml.wrap.u2net import U2NET
 
 
@@ -69,3 +71,49 @@ def test_seg_with_fp12(u2net_model, image_pil, image_str, image_path, black_imag
     u2net_model = u2net_model(True)
     u2net_model([image_pil])
     u2net_model([image_pil, image_str, image_path, black_image_pil])
+
+
+def test_mask_format(u2net_model, image_pil):
+    u2net_model = u2net_model(False)
+    u2net_model.mask_format = "numpy"
+    mask = u2net_model([image_pil])[0]
+    assert isinstance(mask, np.ndarray)
+    assert mask.shape == (image_pil.size[1], image_pil.size[0])
+    with pytest.raises(ValueError):
+        U2NET(mask_format="nan")
+
+
+def test_optimize_for_inference():
+    model = U2NET(input_image_size=64, load_pretrained=False).eval()
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.running_mean.uniform_(-0.1, 0.1)
+            module.running_var.uniform_(0.5, 1.5)
+    sample = torch.rand(2, 3, 64, 64)
+    with torch.no_grad():
+        expected = model.forward(sample)[0]
+        model.optimize_for_inference()
+        assert not any(isinstance(m, torch.nn.BatchNorm2d) for m in model.modules())
+        assert model.frozen_forward is not None
+        assert torch.allclose(model.forward(sample)[0], expected, atol=1e-4)
+        assert torch.allclose(model.frozen_forward(sample)[0], expected, atol=1e-4)
+
+
+def test_forward_sizes():
+    model = U2NETArchitecture().eval()
+    with torch.no_grad():
+        for size in [(50, 70), (50, 70), (64, 64)]:
+            maps = model(torch.rand(1, 3, *size))
+            assert len(maps) == 7
+            assert all(m.shape == (1, 1, *size) for m in maps)
+
+
+def test_fused_output_only():
+    model = U2NETArchitecture().eval()
+    sample = torch.rand(2, 3, 64, 48)
+    with torch.no_grad():
+        expected = model(sample)[0]
+        model.fused_output_only = True
+        maps = model(sample)
+    assert len(maps) == 1
+    assert torch.allclose(maps[0], expected, atol=1e-6)
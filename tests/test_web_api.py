@@ -0,0 +1,144 @@
+"""
+Source url: https://github.com/OPHoperHPO/image-background-remove-tool
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import io
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+from fastapi.testclient import TestClient
+
+from carvekit.web.app import app
+from carvekit.web.deps import config, ml_processor
+
+
+class StubInterface:
+    """Returns input images with alpha equal to the red channel"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def __call__(self, images):
+        time.sleep(self.delay)
+        results = []
+        for image in images:
+            result = image.convert("RGBA")
+            result.putalpha(image.convert("RGB").getchannel("R"))
+            results.append(result)
+        return results
+
+
+@pytest.fixture(scope="module")
+def client():
+    ml_processor.interface = StubInterface()
+    ml_processor.daemon = True
+    with TestClient(app) as client:
+        client.headers["X-Api-Key"] = config.auth.allowed_tokens[0]
+        yield client
+
+
+@pytest.fixture()
+def image_file():
+    buffer = io.BytesIO()
+    Image.fromarray(
+        np.random.default_rng(0).integers(0, 256, (40, 48, 3), dtype=np.uint8)
+    ).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_removebg(client, image_file):
+    response = client.post(
+        "/api/removebg", files={"image_file": image_file}, data={"format": "png"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert Image.open(io.BytesIO(response.content)).size == (48, 40)
+
+
+def test_removebg_timeout(client, image_file, monkeypatch):
+    monkeypatch.setattr(ml_processor, "interface", StubInterface(delay=0.5))
+    monkeypatch.setattr(config, "job_timeout", 0.1)
+    response = client.post("/api/removebg", files={"image_file": image_file})
+    assert response.status_code == 504
+    time.sleep(0.5)
+
+
+def wait_job(client, job_id: str, timeout: float = 5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = client.get(f"/api/jobs/{job_id}/result")
+        if response.status_code != 202:
+            return response
+        time.sleep(0.01)
+    raise TimeoutError(f"Job {job_id} isn't finished")
+
+
+def test_job_result_overrides(client, image_file):
+    response = client.post(
+        "/api/jobs", files={"image_file": image_file}, data={"format": "png"}
+    )
+    job_id = response.json()["id"]
+    assert wait_job(client, job_id).headers["content-type"] == "image/png"
+
+    response = client.get(f"/api/jobs/{job_id}/result", params={"format": "jpg"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+
+    response = client.get(
+        f"/api/jobs/{job_id}/result", params={"bg_color": "fff", "crop": True}
+    )
+    assert response.status_code == 200
+    result = Image.open(io.BytesIO(response.content))
+    assert result.getextrema()[3] == (255, 255)
+
+    response = client.get(f"/api/jobs/{job_id}/result", params={"format": "bmp"})
+    assert response.status_code == 400
+
+
+def test_job_result_overrides_evicted(client, image_file, monkeypatch):
+    monkeypatch.setattr(config, "render_cache_size", 0)
+    response = client.post("/api/jobs", files={"image_file": image_file})
+    job_id = response.json()["id"]
+    assert wait_job(client, job_id).status_code == 200
+    response = client.get(f"/api/jobs/{job_id}/result", params={"format": "jpg"})
+    assert response.status_code == 409
+
+
+def test_jobs(client, image_file, monkeypatch):
+    monkeypatch.setattr(ml_processor, "interface", StubInterface(delay=0.3))
+    monkeypatch.setattr(config, "max_queue_size", 1)
+    response = client.post("/api/jobs", files={"image_file": image_file})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    assert response.json()["status"] == "wait"
+
+    response = client.post("/api/jobs", files={"image_file": image_file})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    response = client.post("/api/removebg", files={"image_file": image_file})
+    assert response.status_code == 429
+
+    response = client.get(f"/api/jobs/{job_id}")
+    assert response.json() == {"id": job_id, "status": "wait"}
+    response = client.get(f"/api/jobs/{job_id}/result")
+    assert response.status_code == 202
+    assert int(response.headers["Retry-After"]) >= 1
+
+    assert wait_job(client, job_id).status_code == 200
+    response = client.get(f"/api/jobs/{job_id}")
+    assert response.json() == {"id": job_id, "status": "finished"}
+
+    assert client.get("/api/jobs/unknown").status_code == 404
+    assert client.get("/api/jobs/unknown/result").status_code == 404
+
+
+def test_job_delete(client, image_file):
+    job_id = client.post("/api/jobs", files={"image_file": image_file}).json()["id"]
+    assert wait_job(client, job_id).status_code == 200
+    response = client.delete(f"/api/jobs/{job_id}")
+    assert response.json() == {"id": job_id, "status": "deleted"}
+    assert client.get(f"/api/jobs/{job_id}/result").status_code == 404
+    assert client.delete(f"/api/jobs/{job_id}").status_code == 404
@@ -0,0 +1,181 @@
+"""
+Source url: https://github.com/OPHoperHPO/image-background-remove-tool
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import multiprocessing
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from carvekit.web.other.removebg import matte_remove_bg
+from carvekit.web.schemas.config import MLConfig
+from carvekit.web.utils.worker_pool import (
+    InterfaceWorkerPool,
+    _serve_batches,
+    image_from_shared_memory,
+    image_to_shared_memory,
+)
+
+
+class StubInterface:
+    """Returns input images with alpha equal to the red channel"""
+
+    def __call__(self, images):
+        results = []
+        for image in images:
+            result = image.convert("RGBA")
+            result.putalpha(image.convert("RGB").getchannel("R"))
+            results.append(result)
+        return results
+
+
+class WorkerThread(threading.Thread):
+    """Thread which mimics the worker process"""
+
+    @property
+    def pid(self):
+        return self.native_id
+
+
+class StubWorkerPool(InterfaceWorkerPool):
+    """Worker pool which serves batches by threads of the current process"""
+
+    def _start_worker(self):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        thread = WorkerThread(
+            target=_serve_batches, args=(child_conn, StubInterface()), daemon=True
+        )
+        thread.start()
+        with self.lock:
+            self.processes.append(thread)
+        return thread, parent_conn
+
+
+@pytest.fixture()
+def rgb_image():
+    return Image.fromarray(
+        np.random.default_rng(0).integers(0, 256, (40, 48, 3), dtype=np.uint8)
+    )
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L"])
+def test_shared_memory_round_trip(rgb_image, mode):
+    image = rgb_image.convert(mode)
+    shm, shape, shm_mode = image_to_shared_memory(image)
+    try:
+        restored = image_from_shared_memory(shm, shape, shm_mode)
+    finally:
+        shm.close()
+        shm.unlink()
+    assert restored.mode == mode
+    assert np.array_equal(np.asarray(restored), np.asarray(image))
+
+
+@pytest.mark.parametrize(
+    "mode, expected_mode",
+    [
+        ("P", "RGB"),
+        ("PA", "RGBA"),
+        ("LA", "RGBA"),
+        ("CMYK", "RGB"),
+        ("1", "RGB"),
+        ("I;16", "RGB"),
+    ],
+)
+def test_shared_memory_converts_other_modes(rgb_image, mode, expected_mode):
+    image = rgb_image.convert(mode)
+    shm, shape, shm_mode = image_to_shared_memory(image)
+    try:
+        restored = image_from_shared_memory(shm, shape, shm_mode)
+    finally:
+        shm.close()
+        shm.unlink()
+    assert shm_mode == expected_mode
+    assert np.array_equal(
+        np.asarray(restored), np.asarray(image.convert(expected_mode))
+    )
+
+
+@pytest.mark.parametrize("mode", ["RGB", "P", "LA", "CMYK", "I;16"])
+def test_worker_pool(rgb_image, mode):
+    pool = StubWorkerPool(MLConfig(), workers=1)
+    try:
+        images = [rgb_image.convert(mode), rgb_image.resize((36, 34)).convert(mode)]
+        results = pool(images)
+    finally:
+        pool.close()
+    for image, result in zip(images, results):
+        assert result.mode == "RGBA"
+        assert result.size == image.size
+        assert np.array_equal(
+            np.asarray(result.getchannel("A")),
+            np.asarray(image.convert("RGB").getchannel("R")),
+        )
+
+
+def test_worker_pool_mattes(rgb_image):
+    pool = StubWorkerPool(MLConfig(cache_size=256), workers=2)
+    try:
+        assert pool.config.cache_size == 128
+        image = rgb_image.convert("P")
+        mattes = matte_remove_bg(pool, [image])
+        assert pool.mattes([image])[0].mode == "L"
+    finally:
+        pool.close()
+    assert mattes[0].mode == "L"
+    assert np.array_equal(
+        np.asarray(mattes[0]), np.asarray(image.convert("RGB").getchannel("R"))
+    )
+
+
+def dead_worker():
+    parent_conn, child_conn = multiprocessing.Pipe()
+    child_conn.close()
+    thread = WorkerThread(target=lambda: None)
+    thread.start()
+    thread.join()
+    return thread, parent_conn
+
+
+def test_worker_pool_restarts_dead_worker(rgb_image):
+    pool = StubWorkerPool(MLConfig(), workers=1)
+    try:
+        old_worker = pool.idle_workers.get()
+        worker = dead_worker()
+        pool.idle_workers.put(worker)
+        with pytest.raises(RuntimeError):
+            pool([rgb_image])
+        pool._remove_worker(*worker)
+        assert worker[0] not in pool.processes
+        assert pool.idle_workers.qsize() == 1
+        assert pool([rgb_image])[0].size == rgb_image.size
+        pool.idle_workers.put(old_worker)
+    finally:
+        pool.close()
+    assert pool.processes == []
+
+
+def test_worker_pool_retries_failed_restart(rgb_image, monkeypatch):
+    pool = StubWorkerPool(MLConfig(), workers=1)
+    start_worker = pool._start_worker
+
+    def failing_start_worker():
+        raise RuntimeError("Failed to start worker process")
+
+    try:
+        old_worker = pool.idle_workers.get()
+        pool.idle_workers.put(dead_worker())
+        monkeypatch.setattr(pool, "_start_worker", failing_start_worker)
+        with pytest.raises(RuntimeError):
+            pool([rgb_image])
+        with pytest.raises(RuntimeError):
+            pool([rgb_image])
+        assert pool.idle_workers.qsize() == 1
+        monkeypatch.setattr(pool, "_start_worker", start_worker)
+        assert pool([rgb_image])[0].size == rgb_image.size
+        pool.idle_workers.put(old_worker)
+    finally:
+        pool.close()